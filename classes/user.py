@@ -2,7 +2,7 @@
 
 class User:
 
-    def __init__(self, username, followers_amount, followings_amount, videos_ids, email = None, topics=None, followings=None):
+    def __init__(self, username, followers_amount, followings_amount, videos_ids, email = None, topics=None, followings=None, cursor=""):
         """
         Represents a user's profile with relevant social metrics and optional additional details.
 
@@ -18,6 +18,7 @@ class User:
         :param email: (Optional) The email associated with the current user.
         :param topics: (Optional) A list of topics the current user is interested in.
         :param followings: (Optional) A list of other users that the current user is following.
+        :param cursor: (Optional) The cursor the list the user was sent in is continued from after them.
         """
         if followings is None:
             followings = []
@@ -29,6 +30,7 @@ class User:
         self.followers_amount = followers_amount
         self.followings_amount = followings_amount
         self.videos_ids = videos_ids
+        self.cursor = cursor
 
         # saved for current user only
         self.email = email
@@ -4,7 +4,7 @@ import comment
 
 
 class Video:
-    def __init__(self, video_id, creator, video_name, video_desc, created_at, amount_of_likes, amount_of_comments, liked, test_link):
+    def __init__(self, video_id, creator, video_name, video_desc, created_at, amount_of_likes, amount_of_comments, liked, test_link, cursor=""):
         """
         Initializes the Video object with the given attributes.
 
@@ -17,6 +17,7 @@ class Video:
         :param amount_of_comments: The number of comments associated with the video.
         :param liked: Indicates whether the current user has liked the video.
         :param test_link: Optional. The URL link to access the video's test.
+        :param cursor: Optional. The cursor the list the video was sent in is continued from after it.
         """
         self.video_id = video_id
         self.creator = creator
@@ -28,6 +29,7 @@ class Video:
         self.amount_of_comments = amount_of_comments
         self.liked = liked
         self.test_link = test_link
+        self.cursor = cursor
 
     def add_comment_at_start(self, comment : comment.Comment):
         """adds a comment to this video's comments list"""
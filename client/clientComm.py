@@ -1,3 +1,4 @@
+import os
 import threading
 import socket
 import queue
@@ -6,24 +7,41 @@ import clientProtocol
 import clientlogic
 import settings
 import aesCipher
-import diffieHellman
+import frames
+import keyExchange
+import protocolCodec
+import recvBuffer
 
 
 class ClientComm:
     """Manages client-server communication with encryption.
 
     Handles connection to the server, sending and receiving encrypted messages,
-    and key exchange using Diffie-Hellman. Uses a separate thread for listening
-    to incoming messages.
+    and X25519 key exchange, resumed with the session ticket of an earlier connection.
+    Uses a separate thread for listening to incoming messages.
 
     :ivar client: Client object associated with this communication.
     :ivar my_socket: Socket for server communication.
     :ivar server_ip: IP address of the server.
     :ivar port: Port number for the server connection.
     :ivar recvQ: Queue to store received messages.
-    :ivar cipher: AESCipher object for message encryption/decryption.
+    :ivar cipher: AEADCipher object for message encryption/decryption, created by the key exchange.
+    :ivar capabilities: Optional capabilities the server accepted for this connection.
+    :ivar received_file: FileDecryptor of the file the next file channel frames hold.
+    :ivar recv_buffer: RecvBuffer the connection's bytes are received into.
+    :ivar send_lock: Lock held while building and sending frames, so they are sent in the order of their nonces.
+    :cvar session_ticket: SessionTicket of the last full key exchange, the video connection and reconnections
+        resume its session instead of agreeing on a new key.
     """
 
+    session_ticket = None
+
+    CAPABILITIES = ([settings.MULTIPLEX_CAPABILITY] if settings.MULTIPLEX_VIDEO else []) + \
+                   ([settings.STREAM_CAPABILITY] if settings.STREAM_FILES else []) + \
+                   ([settings.SEALED_CAPABILITY] if settings.SEALED_MEDIA else []) + \
+                   ([settings.BINARY_CAPABILITY] if settings.BINARY_FRAMES else []) + \
+                   ([settings.CODEC_CAPABILITY] if settings.PROTOCOL_CODEC else [])
+
     def __init__(self, client, server_ip, port, recvQ):
         """Initialize the ClientComm object.
 
@@ -39,6 +57,10 @@ class ClientComm:
         self.recvQ = recvQ
         self.cipher = None
         self.closed = False
+        self.capabilities = []
+        self.received_file = None
+        self.recv_buffer = recvBuffer.RecvBuffer()
+        self.send_lock = threading.Lock()  # messages can be sent from the gui's and the logic's threads at once
 
     def connect(self):
         """Establish a connection to the server and start listening for messages.
@@ -54,32 +76,128 @@ class ClientComm:
             self._close_client_at_connection()
 
         self._change_key()
+        if self.CAPABILITIES:
+            # a server that does not know capabilities ignores this, and keeps sending videos on their own connection
+            self.send_msg(clientProtocol.build_capabilities(self.CAPABILITIES))
 
         # Start listening for incoming messages in a separate thread
         threading.Thread(target=self._mainLoop, daemon=True).start()
 
     def _mainLoop(self):
-        """Continuously listen for incoming messages from the server.
+        """Continuously listen for incoming frames from the server.
 
         Receives encrypted messages, decrypts them, and places them in the receive queue.
+        Files multiplexed over the connection are saved instead, and the server's capabilities answer is kept.
         Closes the client on connection errors or empty messages.
         """
         while not self.closed:
-            data = ""
+            frame = None
             try:
-                data_len = int(self.my_socket.recv(settings.MESSAGE_LENGTH_LENGTH).decode())
-                data = self.my_socket.recv(data_len).decode()
+                frame = self._recv_frame()
             except Exception as e:
                 print(f"Error in mainLoop: {e}")
                 self.recvQ.put("97")
                 self._close_client()
 
-            if not data:
+            if not frame:
+                if self.received_file:  # keep the chunks that arrived, the download is resumed from them
+                    self.received_file.file.close()
                 self._close_client()
+                continue
+
+            channel, data, binary = frame
+            if channel == settings.FILE_CHANNEL:
+                self._recv_file_frame(data)
+                continue
+
+            try:
+                msg = protocolCodec.from_bytes(self.cipher.decrypt_bytes(data, binary, channel))
+            except ValueError as e:
+                print(f"Error in message decrypt: {e}")
+                self._close_client()
+                break
+
+            if channel == settings.VIDEO_CHANNEL and clientProtocol.is_file(msg):
+                self.received_file = self._open_received_file(msg)
+            elif channel == settings.CONTROL_CHANNEL and clientProtocol.is_capabilities(msg):
+                opcode, capabilities = clientProtocol.unpack(msg)
+                self.capabilities = capabilities
             else:
-                msg = self.cipher.decrypt(data)
                 self.recvQ.put(msg)  # Push received data into the queue
 
+    def _recv_frame(self):
+        """Receive a single frame from the server.
+
+        :return: Tuple of (channel, data as a memoryview of the receive buffer, whether the frame is binary),
+            None if the connection was closed.
+        """
+        return frames.recv_frame(self.recv_buffer, self.my_socket, settings.STREAM_CAPABILITY in self.capabilities)
+
+    def _recv_exact(self, size):
+        """Receive exactly size bytes from the server into the receive buffer.
+
+        :param size: Amount of bytes to receive.
+        :return: memoryview of the received bytes, valid until the next receive,
+            None if the connection was closed before all of them arrived.
+        """
+        return self.recv_buffer.read_exact(self.my_socket, size)
+
+    def _open_received_file(self, file_details):
+        """Open the file a file sent by the server is saved to, at media//``file_name``
+
+        A file sent in chunks is written in place as its chunks arrive, from the offset the server sent it
+        from, and is marked as partial until all of it arrived.
+
+        :param file_details: The decrypted file details, stream details or sealed details message of the file.
+        :return: FileDecryptor writing the file.
+        """
+        opcode, data = clientProtocol.unpack(file_details)
+        file_name, file_size, *transfer_details = data
+        print("recieved file:", file_name)
+        store_path = f"media\\{file_name}"
+        self.client.media_cache.forget(file_name)  # the file kept before is overwritten
+
+        cipher = self.cipher
+        offset = 0
+        if clientProtocol.is_stream(file_details):
+            offset = int(transfer_details[0])
+            if clientProtocol.is_sealed(file_details):  # a stored file's chunks are encrypted with its own key
+                cipher = aesCipher.AESCipher(bytes.fromhex(transfer_details[1]))
+            open(store_path + settings.PARTIAL_DOWNLOAD_SUFFIX, 'wb').close()
+
+        f = open(store_path, 'r+b' if offset and os.path.isfile(store_path) else 'wb')
+        f.seek(offset)
+        f.truncate()
+        return aesCipher.FileDecryptor(cipher, f, int(file_size), clientProtocol.is_stream(file_details), offset,
+                                       settings.FILE_CHUNK_SIZE)
+
+    def _file_received(self, received_file):
+        """Remove the partial mark of a file that all of it arrived, and keep it in the media cache.
+
+        :param received_file: The FileDecryptor that wrote the file.
+        """
+        partial_mark_path = received_file.file.name + settings.PARTIAL_DOWNLOAD_SUFFIX
+        if os.path.isfile(partial_mark_path):
+            os.remove(partial_mark_path)
+        self.client.media_cache.add(os.path.basename(received_file.file.name))
+
+    def _recv_file_frame(self, data):
+        """Write a file's content, or the next chunk of a streamed file, received on the file channel.
+
+        :param data: The encrypted content or chunk.
+        """
+        if not self.received_file:
+            print("received file content without file details")
+            return
+
+        try:
+            if self.received_file.write(data):
+                self._file_received(self.received_file)
+                self.received_file = None
+        except ValueError as e:
+            print("Error at receiving file -", e)
+            self._close_client()
+
     def _close_client(self):
         """Close the client connection.
 
@@ -102,39 +220,99 @@ class ClientComm:
         print("Connection closed.")
 
     def _change_key(self):
-        """Perform Diffie-Hellman key exchange to establish encryption.
+        """Perform the key exchange to establish encryption, see keyExchange.answer_hello.
 
-        Generates a public key, sends it to the server, receives the server's public key,
-        and creates a shared key for AES encryption.
+        Resumes the session of the session ticket if there is one, and performs a full X25519
+        key exchange if there is none or the server rejected it, keeping the new ticket.
         """
-        diffie_hellman = diffieHellman.DiffieHellman()
-        public_key = diffie_hellman.get_public_key()
-
+        handshake = keyExchange.ClientHandshake(ClientComm.session_ticket)
         try:
-            self.my_socket.send(str(public_key).zfill(settings.P_SIZE).encode())
-            server_public_key = int(self.my_socket.recv(settings.P_SIZE).decode())
+            self.my_socket.sendall(handshake.hello())
+            while True:
+                hello_start = self.recv_buffer.read_exact(self.my_socket, 1)
+                hello_size = keyExchange.hello_size(hello_start, keyExchange.SERVER_HELLO_SIZES)
+                server_hello = bytes(hello_start) + bytes(self.recv_buffer.read_exact(self.my_socket, hello_size - 1))
+                self.cipher = handshake.receive_hello(server_hello)
+                if self.cipher:
+                    break
+                # the server rejected the ticket, from a previous run of the server or expired
+                handshake = keyExchange.ClientHandshake()
+                self.my_socket.sendall(handshake.hello())
         except Exception as e:
-            print(f"Error in key recv: {e}")
-            server_public_key = ""
-
-        if not server_public_key:
+            print(f"Error in key exchange: {e}")
             self._close_client_at_connection()
 
-        shared_key = diffie_hellman.generate_shared_key(server_public_key)
-        self.cipher = aesCipher.AESCipher(str(shared_key))
+        ClientComm.session_ticket = handshake.ticket
 
-    def send_msg(self, msg):
+    def send_msg(self, msg, channel=settings.CONTROL_CHANNEL):
         """Send an encrypted message to the server.
         :param msg: Message to send.
+        :param channel: Channel to send the message on, the control channel by default.
         """
-        msg = self.cipher.encrypt(msg)
         try:
-            self.my_socket.send(str(len(msg)).zfill(settings.MESSAGE_LENGTH_LENGTH).encode() + msg)
+            with self.send_lock:
+                self.my_socket.sendall(self._build_msg_frame(channel, msg))
         except Exception as e:
             print(f"Error sending message: {e}")
 
+    def send_file(self, file_name, file_path, video_name=None, video_description=None, test_link=None, topics=None):
+        """
+            sends a file to the server over this connection, on the video and file channels.
+            Used when the server accepted multiplexing, instead of ClientCommVideos.send_file
+        :param file_path: file path to the file to be sent
+        :return: file sent to server
+        """
+        if os.path.isfile(file_path):
+            frames = self._file_frames(settings.VIDEO_CHANNEL, settings.FILE_CHANNEL, file_name, file_path,
+                                       video_name, video_description, test_link, topics)
+            try:
+                with self.send_lock:
+                    for frame in frames:
+                        self.my_socket.sendall(frame)
+            except Exception as e:
+                print(f"Error sending message: {e}")
+        else:
+            print("file does not exist")
+
+    def _file_frames(self, details_channel, content_channel, file_name, file_path, *video_details):
+        """Encrypt a file and build the frames to send it in.
+
+        If the server accepted streaming, the file is sent in chunks encrypted with AES-GCM and only a
+        single chunk of the file is read and encrypted at a time. Otherwise it is encrypted whole.
+
+        :param details_channel: Channel to send the file's details on.
+        :param content_channel: Channel to send the file's content on, None to send it without framing.
+        :param file_name: The file's name, formatted filename.extension
+        :param file_path: Path of the file to send.
+        :param video_details: The video's name, description, test link and topics, if the file is a video.
+        :return: Generator of the frames, in order.
+        """
+        with open(file_path, 'rb') as f:
+            if settings.STREAM_CAPABILITY in self.capabilities:
+                msg = clientProtocol.build_stream_details(file_name, os.path.getsize(file_path), *video_details)
+                chunks = self.cipher.encrypt_file_stream(f, settings.FILE_CHUNK_SIZE)
+            else:
+                chunks = [self.cipher.encrypt_file(f.read())]
+                msg = clientProtocol.build_file_details(file_name, len(chunks[0]), *video_details)
+
+            binary = settings.BINARY_CAPABILITY in self.capabilities
+            yield self._build_msg_frame(details_channel, msg)
+            for chunk in chunks:
+                yield chunk if content_channel is None else frames.build_frame(content_channel, chunk, binary)
 
+    def _build_msg_frame(self, channel, msg):
+        """Encrypt a message and build its frame, a binary frame if the server accepted binary frames.
 
+        The message is encoded with protocolCodec if the server accepted the codec.
+
+        :param channel: Channel to send the message on.
+        :param msg: Message to send, a protocolCodec.Command or a command string.
+        :return: The frame's bytes.
+        """
+        data = protocolCodec.to_bytes(msg, settings.CODEC_CAPABILITY in self.capabilities)
+        if settings.BINARY_CAPABILITY in self.capabilities:
+            return frames.build_frame(channel, self.cipher.encrypt_binary(data, channel), binary=True)
+        return frames.build_frame(channel, self.cipher.encrypt(data, channel))
 
 
 if __name__ == "__main__":
@@ -2,9 +2,16 @@ import os.path
 
 import clientComm
 import clientProtocol
+import protocolCodec
 import settings
 class ClientCommVideos (clientComm.ClientComm):
 
+    # the video connection is only used when the server did not accept multiplexing
+    CAPABILITIES = ([settings.STREAM_CAPABILITY] if settings.STREAM_FILES else []) + \
+                   ([settings.SEALED_CAPABILITY] if settings.SEALED_MEDIA else []) + \
+                   ([settings.BINARY_CAPABILITY] if settings.BINARY_FRAMES else []) + \
+                   ([settings.CODEC_CAPABILITY] if settings.PROTOCOL_CODEC else [])
+
     def _mainLoop(self):
         """Continuously listen for incoming messages from the server.
 
@@ -13,20 +20,25 @@ class ClientCommVideos (clientComm.ClientComm):
         """
         while not self.closed:
             try:
-
-                data_len = int(self.my_socket.recv(settings.MESSAGE_LENGTH_LENGTH).decode())
-                data = self.my_socket.recv(data_len).decode()
-
+                frame = self._recv_frame()  # only control messages are sent on the video connection
             except Exception as e:
                 print(f"Error in mainLoop: {e}")
-                data = ""
+                frame = None
 
-            if not data:
+            if not frame:
                 self._close_client()
             else:
-                msg = self.cipher.decrypt(data)
+                channel, data, binary = frame
+                try:
+                    msg = protocolCodec.from_bytes(self.cipher.decrypt_bytes(data, binary, channel))
+                except ValueError as e:
+                    print(f"Error in message decrypt: {e}")
+                    self._close_client()
+                    break
                 if clientProtocol.is_file(msg):
                     self._recv_file(msg)
+                elif clientProtocol.is_capabilities(msg):
+                    opcode, self.capabilities = clientProtocol.unpack(msg)
                 else:
                     self.recvQ.put(msg)  # Push received data into the queue
 
@@ -38,17 +50,12 @@ class ClientCommVideos (clientComm.ClientComm):
         """
 
         if os.path.isfile(file_path):
-            with open(file_path, 'rb') as f:
-                data = f.read()
-
-            data = self.cipher.encrypt_file(data)
-            file_size = len(data)
-            msg = clientProtocol.build_file_details(file_name, file_size, video_name, video_description, test_link, topics)
-            encrypted_message = self.cipher.encrypt(msg)
-
+            frames = self._file_frames(settings.CONTROL_CHANNEL, None, file_name, file_path,
+                                       video_name, video_description, test_link, topics)
             try:
-                self.my_socket.send(str(len(encrypted_message)).zfill(settings.MESSAGE_LENGTH_LENGTH).encode() + encrypted_message) # sends len and content of len and filename
-                self.my_socket.send(data)
+                with self.send_lock:
+                    for frame in frames: # sends len and content of len and filename, then the file's content
+                        self.my_socket.sendall(frame)
             except Exception as e:
                 print(f"Error sending message: {e}")
         else:
@@ -57,45 +64,38 @@ class ClientCommVideos (clientComm.ClientComm):
 
     def _recv_file(self, msg):
         """
-            recvs file send from the server and saves it at media//pfps or media//videos //``file_name``
+            recvs file send from the server and saves it at media//pfps or media//videos //``file_name``,
+            one chunk at a time if it is streamed. If the connection breaks, the chunks that arrived are
+            kept so the download can be resumed
         :return: returns whether the recv was successful
         """
-        opcode, data = clientProtocol.unpack(msg)
-        file_name, file_size = data
-        file_size = int(file_size)
-        file_content = self._recv_file_content(file_size)
-        print("recieved file:", file_name)
-        if len(file_content) == file_size:
-            store_path = f"media\\{file_name}"
-            with open(store_path, 'wb') as f:
-                f.write(self.cipher.decrypt_file(file_content))
-
-        else:
+        received_file = self._open_received_file(msg)
+        try:
+            for chunk_size in received_file.chunk_sizes():
+                file_content = self._recv_file_content(chunk_size)
+                if file_content is None:
+                    raise ValueError("connection closed during file transfer")
+                received_file.write(file_content)
+        except ValueError as e:
+            print("Error at receiving file -", e)
+            received_file.file.close()
             self._close_client()
+            return
+
+        self._file_received(received_file)
 
     def _recv_file_content(self, file_size):
         """
         Handles the process of receiving a file's content from a socket connection.
-        Data is received in chunks of up to 1024 bytes until the full file content
-        is retrieved or an error occurs.
+        The content is received into the preallocated receive buffer, with as few recv calls as the
+        socket allows, and is not copied out of it.
 
         :param file_size: The expected size of the file to be received in bytes.
-        :return: A bytearray containing the received file content. If the connection
-             is interrupted or an error occurs, the content received until the point
-             of interruption is returned.
+        :return: A memoryview of the received file content, valid until the next receive.
+             If the connection is interrupted or an error occurs, None is returned.
         """
-        file_content = bytearray()
-        while len(file_content) < file_size:
-            slice = min(1024, (file_size - len(file_content)))
-            try:
-                data = self.my_socket.recv(slice)
-            except Exception as e:
-                print("Error at receiving file -", e)
-                data = ''
-
-            if not data:
-                file_content = None
-                break
-
-            file_content.extend(data)
-        return file_content
+        try:
+            return self._recv_exact(file_size)
+        except Exception as e:
+            print("Error at receiving file -", e)
+            return None
@@ -1,3 +1,6 @@
+import protocolCodec
+
+
 def build_command(command, params):
     """Build a command string using an opcode and parameters.
 
@@ -7,16 +10,17 @@ def build_command(command, params):
     :param params: List of parameters for the command.
     :return: Formatted command string.
     """
-    while params and params[-1] is None:  # remove None at the end of params
-        params.pop()
+    return protocolCodec.build_text(command, params)
 
-    for index, value in enumerate(params):
-        if isinstance(value, (list, tuple)):
-            value = [str(i) for i in value]
-            params[index] = "#@".join(value)
 
-    params = [str(i) for i in params]
-    return str(command).zfill(2) + "@#".join(params)
+def build_message(command, params):
+    """Build a command that is encoded when it is sent, with protocolCodec if the peer accepted it.
+
+    :param command: The opcode for the command, that has a schema in protocolCodec.CLIENT_SCHEMAS.
+    :param params: List of parameters for the command.
+    :return: protocolCodec.Command of the command.
+    """
+    return protocolCodec.Command(command, params, protocolCodec.CLIENT_SCHEMAS[command])
 
 
 def build_sign_up(username, password, email):
@@ -27,7 +31,7 @@ def build_sign_up(username, password, email):
     :param email: The email address for the new account.
     :return: Formatted sign-up command string.
     """
-    return build_command(0, [username, password, email])
+    return build_message(0, [username, password, email])
 
 
 def build_email_verification_code(email_verification_code):
@@ -36,7 +40,7 @@ def build_email_verification_code(email_verification_code):
     :param email_verification_code: The verification code sent to the user's email.
     :return: Formatted email verification command string.
     """
-    return build_command(1, [email_verification_code])
+    return build_message(1, [email_verification_code])
 
 
 def build_sign_in(username_or_email, password):
@@ -46,7 +50,7 @@ def build_sign_in(username_or_email, password):
     :param password: The password of the user.
     :return: Formatted sign-in command string.
     """
-    return build_command(2, [username_or_email, password])
+    return build_message(2, [username_or_email, password])
 
 
 def build_set_topics(topics):
@@ -55,7 +59,7 @@ def build_set_topics(topics):
     :param topics: List of topics to assign to the user.
     :return: Formatted set-topics command string.
     """
-    return build_command(3, topics)
+    return build_message(3, topics)
 
 
 def build_set_filter(topics):
@@ -64,30 +68,30 @@ def build_set_filter(topics):
     :param topics: List of topics to use as filters.
     :return: Formatted set-filter command string.
     """
-    return build_command(4, topics)
+    return build_message(4, topics)
 
 
-def build_search_creators(creator_name, last_username = ""):
+def build_search_creators(creator_name, cursor=""):
     """
         Builds a command to search for creators by name.
     :param creator_name: The name or partial name of the creator to search for.
-    :param last_username: username of last user sent
+    :param cursor: cursor of the last user received, empty for the first users.
     :return: Formatted search-creators command string.
     """
-    return build_command(5, [creator_name, last_username])
+    return build_message(5, [creator_name, cursor])
 
 
-def build_search_videos(video_name_or_desc, topics=None, last_id = 0):
+def build_search_videos(video_name_or_desc, topics=None, cursor=""):
     """
         Builds a command to search for videos by name or description.
     :param video_name_or_desc: The name or description to search for.
     :param topics: Optional list of topics to filter results by.
-    :param last_id: last video's id.
+    :param cursor: cursor of the last video received, empty for the first videos.
     :return: Formatted search-videos command string.
     """
     if not topics:
         topics = []
-    return build_command(6, [video_name_or_desc, topics, last_id])
+    return build_message(6, [video_name_or_desc, topics, cursor])
 
 
 def build_comment(video_id, comment):
@@ -97,7 +101,7 @@ def build_comment(video_id, comment):
     :param comment: The comment text to post.
     :return: Formatted comment command string.
     """
-    return build_command(7, [video_id, comment])
+    return build_message(7, [video_id, comment])
 
 
 def build_req_user_info(username):
@@ -106,7 +110,7 @@ def build_req_user_info(username):
     :param username: The username of the user to retrieve info for.
     :return: Formatted request-user-info command string.
     """
-    return build_command(8, [username])
+    return build_message(8, [username])
 
 
 def build_report(id, type):
@@ -116,17 +120,17 @@ def build_report(id, type):
     :param type: The type of the item being reported.
     :return: Formatted report command string.
     """
-    return build_command(9, [id, type])
+    return build_message(9, [id, type])
 
 
-def build_req_comments(video_id, last_id=0):
+def build_req_comments(video_id, cursor=""):
     """
         Builds a command to request comments for a video.
     :param video_id: The ID of the video to fetch comments for.
-    :param last_id: The ID of the last received comment, used for pagination.
+    :param cursor: The cursor of the last received comment, used for pagination.
     :return: Formatted request-comments command string.
     """
-    return build_command(10, [video_id, last_id])
+    return build_message(10, [video_id, cursor])
 
 
 def build_del_video(video_id):
@@ -135,7 +139,7 @@ def build_del_video(video_id):
     :param video_id: The ID of the video to delete.
     :return: Formatted delete-video command string.
     """
-    return build_command(11, [video_id])
+    return build_message(11, [video_id])
 
 
 def build_del_comment(comment_id):
@@ -144,29 +148,29 @@ def build_del_comment(comment_id):
     :param comment_id: The ID of the comment to delete.
     :return: Formatted delete-comment command string.
     """
-    return build_command(12, [comment_id])
+    return build_message(12, [comment_id])
 
 
-def build_req_creator_videos(username, last_id=0):
+def build_req_creator_videos(username, cursor=""):
     """
         Builds a command to request videos uploaded by a specific creator.
     :param username: The username of the creator.
-    :param last_id: The ID of the last received video, used for pagination.
+    :param cursor: The cursor of the last received video, used for pagination.
     :return: Formatted request-creator-videos command string.
     """
-    return build_command(13, [username, last_id])
+    return build_message(13, [username, cursor])
 
 
 def build_req_user_follow_list(username, follow_type,
-                               last_username = ""):  # follow_type: 0 - followings, 1 - followers
+                               cursor=""):  # follow_type: 0 - followings, 1 - followers
     """
         Builds a command to request a user's following or followers list.
     :param username: The username of the user whose follow list to retrieve.
     :param follow_type: The type of list to fetch — 0 for followings, 1 for followers.
-    :param last_username: username of last sent user
+    :param cursor: cursor of the last user received, empty for the first users.
     :return: Formatted request-follow-list command string.
     """
-    return build_command(14, [username, follow_type, last_username])
+    return build_message(14, [username, follow_type, cursor])
 
 
 def build_req_video(video_id=0):
@@ -175,7 +179,17 @@ def build_req_video(video_id=0):
     :param video_id: The ID of the video to retrieve.
     :return: Formatted request-video command string.
     """
-    return build_command(15, [video_id])
+    return build_message(15, [video_id])
+
+
+def build_req_videos(amount):
+    """
+        Builds a command to request the next recommended videos of the feed, answered like that amount
+        of requests for a recommended video.
+    :param amount: The amount of videos to retrieve.
+    :return: Formatted request-videos command string.
+    """
+    return build_message(23, [amount])
 
 
 def build_video_details(video_name, video_desc, test_link, topics):
@@ -187,7 +201,7 @@ def build_video_details(video_name, video_desc, test_link, topics):
     :param topics: List of topics associated with the video.
     :return: Formatted video-details command string.
     """
-    return build_command(16, [video_name, video_desc, test_link, topics])
+    return build_message(16, [video_name, video_desc, test_link, topics])
 
 
 def build_follow_req(username):
@@ -196,7 +210,7 @@ def build_follow_req(username):
     :param username: The username of the user to follow/unfollow.
     :return: Formatted follow-request command string.
     """
-    return build_command(17, [username])
+    return build_message(17, [username])
 
 
 def build_like_video(video_id):
@@ -205,7 +219,53 @@ def build_like_video(video_id):
     :param video_id: The ID of the video to like/unlike.
     :return: Formatted like-video command string.
     """
-    return build_command(18, [video_id])
+    return build_message(18, [video_id])
+
+
+def build_req_video_range(video_id, offset):
+    """
+        Builds a command to resume the download of a video that was interrupted.
+    :param video_id: The ID of the video to resume.
+    :param offset: The amount of bytes of the video the client already has.
+    :return: Formatted request-video-range command string.
+    """
+    return build_message(22, [video_id, offset])
+
+
+def build_media_held(held_files):
+    """
+        Builds a command telling the server which media files the client already holds, so they are not sent again.
+    :param held_files: List of [file name, content hash] of the held files.
+    :return: Formatted media-held command string.
+    """
+    return build_message(24, held_files)
+
+
+def build_media_discarded(file_names):
+    """
+        Builds a command telling the server which media files the client deleted, so they are sent again if needed.
+    :param file_names: List of the deleted files' names.
+    :return: Formatted media-discarded command string.
+    """
+    return build_message(25, file_names)
+
+
+def build_capabilities(capabilities):
+    """
+        Builds a command telling the server which optional protocol capabilities the client supports.
+    :param capabilities: List of the capabilities the client supports.
+    :return: Formatted capabilities command string.
+    """
+    return build_command(96, capabilities)
+
+
+def is_capabilities(msg):
+    """
+        Checks whether a message is the server's capabilities answer.
+    :param msg: The message string to check.
+    :return: True if the message is a capabilities command, False otherwise.
+    """
+    return msg[:2] == build_capabilities([])[:2]
 
 
 # ----- Video transfer protocol -----
@@ -224,13 +284,47 @@ def build_file_details(file_name, file_size, video_name=None, video_description=
     return build_command(0, [file_name, file_size, video_name, video_description, test_link, topics])
 
 
+def build_stream_details(file_name, file_size, video_name=None, video_description=None, test_link=None, topics=None):
+    """
+        Builds a command containing the metadata of a file streamed in chunks encrypted with AES-GCM,
+        sent instead of the file details to a peer that accepted streaming.
+    :param file_name: The name of the file being transferred.
+    :param file_size: The size of the file's content in bytes.
+    :param video_name: Optional name/title of the associated video.
+    :param video_description: Optional description of the associated video.
+    :param test_link: Optional test link associated with the video.
+    :param topics: Optional list of topics associated with the video.
+    :return: Formatted stream-details command string.
+    """
+    return build_command(20, [file_name, file_size, video_name, video_description, test_link, topics])
+
+
 def is_file(msg):
     """
-        Checks whether a message corresponds to a file transfer command.
+        Checks whether a message corresponds to a file transfer command, sent whole, streamed or sealed.
     :param msg: The message string to check.
     :return: True if the message is a file transfer command, False otherwise.
     """
-    return msg[:2] == build_file_details("", "")[:2]
+    return msg[:2] in (build_file_details("", "")[:2], build_stream_details("", "")[:2]) or is_sealed(msg)
+
+
+def is_stream(msg):
+    """
+        Checks whether a file transfer command is of a file sent in chunks, streamed or sealed.
+    :param msg: The message string to check.
+    :return: True if the message is a stream-details or sealed-details command, False otherwise.
+    """
+    return msg[:2] == build_stream_details("", "")[:2] or is_sealed(msg)
+
+
+def is_sealed(msg):
+    """
+        Checks whether a file transfer command is of a stored file the server sent as it is encrypted at rest,
+        its details hold the key its chunks are encrypted with instead of the connection's key.
+    :param msg: The message string to check.
+    :return: True if the message is a sealed-details command, False otherwise.
+    """
+    return msg[:2] == build_command(21, [])[:2]
 
 
 # ----- System Manager protocol -----
@@ -243,7 +337,7 @@ def build_comment_or_video_status(id, type, status):
     :param status: The new status to assign to the item.
     :return: Formatted status-update command string.
     """
-    return build_command(98, [id, type, status])  # type - 0 - comment, 1 - video
+    return build_message(98, [id, type, status])  # type - 0 - comment, 1 - video
 
 
 def build_kick_user(username):
@@ -252,24 +346,23 @@ def build_kick_user(username):
     :param username: The username of the user to kick.
     :return: Formatted kick-user command string.
     """
-    return build_command(99, [username])
+    return build_message(99, [username])
 
 
 def unpack(data):
-    """Unpack a command string into opcode and parameters.
+    """Unpack a command into opcode and parameters.
 
-    Extracts the opcode and splits parameters by '@#' delimiter if present.
+    A command string's parameters are split by '@#' delimiter if present, a command encoded with
+    protocolCodec is decoded to its typed parameters.
 
-    :param data: Command string to unpack.
+    :param data: Command string, or encoded command bytes.
     :return: Tuple of (opcode, parameters list).
     """
-    opcode = data[:2]
-    params = []
-    if len(data) > 2:
-        params = data[2:].split("@#")
-
-    for i, v in enumerate(params):
-        if "#@" in v:
-            params[i] = v.split("#@")
+    if isinstance(data, bytes):
+        try:
+            return protocolCodec.decode(data, protocolCodec.SERVER_SCHEMAS)
+        except ValueError as e:
+            print("Error at unpacking command -", e)
+            return "", []
 
-    return opcode, params
+    return protocolCodec.unpack_text(data)
@@ -1,7 +1,9 @@
+import os
 import time
 import clientCommVideos
 import clientProtocol
 import clientComm
+import mediaCache
 import queue
 import settings
 import threading
@@ -21,6 +23,7 @@ class ClientLogic:
     def __init__(self):
         """Initialize the ClientLogic object."""
         self.recvQ = queue.Queue()
+        self.media_cache = mediaCache.MediaCache()
         self.comm = clientComm.ClientComm(self, settings.SERVER_IP, settings.PORT, self.recvQ)
         self.comm.connect()
 
@@ -62,8 +65,57 @@ class ClientLogic:
         """Quit the game.
 
         """
+        self.media_cache.save()
         self.comm.close_client()
 
+    def open_video_comm(self, video_port):
+        """Returns the communication object the user's video traffic goes through.
+
+        :param video_port: The video port sent by the server, settings.SHARED_CONNECTION_PORT if the server
+            multiplexes the video traffic over this client's connection.
+        :return: The ClientComm itself, or a connected ClientCommVideos.
+        """
+        if video_port == settings.SHARED_CONNECTION_PORT:
+            return self.comm
+
+        video_comm = clientCommVideos.ClientCommVideos(self, settings.SERVER_IP, video_port, self.recvQ)
+        video_comm.connect()
+        return video_comm
+
+    def advertise_media(self):
+        """Tells the server which media files the cache holds, so the server doesn't send them again."""
+        held_files = self.media_cache.held()
+        for i in range(0, len(held_files), settings.MEDIA_HELD_BATCH):
+            self.comm.send_msg(clientProtocol.build_media_held(held_files[i:i + settings.MEDIA_HELD_BATCH]))
+
+    def send_media_discarded(self):
+        """Tells the server which media files the cache deleted since it was last told, so they are sent again."""
+        discarded = self.media_cache.take_discarded()
+        if discarded:
+            self.comm.send_msg(clientProtocol.build_media_discarded(discarded))
+
+    def touch_video_media(self, video_obj):
+        """Marks the media files of a video the server sent the details of as recently used in the cache.
+
+        :param video_obj: The video.
+        """
+        self.media_cache.touch(f"{video_obj.video_id}.{settings.VIDEO_EXTENSION}", f"{video_obj.video_id}.png",
+                               f"{video_obj.creator}.png")
+
+    def resume_downloads(self):
+        """Requests the rest of every video whose download was interrupted, from the chunks that already arrived."""
+        for file_name in os.listdir("media"):
+            if not file_name.endswith(settings.PARTIAL_DOWNLOAD_SUFFIX):
+                continue
+
+            video_file_name = file_name[:-len(settings.PARTIAL_DOWNLOAD_SUFFIX)]
+            video_id, extension = os.path.splitext(video_file_name)
+            video_path = f"media\\{video_file_name}"
+            if video_id.isnumeric() and extension == f".{settings.VIDEO_EXTENSION}" and os.path.isfile(video_path):
+                # only whole chunks are written, an interrupted write is sent again
+                offset = os.path.getsize(video_path) // settings.FILE_CHUNK_SIZE * settings.FILE_CHUNK_SIZE
+                self.comm.send_msg(clientProtocol.build_req_video_range(int(video_id), offset))
+
     def handle_msgs(self):
         """Process incoming messages from the server.
 
@@ -75,6 +127,7 @@ class ClientLogic:
             opcode, data = clientProtocol.unpack(msg)
             if opcode in self.commands:
                 self.commands[opcode](data)
+            self.send_media_discarded()
 
     def handle_reg_confirmation(self, data):  # command 0
         """Handles the server's response to a registration request and notifies the UI.
@@ -94,9 +147,9 @@ class ClientLogic:
         status = int(status)
         if status == settings.EMAIL_VERIFICATION_SUCCESSFUL:
             username, email, video_port = data[1:]
-            video_port = int(video_port)
-            video_comm = clientCommVideos.ClientCommVideos(self, settings.SERVER_IP, video_port, self.recvQ)
-            video_comm.connect()
+            video_comm = self.open_video_comm(int(video_port))
+            self.advertise_media()
+            self.resume_downloads()
             self.user = user.User(username, 0, 0, 0, email)
 
         wx.CallAfter(pub.sendMessage, "email_verification_ans", status=status, video_comm=video_comm, user=self.user)
@@ -113,8 +166,9 @@ class ClientLogic:
             video_port, username, followers_amount, followings_amount, videos_ids, email, topics, followings_names = data[
                 1:]
 
-            video_comm = clientCommVideos.ClientCommVideos(self, settings.SERVER_IP, int(video_port), self.recvQ)
-            video_comm.connect()
+            video_comm = self.open_video_comm(int(video_port))
+            self.advertise_media()
+            self.resume_downloads()
 
             followers_amount = int(followings_amount)
             followings_amount = int(followings_amount)
@@ -152,20 +206,23 @@ class ClientLogic:
         :param data: The response data containing user details.
         """
         user_obj = self.get_user_obj(data)
+        self.media_cache.touch(f"{user_obj.username}.png")
         wx.CallAfter(pub.sendMessage, "user_details_ans", user=user_obj)
 
     @staticmethod
     def get_user_obj(data):  # helper function
         """Constructs a User object from raw response data.
 
-        :param data: A list containing username, followers amount, followings amount, and video IDs.
+        :param data: A list containing username, followers amount, followings amount, video IDs, and the cursor
+            of a user sent in a list.
         :return: A User object populated with the provided data.
         """
-        username, followers_amount, followings_amount, videos_ids = data
+        username, followers_amount, followings_amount, videos_ids, *cursor = data
         followers_amount = int(followers_amount)
         followings_amount = int(followings_amount)
         videos_ids = [int(i) for i in videos_ids]
-        user_details = user.User(username, followers_amount, followings_amount, videos_ids)
+        cursor = cursor[0] if cursor else ""  # only users sent in a list have a cursor
+        user_details = user.User(username, followers_amount, followings_amount, videos_ids, cursor=cursor)
         return user_details
 
     def handle_video_details_in_search(self, data):  # command 6
@@ -174,23 +231,24 @@ class ClientLogic:
         :param data: The response data containing video details.
         """
         video_obj = self.get_video_obj(data)
+        self.touch_video_media(video_obj)
         wx.CallAfter(pub.sendMessage, "load_video", video=video_obj)
 
     @staticmethod
     def get_video_obj(data):  # helper function
         """Constructs a Video object from raw response data.
 
-        :param data: A list containing video ID, creator, name, description, creation date, likes amount, comments amount, and liked status.
+        :param data: A list containing video ID, creator, name, description, creation date, likes amount, comments amount, liked status, test link, and the cursor of a video sent in a list.
         :return: A Video object populated with the provided data.
         """
-        video_id, creator, video_name, video_desc, created_at, likes_amount, comments_amount, liked, test_link = data
+        video_id, creator, video_name, video_desc, created_at, likes_amount, comments_amount, liked, test_link, *cursor = data
         print("video_id:", video_id, "comments amount:", comments_amount)
         video_id = int(video_id)
         comments_amount = int(comments_amount)
         likes_amount = int(likes_amount)
         liked = bool(int(liked))
         video_details = video.Video(video_id, creator, video_name, video_desc, created_at, likes_amount,
-                                    comments_amount, liked, test_link)
+                                    comments_amount, liked, test_link, *cursor)
         return video_details
 
     def handle_video_comment_confirmation(self, data):  # command 7
@@ -213,6 +271,7 @@ class ClientLogic:
         :param data: The response data containing user details.
         """
         user_obj = self.get_user_obj(data)
+        self.media_cache.touch(f"{user_obj.username}.png")
 
         wx.CallAfter(pub.sendMessage, "user_details_in_profile_ans", user=user_obj)
 
@@ -253,16 +312,17 @@ class ClientLogic:
     def handle_comments(self, data):  # command 10
         """Handles a batch of comments received from the server and notifies the UI to load them.
 
-        :param data: A list of comment info lists, each containing comment ID, video ID, commenter, content, and creation timestamp.
+        :param data: A list of comment info lists, each containing comment ID, video ID, commenter, content, creation timestamp, and cursor.
         """
         # data = [[comment_info], [comment_info]]
         comments = []
         video_id = 0
         for comment_info in data:
-            comment_id, video_id, commenter, comment_content, created_at = comment_info
+            comment_id, video_id, commenter, comment_content, created_at, cursor = comment_info
             video_id = int(video_id)
             comment_id = int(comment_id)
-            comments.append(comment.Comment(comment_id, comment_content, commenter, created_at))
+            comments.append(comment.Comment(comment_id, comment_content, commenter, created_at, cursor))
+            self.media_cache.touch(f"{commenter}.png")
             print(
                 f"comment added: comment_id: {comment_id} content: {comment_content} by {commenter} created at {created_at}")
 
@@ -304,6 +364,7 @@ class ClientLogic:
         :param data: The response data containing video details.
         """
         video_obj = self.get_video_obj(data)
+        self.touch_video_media(video_obj)
         wx.CallAfter(pub.sendMessage, "video_details_in_profile_ans", video=video_obj)
 
     def handle_user_details_in_follow_list(self, data):
@@ -312,6 +373,7 @@ class ClientLogic:
         :param data: The response data containing user details.
         """
         user_obj = self.get_user_obj(data)
+        self.media_cache.touch(f"{user_obj.username}.png")
         wx.CallAfter(pub.sendMessage, "user_details_in_follow_list_ans", user=user_obj)
 
     def handle_load_new_video(self, data):  # command 15
@@ -320,6 +382,7 @@ class ClientLogic:
         :param data: The response data containing video details.
         """
         video_obj = self.get_video_obj(data)
+        self.touch_video_media(video_obj)
         print(video_obj.video_id,"new video's test link:", video_obj.test_link)
         wx.CallAfter(pub.sendMessage, "load_new_video", video=video_obj)
 
@@ -113,7 +113,7 @@ class Comments(wx.Panel):
                 if not self.waiting_for_comments:  # if there are more comments to req from the server
                     if current >= max_pos - 40:
                         msg = clientProtocol.build_req_comments(self.video.video_id,
-                                                                self.video.get_comments()[-1].comment_id)
+                                                                self.video.get_comments()[-1].cursor)
                         self.frame.comm.send_msg(msg)
                         self.frame.comments_requests_by_feeds.append(self.parent)
                         self.waiting_for_comments = True
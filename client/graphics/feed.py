@@ -601,9 +601,9 @@ class FeedPanel(wx.Panel):
                         self.videos_ids = []
                         self.video_index = 0
                         self.waiting_for_video = True
-                        msg = clientProtocol.build_req_video()
+                        msg = clientProtocol.build_req_videos(settings.AMOUNT_OF_VIDEOS_TO_REQ)
+                        self.frame.comm.send_msg(msg)
                         for req in range(settings.AMOUNT_OF_VIDEOS_TO_REQ):
-                            self.frame.comm.send_msg(msg)
                             self.frame.video_requests_by_feeds.append(self.frame.feed_panel)
                             self.frame.comments_requests_by_feeds.append(self.frame.feed_panel)
                         print("watched all videos")
@@ -39,6 +39,7 @@ class UserProfilePanel(wx.ScrolledWindow):
         self.current_username = None  # current user username
         self.waiting_for_videos = False
         self.videos_ids = []
+        self.videos_cursor = ""  # cursor of the last video received, the next videos are requested after it
         self.videos_details = {} # [username] = [videos objects]
 
         # padded vertical sizer
@@ -125,7 +126,7 @@ class UserProfilePanel(wx.ScrolledWindow):
                 if len(self.frame.users[self.current_username].videos_ids) > len(self.videos_ids) and self.videos_ids:
                     if not self.waiting_for_videos:  # if there are more comments to req from the server
                         if current >= max_pos - 50:
-                            msg = clientProtocol.build_req_creator_videos(self.current_username, self.videos_ids[-1])
+                            msg = clientProtocol.build_req_creator_videos(self.current_username, self.videos_cursor)
                             self.frame.comm.send_msg(msg)
                             self.waiting_for_videos = True
                             self.status_label.SetLabel("waiting for videos from server")
@@ -221,6 +222,7 @@ class UserProfilePanel(wx.ScrolledWindow):
             self.videos_details[video.creator].append(video)
 
             self.videos_ids.append(video.video_id)
+            self.videos_cursor = video.cursor
 
             if self.videos_grid.GetChildren() == self.grid_columns * self.grid_rows:  # if grid is full
                 self.grid_rows += 1
@@ -265,6 +267,7 @@ class UserProfilePanel(wx.ScrolledWindow):
         self.current_username = user.username
         self.profile_info.set_user(user)
         self.videos_ids.clear()
+        self.videos_cursor = ""
         # the amount of videos to recv is either the amount of videos the user has or the limit to be sent
         self.grid_rows = math.ceil(
             min(user.get_video_amount(), settings.AMOUNT_OF_VIDEOS_TO_SEND) / self.grid_columns)
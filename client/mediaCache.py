@@ -0,0 +1,239 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import contentHash
+import settings
+
+
+class MediaCache:
+    """The media files the client keeps between runs, the pfps, thumbnails and videos the server sent.
+
+    Files are kept where the widgets load them from, media//``file_name``, and an index of them is kept on disk
+    with every file's size, modification time and content hash, so after a restart the client knows which files
+    it holds, and can tell the server, without reading them again. A file is used when the server sends a message
+    that refers to it, and the least recently used files are deleted once the files take more than the cache's
+    budget. The deleted files are kept in a list until they are taken, to tell the server to send them again.
+
+    :ivar directory: Directory the files are kept in.
+    :ivar budget: Most bytes of files kept.
+    :ivar index_path: Path of the index file.
+    :ivar entries: OrderedDict mapping a file name to [size, modification time, content hash], least recently used first.
+    :ivar total_bytes: Bytes of the files kept.
+    :ivar discarded: List of the names of the files deleted since they were last taken.
+    :ivar lock: Lock of the entries, files arrive on the connections' threads.
+    :ivar saved_at: time.monotonic() of the last time the index was saved.
+    """
+
+    def __init__(self, directory="media", budget=settings.MEDIA_CACHE_BYTES, index_path=settings.MEDIA_CACHE_INDEX_PATH):
+        """Initialize the MediaCache object, with the files of the index that were not changed since it was saved.
+
+        :param directory: Directory the files are kept in.
+        :param budget: Most bytes of files kept.
+        :param index_path: Path of the index file.
+        """
+        self.directory = directory
+        self.budget = budget
+        self.index_path = index_path
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.discarded = []
+        self.lock = threading.Lock()
+        self.saved_at = time.monotonic()
+        self.load()
+
+    def __len__(self):
+        """Amount of files kept."""
+        return len(self.entries)
+
+    def file_path(self, file_name):
+        """
+        The path a file is kept at.
+        :param file_name: The file's name
+        :return: The file's path
+        """
+        return os.path.join(self.directory, file_name)
+
+    def load(self):
+        """Reads the index, skipping files that were changed, deleted or only partly downloaded since it was saved."""
+        try:
+            with open(self.index_path, 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = []
+
+        for file_name, size, modified, file_hash in index:
+            file_path = self.file_path(file_name)
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            if stat.st_size == size and stat.st_mtime_ns == modified and \
+                    not os.path.isfile(file_path + settings.PARTIAL_DOWNLOAD_SUFFIX):
+                self.entries[file_name] = [size, modified, file_hash]
+                self.total_bytes += size
+
+        print(f"media cache holds {len(self.entries)} files, {self.total_bytes} bytes")
+
+    def save(self):
+        """Writes the index, least recently used file first, replacing the saved index at once."""
+        with self.lock:
+            index = [[file_name, *entry] for file_name, entry in self.entries.items()]
+            self.saved_at = time.monotonic()
+
+        temp_path = self.index_path + ".part"
+        with open(temp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(temp_path, self.index_path)
+
+    def add(self, file_name):
+        """
+        Keeps a file that all of it arrived, deleting the least recently used files above the budget.
+        :param file_name: The file's name
+        """
+        file_path = self.file_path(file_name)
+        file_hash = contentHash.content_hash(file_path)
+        if file_hash is None:
+            return
+        stat = os.stat(file_path)
+
+        with self.lock:
+            self._remove_entry(file_name)
+            self.entries[file_name] = [stat.st_size, stat.st_mtime_ns, file_hash]
+            self.total_bytes += stat.st_size
+            while self.total_bytes > self.budget and len(self.entries) > 1:
+                evicted_name, (size, modified, evicted_hash) = self.entries.popitem(last=False)
+                self.total_bytes -= size
+                self.discarded.append(evicted_name)
+                try:
+                    os.remove(self.file_path(evicted_name))
+                except OSError:
+                    pass
+            save = time.monotonic() - self.saved_at > settings.MEDIA_CACHE_SAVE_INTERVAL
+
+        if save:
+            self.save()
+
+    def forget(self, file_name):
+        """
+        Stops keeping a file that is being written again.
+        :param file_name: The file's name
+        """
+        with self.lock:
+            self._remove_entry(file_name)
+
+    def _remove_entry(self, file_name):
+        """
+        Removes a file's entry, without deleting the file. The lock must be held.
+        :param file_name: The file's name
+        """
+        entry = self.entries.pop(file_name, None)
+        if entry is not None:
+            self.total_bytes -= entry[0]
+
+    def touch(self, *file_names):
+        """
+        Marks files as recently used, the files that are not kept are skipped.
+        :param file_names: The files' names
+        """
+        with self.lock:
+            for file_name in file_names:
+                if file_name in self.entries:
+                    self.entries.move_to_end(file_name)
+
+    def held(self, amount=settings.MEDIA_INVENTORY_ITEMS):
+        """
+        The most recently used files, the ones the server is told the client holds.
+        :param amount: Most files returned, the server doesn't remember more than settings.MEDIA_INVENTORY_ITEMS
+        :return: List of [file name, content hash], least recently used first
+        """
+        with self.lock:
+            held_files = [[file_name, entry[2]] for file_name, entry in self.entries.items()]
+        return held_files[-amount:]
+
+    def take_discarded(self):
+        """
+        Takes the names of the files deleted since they were last taken.
+        :return: List of the files' names
+        """
+        with self.lock:
+            discarded, self.discarded = self.discarded, []
+        return discarded
+
+
+if __name__ == '__main__':
+    # reconnect benchmark - SESSIONS sessions each watch SESSION_VIDEOS videos of a catalog, popular videos more
+    # often, with the media sent again every session like before, and with the media the cache holds advertised
+    # to the server. loading and saving an index of INDEX_FILES files is also timed
+    import random
+    import shutil
+    import tempfile
+
+    CATALOG = 600
+    SESSIONS = 5
+    SESSION_VIDEOS = 300
+    VIDEO_SIZE = 4 * 1024 * 1024
+    THUMBNAIL_SIZE = 40 * 1024
+    INDEX_FILES = 5000
+
+    random.seed(0)
+    popularity = [1 / (rank + 1) for rank in range(CATALOG)]
+    sessions = [random.choices(range(CATALOG), popularity, k=SESSION_VIDEOS) for _ in range(SESSIONS)]
+
+    resent_bytes = 0
+    for session in sessions:
+        sent = set()
+        for video_id in session:
+            if video_id not in sent:
+                sent.add(video_id)
+                resent_bytes += VIDEO_SIZE + THUMBNAIL_SIZE
+
+    # the cache holds a fraction of the catalog, it is simulated by the LRU order of the videos and their sizes
+    budget = settings.MEDIA_CACHE_BYTES
+    cached = OrderedDict()
+    cached_bytes = 0
+    cache_sent_bytes = 0
+    for session in sessions:
+        for video_id in session:
+            if video_id in cached:
+                cached.move_to_end(video_id)
+                continue
+            cache_sent_bytes += VIDEO_SIZE + THUMBNAIL_SIZE
+            cached[video_id] = VIDEO_SIZE + THUMBNAIL_SIZE
+            cached_bytes += VIDEO_SIZE + THUMBNAIL_SIZE
+            while cached_bytes > budget:
+                cached_bytes -= cached.popitem(last=False)[1]
+
+    print(f"{SESSIONS} sessions of {SESSION_VIDEOS} videos - sent again every session {resent_bytes / 2 ** 20:8.0f} MB, "
+          f"with the held media advertised {cache_sent_bytes / 2 ** 20:8.0f} MB")
+
+    directory = tempfile.mkdtemp()
+    index_path = os.path.join(directory, "media_index.json")
+    cache = MediaCache(directory, index_path=index_path)
+    for i in range(INDEX_FILES):
+        file_name = f"{i}.png"
+        with open(cache.file_path(file_name), 'wb') as f:
+            f.write(os.urandom(1024))
+
+    start = time.perf_counter()
+    for i in range(INDEX_FILES):
+        cache.add(f"{i}.png")
+    add_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cache.save()
+    save_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    loaded_cache = MediaCache(directory, index_path=index_path)
+    load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    held = loaded_cache.held()
+    held_time = time.perf_counter() - start
+    print(f"index of {INDEX_FILES} files - add {add_time / INDEX_FILES * 1e6:.1f} us per file, "
+          f"save {save_time * 1000:.1f} ms, load {load_time * 1000:.1f} ms, held list {held_time * 1000:.2f} ms, "
+          f"{len(loaded_cache)} files loaded, {len(held)} advertised")
+    shutil.rmtree(directory)
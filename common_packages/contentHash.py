@@ -0,0 +1,22 @@
+import hashlib
+
+import settings
+
+
+def content_hash(file_path):
+    """
+    The hash of a media file's content, the same at the client and at the server for the same content,
+    so a file the client holds can be told apart from a file that was changed since.
+    :param file_path: Path of the file
+    :return: The hash as hex, None if the file can't be read
+    """
+    content_hasher = hashlib.blake2b(digest_size=settings.MEDIA_HASH_SIZE)
+    try:
+        with open(file_path, 'rb') as f:
+            chunk = f.read(settings.FILE_CHUNK_SIZE)
+            while chunk:
+                content_hasher.update(chunk)
+                chunk = f.read(settings.FILE_CHUNK_SIZE)
+    except OSError:
+        return None
+    return content_hasher.hexdigest()
@@ -0,0 +1,137 @@
+import aesCipher
+import settings
+
+BINARY_CHANNEL_IDS = {channel_id: channel for channel, channel_id in settings.BINARY_CHANNELS.items()}
+
+# most bytes of a received file frame when streaming was accepted, a streamed chunk. a file sent whole, to a
+# side that did not accept streaming, is a single frame of at most settings.MAX_FILE_SIZE bytes
+MAX_FILE_FRAME_SIZE = settings.FILE_CHUNK_SIZE + aesCipher.STREAM_NONCE_SIZE + aesCipher.STREAM_TAG_SIZE
+
+
+def build_frame_header(channel, data_len, binary=False):
+    """Build the channel id and length a frame's data is prefixed with.
+
+    :param channel: Channel of the frame.
+    :param data_len: Length of the frame's data.
+    :param binary: Whether to build a binary header, only if the other side accepted binary frames.
+    :return: The header's bytes.
+    """
+    if binary:
+        length_size = settings.BINARY_FILE_LENGTH_SIZE if channel == settings.FILE_CHANNEL else settings.BINARY_LENGTH_SIZE
+        return settings.BINARY_CHANNELS[channel].encode() + data_len.to_bytes(length_size, "big")
+
+    length_length = settings.FILE_LENGTH_LENGTH if channel == settings.FILE_CHANNEL else settings.MESSAGE_LENGTH_LENGTH
+    return channel.encode() + str(data_len).zfill(length_length).encode()
+
+
+def build_frame(channel, data, binary=False):
+    """Prefix data with its channel id and length.
+
+    :param channel: Channel of the frame.
+    :param data: The frame's data.
+    :param binary: Whether to build a binary frame, only if the other side accepted binary frames.
+    :return: The frame's bytes.
+    """
+    return build_frame_header(channel, len(data), binary) + data
+
+
+def parse_frame(buffer, streamed=True):
+    """Read the first full frame from a buffer.
+
+    A control message is its length, zero filled to settings.MESSAGE_LENGTH_LENGTH digits, followed
+    by the encrypted message, exactly like before multiplexing. Video channel messages and file
+    contents are prefixed by their channel id, a file content's length is zero filled to
+    settings.FILE_LENGTH_LENGTH digits. A binary frame is prefixed by its channel's binary id and a
+    big endian length, and its messages are not encoded in base64. Both kinds of frames are always
+    accepted, so messages sent before binary frames were negotiated are read too.
+
+    :param buffer: The RecvBuffer to parse, starting at a frame.
+    :param streamed: Whether streaming was accepted, so a file frame is at most a single chunk.
+    :return: Tuple of (channel, data as a memoryview of the buffer, whether the frame is binary),
+        None if the frame did not fully arrive yet.
+    :raises ValueError: If the frame's channel id or length is invalid, or its length is above the channel's maximum.
+    """
+    if not buffer:
+        return None
+
+    channel = chr(buffer.peek(1)[0])
+    binary = channel in BINARY_CHANNEL_IDS
+    length_start = 1  # the length follows the channel id
+    if binary:
+        channel = BINARY_CHANNEL_IDS[channel]
+        length_length = settings.BINARY_FILE_LENGTH_SIZE if channel == settings.FILE_CHANNEL else settings.BINARY_LENGTH_SIZE
+    elif channel.isdigit():  # the first digit of a control message's length
+        channel = settings.CONTROL_CHANNEL
+        length_start = 0
+        length_length = settings.MESSAGE_LENGTH_LENGTH
+    elif channel == settings.FILE_CHANNEL:
+        length_length = settings.FILE_LENGTH_LENGTH
+    elif channel == settings.VIDEO_CHANNEL:
+        length_length = settings.MESSAGE_LENGTH_LENGTH
+    else:
+        raise ValueError("invalid channel id")
+
+    header_length = length_start + length_length
+    if len(buffer) < header_length:
+        return None
+
+    length = buffer.peek(header_length)[length_start:]
+    data_len = int.from_bytes(length, "big") if binary else int(bytes(length))
+    if channel != settings.FILE_CHANNEL:
+        max_size = settings.MAX_MESSAGE_SIZE
+    else:
+        max_size = MAX_FILE_FRAME_SIZE if streamed else settings.MAX_FILE_SIZE
+    if data_len > max_size:
+        raise ValueError("frame is too long")
+    frame_end = header_length + data_len
+    if len(buffer) < frame_end:
+        buffer.reserve(frame_end)  # the rest of the frame is received right after its start
+        return None
+
+    buffer.consume(header_length)
+    return channel, buffer.read(data_len), binary
+
+
+def recv_frame(buffer, sock, streamed=True):
+    """Receive a single frame from a blocking socket.
+
+    :param buffer: The RecvBuffer the socket is received into.
+    :param sock: The socket to receive from.
+    :param streamed: Whether streaming was accepted, see parse_frame.
+    :return: Tuple of (channel, data as a memoryview of the buffer, whether the frame is binary),
+        None if the connection was closed.
+    :raises ValueError: If the frame's channel id or length is invalid.
+    """
+    frame = parse_frame(buffer, streamed)
+    while frame is None:
+        if not buffer.recv(sock):
+            return None
+        frame = parse_frame(buffer, streamed)
+    return frame
+
+
+if __name__ == '__main__':
+    # framing benchmark - messages are encrypted, framed, sent, received and decrypted as digits and base64 frames
+    # and as binary frames, the time per message and the bytes sent per message are compared
+    import socket
+    import time
+
+    import recvBuffer
+
+    ROUNDS = 20000
+
+    cipher = aesCipher.AESCipher("benchmark key")
+    receiver, sender = socket.socketpair()
+    for message_size in [50, 2 * 1024, 60 * 1024]:
+        msg = "x" * message_size
+        for binary in [False, True]:
+            buffer = recvBuffer.RecvBuffer()
+            start = time.perf_counter()
+            for _ in range(ROUNDS):
+                frame = build_frame(settings.CONTROL_CHANNEL, cipher.encrypt_binary(msg) if binary else cipher.encrypt(msg), binary)
+                sender.sendall(frame)
+                channel, data, is_binary = recv_frame(buffer, receiver)
+                cipher.decrypt_binary(data) if is_binary else cipher.decrypt(data)
+            took = time.perf_counter() - start
+            print(f"{message_size:6} byte messages - {'binary' if binary else 'base64':6} - "
+                  f"{took / ROUNDS * 1000000:7.1f} us/message, {len(frame):6} bytes/frame")
@@ -0,0 +1,285 @@
+import hashlib
+import hmac
+import os
+import time
+
+from Cryptodome.Protocol import DH
+from Cryptodome.PublicKey import ECC
+
+import aesCipher
+import settings
+
+# kinds of hellos, the first byte of every hello
+FULL_HANDSHAKE = b"F"  # X25519 key agreement
+RESUMED_HANDSHAKE = b"R"  # the session key is derived from a session ticket's secret, without key agreement
+REJECTED_TICKET = b"X"  # the server could not open the client's ticket, the client sends a full hello instead
+
+PUBLIC_KEY_SIZE = 32
+NONCE_SIZE = 16
+SECRET_SIZE = 32
+EXPIRY_SIZE = 8
+TICKET_SIZE = aesCipher.STREAM_NONCE_SIZE + SECRET_SIZE + EXPIRY_SIZE + aesCipher.STREAM_TAG_SIZE
+
+# sizes of the hellos by their kind, a hello's size is known from its first byte
+CLIENT_HELLO_SIZES = {FULL_HANDSHAKE: 1 + PUBLIC_KEY_SIZE, RESUMED_HANDSHAKE: 1 + NONCE_SIZE + TICKET_SIZE}
+SERVER_HELLO_SIZES = {FULL_HANDSHAKE: 1 + PUBLIC_KEY_SIZE + TICKET_SIZE, RESUMED_HANDSHAKE: 1 + NONCE_SIZE,
+                      REJECTED_TICKET: 1}
+
+SESSION_KEY_INFO = b"ucademy session key"
+RESUMPTION_SECRET_INFO = b"ucademy resumption secret"
+RESUMED_SESSION_KEY_INFO = b"ucademy resumed session key"
+TICKET_ASSOCIATED_DATA = b"ucademy session ticket"
+
+# first bytes of the nonces of each side's AEADCipher, so the sides never use the same nonce
+SERVER_NONCE_PREFIX = b"srvr"
+CLIENT_NONCE_PREFIX = b"clnt"
+
+# the key session tickets are encrypted with, tickets of a previous run of the server are rejected
+ticket_cipher = aesCipher.AESCipher(os.urandom(32))
+
+
+def hkdf(secret, salt, info, length=32):
+    """
+    Derives a key from a secret with HKDF-SHA256 (RFC 5869).
+    :param secret: The input key material
+    :param salt: The salt, bytes both sides know
+    :param info: What the key is used for, keys derived for different uses are unrelated
+    :param length: Bytes of the derived key
+    :return: The derived key
+    """
+    pseudo_random_key = hmac.digest(salt, secret, hashlib.sha256)
+    key, block = b"", b""
+    for counter in range(1, -(-length // hashlib.sha256().digest_size) + 1):
+        block = hmac.digest(pseudo_random_key, block + info + bytes([counter]), hashlib.sha256)
+        key += block
+    return key[:length]
+
+
+class KeyPair:
+    """An ephemeral X25519 key pair, made for a single key agreement.
+
+    :ivar private_key: The Cryptodome curve25519 EccKey.
+    :ivar public_key: The public key's 32 raw bytes, sent to the other side.
+    """
+
+    def __init__(self):
+        """Initialize the KeyPair object with a new key pair."""
+        self.private_key = ECC.generate(curve='curve25519')
+        self.public_key = self.private_key.public_key().export_key(format='raw')
+
+    def agree(self, other_public_key):
+        """
+        Computes the secret shared with the side that sent a public key.
+        :param other_public_key: The other side's public key, 32 raw bytes
+        :return: The shared secret
+        :raises ValueError: If the public key is not a valid X25519 public key
+        """
+        return DH.key_agreement(eph_priv=self.private_key,
+                                eph_pub=DH.import_x25519_public_key(bytes(other_public_key)),
+                                kdf=lambda shared_secret: shared_secret)
+
+
+class SessionTicket:
+    """A session ticket the server issued to the client, that lets the client's next connections resume the session.
+
+    :ivar ticket: The ticket's bytes, encrypted with a key only the server knows, sent back when resuming.
+    :ivar secret: The resumption secret the ticket holds, the resumed connections' keys are derived from.
+    :ivar expires_at: time.time() the ticket expires at.
+    """
+
+    def __init__(self, ticket, secret, expires_at):
+        """Initialize the SessionTicket object.
+
+        :param ticket: The ticket's bytes.
+        :param secret: The resumption secret the ticket holds.
+        :param expires_at: time.time() the ticket expires at.
+        """
+        self.ticket = ticket
+        self.secret = secret
+        self.expires_at = expires_at
+
+    def expired(self):
+        """Whether the ticket expired, the server rejects it then."""
+        return time.time() >= self.expires_at
+
+
+def issue_ticket(secret):
+    """
+    Issues a session ticket that holds a resumption secret, for settings.SESSION_TICKET_LIFETIME seconds.
+    :param secret: The resumption secret
+    :return: The issued SessionTicket
+    """
+    expires_at = int(time.time()) + settings.SESSION_TICKET_LIFETIME
+    ticket = ticket_cipher.encrypt_authenticated(secret + expires_at.to_bytes(EXPIRY_SIZE, "big"),
+                                                 TICKET_ASSOCIATED_DATA)
+    return SessionTicket(ticket, secret, expires_at)
+
+
+def open_ticket(ticket):
+    """
+    Gets the resumption secret of a session ticket this server issued.
+    :param ticket: The ticket's bytes
+    :return: The resumption secret, None if the ticket was not issued by this run of the server or expired
+    """
+    try:
+        content = ticket_cipher.decrypt_authenticated(bytes(ticket), TICKET_ASSOCIATED_DATA)
+    except ValueError:
+        return None
+    if time.time() >= int.from_bytes(content[SECRET_SIZE:], "big"):
+        return None
+    return content[:SECRET_SIZE]
+
+
+def server_cipher(session_key):
+    """
+    The server's cipher of a connection.
+    :param session_key: The connection's session key
+    :return: AEADCipher that encrypts with the server's nonces and decrypts the client's
+    """
+    return aesCipher.AEADCipher(session_key, SERVER_NONCE_PREFIX, CLIENT_NONCE_PREFIX)
+
+
+def client_cipher(session_key):
+    """
+    The client's cipher of a connection.
+    :param session_key: The connection's session key
+    :return: AEADCipher that encrypts with the client's nonces and decrypts the server's
+    """
+    return aesCipher.AEADCipher(session_key, CLIENT_NONCE_PREFIX, SERVER_NONCE_PREFIX)
+
+
+def hello_size(hello_start, sizes):
+    """
+    The size of a hello from its first byte.
+    :param hello_start: The hello's first bytes, at least one
+    :param sizes: CLIENT_HELLO_SIZES or SERVER_HELLO_SIZES
+    :return: The hello's size
+    :raises ValueError: If the first byte is not a kind of hello
+    """
+    size = sizes.get(bytes(hello_start[:1]))
+    if size is None:
+        raise ValueError("invalid hello")
+    return size
+
+
+def answer_hello(hello):
+    """
+    Answers a client's hello, the server's side of a connection's key exchange.
+    The client sends the first hello, a full hello with its X25519 public key, or a resumed hello with a session
+    ticket and a nonce. A full hello is answered with the server's public key and a new session ticket, and the
+    session key is derived from the shared secret. A resumed hello is answered with the server's nonce, and the
+    session key is derived from the ticket's secret and both nonces, without a key agreement. A ticket the
+    server can't open is rejected, and the client sends a full hello instead.
+    :param hello: The client's whole hello
+    :return: Tuple of (the server's hello to send, the connection's AEADCipher, None if the ticket was rejected)
+    :raises ValueError: If the hello is not valid
+    """
+    hello = bytes(hello)
+    if hello[:1] == FULL_HANDSHAKE:
+        client_public_key = hello[1:]
+        key_pair = KeyPair()
+        shared_secret = key_pair.agree(client_public_key)
+        salt = client_public_key + key_pair.public_key
+        ticket = issue_ticket(hkdf(shared_secret, salt, RESUMPTION_SECRET_INFO, SECRET_SIZE))
+        session_key = hkdf(shared_secret, salt, SESSION_KEY_INFO)
+        return FULL_HANDSHAKE + key_pair.public_key + ticket.ticket, server_cipher(session_key)
+
+    if hello[:1] == RESUMED_HANDSHAKE:
+        client_nonce, ticket = hello[1:1 + NONCE_SIZE], hello[1 + NONCE_SIZE:]
+        secret = open_ticket(ticket)
+        if secret is None:
+            return REJECTED_TICKET, None
+        server_nonce = os.urandom(NONCE_SIZE)
+        session_key = hkdf(secret, client_nonce + server_nonce, RESUMED_SESSION_KEY_INFO)
+        return RESUMED_HANDSHAKE + server_nonce, server_cipher(session_key)
+
+    raise ValueError("invalid hello")
+
+
+class ClientHandshake:
+    """The client's side of a connection's key exchange, see answer_hello.
+
+    :ivar ticket: The SessionTicket the hello resumes, None for a full hello. Set to the new ticket the server
+        issued after a full handshake.
+    :ivar key_pair: The KeyPair of a full hello, None when resuming.
+    :ivar nonce: The nonce of a resumed hello.
+    """
+
+    def __init__(self, ticket=None):
+        """Initialize the ClientHandshake object.
+
+        :param ticket: SessionTicket to resume the session of, None or an expired ticket for a full handshake.
+        """
+        self.ticket = ticket if ticket and not ticket.expired() else None
+        self.key_pair = None if self.ticket else KeyPair()
+        self.nonce = os.urandom(NONCE_SIZE)
+
+    def hello(self):
+        """
+        The client's hello, sent first.
+        :return: The hello's bytes
+        """
+        if self.ticket:
+            return RESUMED_HANDSHAKE + self.nonce + self.ticket.ticket
+        return FULL_HANDSHAKE + self.key_pair.public_key
+
+    def receive_hello(self, hello):
+        """
+        Derives the session key from the server's hello.
+        :param hello: The server's whole hello
+        :return: The connection's AEADCipher, None if the server rejected the ticket and a full hello is needed
+        :raises ValueError: If the hello is not valid
+        """
+        hello = bytes(hello)
+        if hello[:1] == FULL_HANDSHAKE and self.key_pair:
+            server_public_key = hello[1:1 + PUBLIC_KEY_SIZE]
+            shared_secret = self.key_pair.agree(server_public_key)
+            salt = self.key_pair.public_key + server_public_key
+            self.ticket = SessionTicket(hello[1 + PUBLIC_KEY_SIZE:],
+                                        hkdf(shared_secret, salt, RESUMPTION_SECRET_INFO, SECRET_SIZE),
+                                        time.time() + settings.SESSION_TICKET_LIFETIME)
+            return client_cipher(hkdf(shared_secret, salt, SESSION_KEY_INFO))
+
+        if hello[:1] == RESUMED_HANDSHAKE and self.ticket:
+            server_nonce = hello[1:]
+            return client_cipher(hkdf(self.ticket.secret, self.nonce + server_nonce, RESUMED_SESSION_KEY_INFO))
+
+        if hello[:1] == REJECTED_TICKET and self.ticket:
+            return None
+
+        raise ValueError("invalid hello")
+
+
+if __name__ == '__main__':
+    # handshake benchmark - a single thread runs HANDSHAKES full and resumed handshakes, both sides of each,
+    # and the handshakes per second per core of the server's side alone are reported
+    HANDSHAKES = 500
+
+    def full_handshake():
+        client = ClientHandshake()
+        start = time.process_time()
+        server_hello, server_cipher = answer_hello(client.hello())
+        server_time = time.process_time() - start
+        client_cipher = client.receive_hello(server_hello)
+        assert client_cipher.key == server_cipher.key
+        return server_time, client.ticket
+
+    ticket = full_handshake()[1]
+
+    def resumed_handshake():
+        client = ClientHandshake(ticket)
+        start = time.process_time()
+        server_hello, server_cipher = answer_hello(client.hello())
+        server_time = time.process_time() - start
+        client_cipher = client.receive_hello(server_hello)
+        assert client_cipher.key == server_cipher.key
+        return server_time, client.ticket
+
+    for name, handshake in [("full", full_handshake), ("resumed", resumed_handshake)]:
+        server_time = 0
+        start = time.process_time()
+        for _ in range(HANDSHAKES):
+            server_time += handshake()[0]
+        total_time = time.process_time() - start
+        print(f"{name:7} handshake - server {HANDSHAKES / server_time:8.0f} handshakes/s per core "
+              f"({server_time / HANDSHAKES * 1e6:6.0f} us), both sides {HANDSHAKES / total_time:8.0f} handshakes/s")
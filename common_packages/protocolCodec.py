@@ -0,0 +1,371 @@
+import struct
+
+# field types of a schema, lower case types are a single value and upper case types are lists
+INT = "i"  # 32 bit signed int
+STR = "s"
+INT_LIST = "I"
+STR_LIST = "S"
+STR_OR_LIST = "X"  # a string or a list of strings, sent as a list when it is one
+
+MARKER = 0xFF  # first byte of an encoded message, never the first byte of a command string
+HEADER = struct.Struct(">BBHI")  # marker, opcode, amount of params, amount of ints
+OPCODES = [str(opcode).zfill(2) for opcode in range(256)]
+
+# schemas of the commands each side sends, by opcode. a string schema has a type per param, trailing params can
+# be missing. a tuple schema holds the type of a single repeated record, params are a list of such records
+SERVER_SCHEMAS = {
+    0: INT_LIST,  # sign up status
+    1: "issi",  # email verification confirmation
+    2: "iisiiIsIS",  # sign in status
+    3: INT_LIST,  # set topics confirmation
+    4: INT_LIST,  # set filter confirmation
+    5: "siiIs",  # user details in search
+    6: "issssiiiss",  # video details in search
+    7: "iisss",  # comment status
+    8: "siiI",  # user details in profile
+    9: "iiiXXs",  # report status
+    10: ("iissss",),  # comments
+    11: "i",  # delete video confirmation
+    12: "ii",  # delete comment confirmation
+    13: "issssiiiss",  # video details in profile
+    14: "siiIs",  # user details in follow list
+    15: "issssiiis",  # video details
+    16: "i",  # video upload confirmation
+    17: "is",  # follow user status
+    18: "ii",  # like video confirmation
+    19: "",  # update pfp
+}
+
+CLIENT_SCHEMAS = {
+    0: "sss",  # sign up
+    1: "s",  # email verification code
+    2: "ss",  # sign in
+    3: (INT,),  # set topics
+    4: (INT,),  # set filter
+    5: "ss",  # search creators
+    6: "sIs",  # search videos
+    7: "is",  # comment
+    8: "s",  # user info request
+    9: "ii",  # report
+    10: "is",  # comments request
+    11: "i",  # delete video
+    12: "i",  # delete comment
+    13: "ss",  # creator videos request
+    14: "sis",  # follow list request
+    15: "i",  # video request
+    16: "sssI",  # video details
+    17: "s",  # follow request
+    18: "i",  # like video
+    22: "ii",  # video range request
+    23: "i",  # videos batch request
+    24: ("ss",),  # media held
+    25: (STR,),  # media discarded
+    98: "iii",  # comment or video status
+    99: "s",  # kick user
+}
+
+
+class Command:
+    """A command built by serverProtocol or clientProtocol, before it is encoded.
+
+    The command is encoded when it is sent, with the binary codec to a peer that accepted it, or as the
+    command string otherwise, so the same command can be sent to both.
+
+    :ivar opcode: The command's opcode.
+    :ivar params: The command's parameters, without trailing None.
+    :ivar schema: The command's schema, None if the command is only sent as a string.
+    """
+
+    def __init__(self, opcode, params, schema=None):
+        """Initialize the Command object.
+
+        :param opcode: The command's opcode.
+        :param params: List of parameters for the command.
+        :param schema: The command's schema, None if the command is only sent as a string.
+        """
+        while params and params[-1] is None:  # remove None at the end of params
+            params.pop()
+
+        self.opcode = opcode
+        self.params = params
+        self.schema = schema
+
+    def __str__(self):
+        """The command as a command string."""
+        return build_text(self.opcode, list(self.params))
+
+    def encode(self, codec=False):
+        """Encode the command to the bytes that are encrypted and sent.
+
+        :param codec: Whether the peer accepted the binary codec.
+        :return: The encoded command, or the command string's bytes.
+        """
+        if codec and self.schema is not None:
+            return encode(self.opcode, self.params, self.schema)
+        return str(self).encode('utf-8')
+
+
+def build_text(command, params):
+    """Build a command string using an opcode and parameters.
+
+    Joins parameters with '@#' delimiter and prepends the command opcode.
+
+    :param command: The opcode for the command.
+    :param params: List of parameters for the command.
+    :return: Formatted command string.
+    """
+    while params and params[-1] is None:  # remove None at the end of params
+        params.pop()
+
+    for index, value in enumerate(params):
+        if isinstance(value, (list, tuple)):
+            value = [str(i) for i in value]
+            params[index] = "#@".join(value)
+
+    params = [str(i) for i in params]
+    return str(command).zfill(2) + "@#".join(params)
+
+
+def unpack_text(data):
+    """Unpack a command string into opcode and parameters.
+
+    Extracts the opcode and splits parameters by '@#' delimiter if present.
+
+    :param data: Command string to unpack.
+    :return: Tuple of (opcode, parameters list).
+    """
+    opcode = data[:2]
+    params = []
+    if len(data) > 2:
+        params = data[2:].split("@#")
+
+    for i, v in enumerate(params):
+        if "#@" in v:
+            params[i] = v.split("#@")
+
+    return opcode, params
+
+
+def _encode_fields(codes, values, ints, strings):
+    """Add the ints and strings of params to the lists they are encoded from.
+
+    Ints, string lengths and list lengths are encoded together in a single struct, the strings follow it,
+    encoded together too. String lengths are in characters, so the strings are decoded together and sliced.
+
+    :param codes: The params' types.
+    :param values: The params.
+    :param ints: List of the ints to encode.
+    :param strings: List of the encoded strings.
+    """
+    for code, value in zip(codes, values):
+        if code == INT:
+            ints.append(int(value or 0))
+        elif code == STR:
+            value = "" if value is None else str(value)
+            ints.append(len(value))
+            strings.append(value)
+        else:
+            if code == STR_OR_LIST and not isinstance(value, (list, tuple)):
+                value = "" if value is None else str(value)
+                ints.extend((-1, len(value)))  # a length of -1 marks a single string
+                strings.append(value)
+                continue
+
+            if value is None or value == "":
+                value = []
+            elif not isinstance(value, (list, tuple)):  # a single value, like the command string sends it
+                value = [value]
+            ints.append(len(value))
+            if code == INT_LIST:
+                ints.extend(int(i) for i in value)
+            else:
+                value = [str(i) for i in value]
+                ints.extend(len(i) for i in value)
+                strings.extend(value)
+
+
+def encode(opcode, params, schema):
+    """Encode a command with the binary codec.
+
+    The encoded command is a header of the marker, the opcode, the amount of params and the amount of ints,
+    then every int of the params as a 32 bit int, then the params' strings as utf-8, without delimiters.
+
+    :param opcode: The command's opcode.
+    :param params: List of parameters for the command.
+    :param schema: The command's schema.
+    :return: The encoded command.
+    """
+    ints = []
+    strings = []
+    if isinstance(schema, tuple):
+        record = schema[0]
+        values = params if len(record) == 1 else [value for values in params for value in values]
+        _encode_fields(record * len(params), values, ints, strings)
+    else:
+        _encode_fields(schema, params, ints, strings)
+
+    return HEADER.pack(MARKER, opcode, len(params), len(ints)) + struct.pack(f">{len(ints)}i", *ints) + \
+        "".join(strings).encode('utf-8')
+
+
+def _decode_fields(codes, text, ints, index, position):
+    """Decode params encoded by _encode_fields.
+
+    :param codes: The params' types.
+    :param text: The command's strings, decoded together.
+    :param ints: The command's ints.
+    :param index: Index of the params' first int.
+    :param position: Position of the params' first string in text.
+    :return: Tuple of (params, index after the params' ints, position after the params' strings).
+    """
+    values = []
+    if codes.islower():  # every param has a single int, its value or its length
+        for code, value in zip(codes, ints[index:]):
+            if code == INT:
+                values.append(value)
+            else:
+                end = position + value
+                values.append(text[position:end])
+                position = end
+        return values, index + len(codes), position
+
+    for code in codes:
+        if code == INT:
+            values.append(ints[index])
+            index += 1
+        elif code == STR:
+            end = position + ints[index]
+            values.append(text[position:end])
+            index += 1
+            position = end
+        else:
+            length = ints[index]
+            index += 1
+            if length == -1:  # a single string of STR_OR_LIST
+                end = position + ints[index]
+                values.append(text[position:end])
+                index += 1
+                position = end
+            elif code == INT_LIST:
+                values.append(list(ints[index:index + length]))
+                index += length
+            else:
+                strings = []
+                for string_length in ints[index:index + length]:
+                    strings.append(text[position:position + string_length])
+                    position += string_length
+                values.append(strings)
+                index += length
+    return values, index, position
+
+
+def decode(data, schemas):
+    """Decode a command encoded with the binary codec.
+
+    :param data: The encoded command.
+    :param schemas: The schemas of the side that sent the command.
+    :return: Tuple of (opcode, parameters list), the opcode as the two digits of a command string.
+    :raises ValueError: If the command is not a valid encoded command.
+    """
+    try:
+        marker, opcode, count, ints_count = HEADER.unpack_from(data)
+        ints = struct.unpack_from(f">{ints_count}i", data, HEADER.size)
+        text = str(data[HEADER.size + 4 * ints_count:], 'utf-8')
+
+        schema = schemas[opcode]
+        if isinstance(schema, tuple):
+            record = schema[0]
+            params = _decode_fields(record * count, text, ints, 0, 0)[0]
+            if len(record) > 1:
+                params = [params[i:i + len(record)] for i in range(0, len(params), len(record))]
+        else:
+            params = _decode_fields(schema[:count], text, ints, 0, 0)[0]
+    except (struct.error, KeyError, IndexError, UnicodeDecodeError) as e:
+        raise ValueError(f"invalid encoded command - {e}")
+
+    return OPCODES[opcode], params
+
+
+def to_bytes(msg, codec=False):
+    """Encode a message to the bytes that are encrypted and sent.
+
+    :param msg: A Command, or a command string.
+    :param codec: Whether the peer accepted the binary codec.
+    :return: The message's bytes.
+    """
+    if isinstance(msg, Command):
+        return msg.encode(codec)
+    return msg.encode('utf-8')
+
+
+def from_bytes(data):
+    """Get a received message from its decrypted bytes.
+
+    :param data: The decrypted bytes.
+    :return: The encoded command as bytes, to be decoded by the protocol's unpack, or the command string.
+    """
+    if data[:1] == bytes([MARKER]):
+        return data
+    return data.decode('utf-8')
+
+
+if __name__ == '__main__':
+    # codec benchmark - a batch of 20 videos' details and a batch of 20 comments are encoded and decoded as
+    # command strings and with the binary codec. command strings are also decoded with their int params
+    # converted, like the handlers convert them, to compare them with the typed params the codec decodes
+    import time
+
+    ROUNDS = 5000
+
+    def to_ints(params, codes):
+        return [int(value) if code == INT else value for code, value in zip(codes, params)]
+
+    videos = [Command(13, [video_id, "creator_name", "Derivatives, part " + str(video_id),
+                           "Limits, slopes and the chain rule, with exercises at the end " * 2, "17/03/2025 18:42",
+                           120 + video_id, 14, video_id % 2, "https://forms.gle/abcdefghijk",
+                           "WyIyMDI1LTAzLTE3IDE4OjQyOjAwIiwxMDAwXQ=="], SERVER_SCHEMAS[13])
+              for video_id in range(1000, 1020)]
+    comments = Command(10, [[comment_id, 1000, "commenter", "great explanation, thanks!", "17/03/2025 18:42",
+                             "WzEsNTAwMF0="] for comment_id in range(5000, 5020)], SERVER_SCHEMAS[10])
+
+    for name, batch in [("20 videos", videos), ("20 comments", [comments])]:
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            texts = [str(command) for command in batch]
+        text_encode = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            for text in texts:
+                unpack_text(text)
+        text_decode = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            for text in texts:
+                opcode, params = unpack_text(text)
+                schema = SERVER_SCHEMAS[int(opcode)]
+                if isinstance(schema, tuple):
+                    params = [to_ints(record, schema[0]) for record in params]
+                else:
+                    params = to_ints(params, schema)
+        text_typed_decode = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            encoded = [command.encode(codec=True) for command in batch]
+        codec_encode = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            for data in encoded:
+                decode(data, SERVER_SCHEMAS)
+        codec_decode = time.perf_counter() - start
+
+        text_size = sum(len(text.encode('utf-8')) for text in texts)
+        codec_size = sum(len(data) for data in encoded)
+        print(f"{name:11} - string: encode {text_encode / ROUNDS * 1000000:5.1f} us, "
+              f"decode {text_decode / ROUNDS * 1000000:5.1f} us, "
+              f"decode with ints {text_typed_decode / ROUNDS * 1000000:5.1f} us, {text_size} bytes - "
+              f"codec: encode {codec_encode / ROUNDS * 1000000:5.1f} us, "
+              f"decode {codec_decode / ROUNDS * 1000000:5.1f} us, {codec_size} bytes")
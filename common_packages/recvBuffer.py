@@ -0,0 +1,181 @@
+import settings
+
+MAX_KEPT_SIZE = 16 * settings.RECV_BUFFER_SIZE  # a buffer grown bigger for a whole file is dropped once it was read
+
+
+class RecvBuffer:
+    """A preallocated buffer that a socket's data is received into with recv_into.
+
+    Every recv reads as many bytes as there is room for, and messages are read from the buffer as
+    memoryviews, so a message is not copied into a new bytes object and several small messages are
+    received in a single call. A view read from the buffer is valid until the next recv into it.
+    The buffer grows to fit the largest message read from it.
+
+    :ivar data: The buffer's bytearray.
+    :ivar view: memoryview of the whole buffer.
+    :ivar start: Position of the first received byte that was not read yet.
+    :ivar end: Position after the last received byte.
+    """
+
+    def __init__(self, size=settings.RECV_BUFFER_SIZE):
+        """Initialize the RecvBuffer object.
+
+        :param size: Initial size of the buffer in bytes.
+        """
+        self.data = bytearray(size)
+        self.view = memoryview(self.data)
+        self.start = 0
+        self.end = 0
+
+    def __len__(self):
+        """Amount of received bytes that were not read yet."""
+        return self.end - self.start
+
+    def reserve(self, size):
+        """Make room for a message of size bytes after the bytes that were not read yet.
+
+        The unread bytes are moved to the start of the buffer, or to a new larger buffer if they do not fit,
+        views that were read before stay valid.
+
+        :param size: Amount of unread bytes the buffer has to be able to hold.
+        """
+        if self.start + size <= len(self.data):
+            return
+
+        unread = self.view[self.start:self.end].tobytes()
+        if size > len(self.data):
+            new_size = max(size * 4, len(self.data) * 2)  # room for a few messages, so the unread part is rarely moved
+            if new_size > MAX_KEPT_SIZE:
+                new_size = max(size, MAX_KEPT_SIZE)
+            self.data = bytearray(new_size)
+            self.view = memoryview(self.data)
+        self.data[:len(unread)] = unread
+        self.start = 0
+        self.end = len(unread)
+
+    def recv(self, sock):
+        """Receive as many bytes as the socket has available, up to the room left in the buffer.
+
+        :param sock: The socket to receive from.
+        :return: Amount of bytes received, 0 if the connection was closed.
+        """
+        if len(self.data) - self.end < len(self.data) // 4:  # move the unread bytes back to make room for a big recv
+            self.reserve(len(self) + len(self.data) // 2)
+        received = sock.recv_into(self.view[self.end:])
+        self.end += received
+        return received
+
+    def fill(self, sock, size):
+        """Receive until at least size unread bytes are in the buffer, for blocking sockets.
+
+        :param sock: The socket to receive from.
+        :param size: Amount of unread bytes needed.
+        :return: True if the buffer holds size unread bytes, False if the connection was closed before.
+        """
+        self.reserve(size)
+        while len(self) < size:
+            if not self.recv(sock):
+                return False
+        return True
+
+    def peek(self, size):
+        """View unread bytes without reading them.
+
+        :param size: Amount of bytes to view.
+        :return: memoryview of the bytes.
+        """
+        return self.view[self.start:self.start + size]
+
+    def consume(self, size):
+        """Mark unread bytes as read.
+
+        :param size: Amount of bytes to mark.
+        """
+        self.start += size
+        if self.start == self.end:  # nothing left to read, the next recv writes at the start of the buffer
+            self.start = self.end = 0
+            if len(self.data) > MAX_KEPT_SIZE:
+                self.data = bytearray(settings.RECV_BUFFER_SIZE)
+                self.view = memoryview(self.data)
+
+    def read(self, size):
+        """Read unread bytes.
+
+        :param size: Amount of bytes to read.
+        :return: memoryview of the bytes, valid until the next recv into the buffer.
+        """
+        data = self.peek(size)
+        self.consume(size)
+        return data
+
+    def read_exact(self, sock, size):
+        """Receive and read exactly size bytes, for blocking sockets.
+
+        :param sock: The socket to receive from.
+        :param size: Amount of bytes to read.
+        :return: memoryview of the bytes, valid until the next recv into the buffer, None if the connection was closed.
+        """
+        if self.end - self.start < size and not self.fill(sock, size):
+            return None
+        return self.read(size)
+
+
+if __name__ == '__main__':
+    # receive benchmark - length prefixed messages are received the way the comms did before, with two recv
+    # calls per message or by extending and slicing a bytearray, and with a RecvBuffer
+    import socket
+    import threading
+    import time
+
+    TOTAL_SIZE = 256 * 1024 * 1024
+
+    def recv_exact(sock, size):
+        data = b""
+        while len(data) < size:
+            data += sock.recv(size - len(data))
+        return data
+
+    def two_recvs(sock, messages):
+        for _ in range(messages):
+            data_len = int(recv_exact(sock, settings.MESSAGE_LENGTH_LENGTH).decode())
+            recv_exact(sock, data_len)
+
+    def extend_and_slice(sock, messages):
+        buffer = bytearray()
+        received = 0
+        while received < messages:
+            buffer.extend(sock.recv(settings.RECV_BUFFER_SIZE))
+            while len(buffer) >= settings.MESSAGE_LENGTH_LENGTH:
+                message_end = settings.MESSAGE_LENGTH_LENGTH + int(buffer[:settings.MESSAGE_LENGTH_LENGTH].decode())
+                if len(buffer) < message_end:
+                    break
+                bytes(buffer[settings.MESSAGE_LENGTH_LENGTH:message_end])
+                del buffer[:message_end]
+                received += 1
+
+    def recv_buffer(sock, messages):
+        buffer = RecvBuffer()
+        for _ in range(messages):
+            data_len = int(bytes(buffer.read_exact(sock, settings.MESSAGE_LENGTH_LENGTH)))
+            buffer.read_exact(sock, data_len)
+
+    for message_size in [100, 4 * 1024, 60 * 1024]:
+        message = str(message_size).zfill(settings.MESSAGE_LENGTH_LENGTH).encode() + bytes(message_size)
+        messages = TOTAL_SIZE // len(message)
+        for name, receive in [("two recvs", two_recvs), ("extend and slice", extend_and_slice), ("RecvBuffer", recv_buffer)]:
+            receiver, sender = socket.socketpair()
+
+            def send():
+                batch = message * max(1, settings.RECV_BUFFER_SIZE // len(message))
+                batch_messages = len(batch) // len(message)
+                for _ in range(messages // batch_messages):
+                    sender.sendall(batch)
+                sender.sendall(message * (messages % batch_messages))
+
+            threading.Thread(target=send, daemon=True).start()
+            start = time.perf_counter()
+            receive(receiver, messages)
+            took = time.perf_counter() - start
+            receiver.close()
+            sender.close()
+            print(f"{message_size:6} byte messages - {name:16} - {messages * len(message) / took / 1024 / 1024:8.1f} MB/s")
@@ -1,9 +1,6 @@
 """ CONSTANTS """
-P = 919
-
-P_SIZE = len(str(P))
-
-G = 327
+SESSION_TICKET_LIFETIME = 24 * 60 * 60 # seconds a session ticket resumes connections without a key agreement
+MESSAGE_AEAD = "aes-ctr-hmac" # messages are encrypted with "aes-ctr-hmac", "aes-gcm" or "chacha20-poly1305", files (streamed or whole) with AES-GCM
 
 SERVER_IP = "127.0.0.1"
 # SERVER_IP = "192.168.4.94"
@@ -13,12 +10,64 @@ PORT = 1000
 VIDEO_PORT = 1001
 
 MESSAGE_LENGTH_LENGTH = 5
+RECV_BUFFER_SIZE = 64 * 1024 # size of a connection's preallocated receive buffer, max bytes read from a socket at once
+CLIENT_RECV_BUFFER_SIZE = 4 * 1024 # initial receive buffer of each client of the server, grows when the client sends files
+FILE_CHUNK_SIZE = 64 * 1024 # bytes of a file read and encrypted at a time when streaming it, multiple of 16
+MAX_MESSAGE_SIZE = 1024 * 1024 # most bytes of a received message frame, a longer frame closes the connection
+MAX_FILE_SIZE = 256 * 1024 * 1024 # most bytes of a file received whole, from a side that did not accept streaming
+
+# connection channels - video traffic is multiplexed over the client's connection when both sides support it
+MULTIPLEX_VIDEO = True
+MULTIPLEX_CAPABILITY = "multiplex"
+CONTROL_CHANNEL = "" # control messages are not prefixed by a channel id, like before multiplexing
+VIDEO_CHANNEL = "V" # messages that are sent over the video connection when not multiplexing
+FILE_CHANNEL = "F" # files' content
+FILE_LENGTH_LENGTH = 10
+BINARY_FRAMES = True # frames have a binary length and raw ciphertext instead of digits and base64, if both sides accept it
+BINARY_CAPABILITY = "binary"
+BINARY_CHANNELS = {CONTROL_CHANNEL: "c", VIDEO_CHANNEL: "v", FILE_CHANNEL: "f"} # channel ids of binary frames
+BINARY_LENGTH_SIZE = 4 # bytes of a binary frame's big endian length
+BINARY_FILE_LENGTH_SIZE = 8
+PROTOCOL_CODEC = True # commands are encoded with protocolCodec instead of as delimited strings, if both sides accept it
+CODEC_CAPABILITY = "codec"
+SHARED_CONNECTION_PORT = 0 # video port sent to a client whose video traffic is multiplexed over its connection
+STREAM_FILES = True
+STREAM_CAPABILITY = "stream" # files are sent as chunks encrypted with AES-GCM, each chunk is decrypted as it arrives
+SEALED_MEDIA = True
+SEALED_CAPABILITY = "sealed" # stored media is sent as it is encrypted at rest, with its file key, using sendfile
+MEDIA_KEY_PATH = "media_key.bin" # server key the per-file keys of the media encrypted at rest are wrapped with
+PLAYBACK_PREFIX_CHUNKS = 8 # chunks of a video sent before its details, so it can start playing while the rest arrives
+PARTIAL_DOWNLOAD_SUFFIX = ".partial" # marks a file whose download was interrupted, its verified chunks are kept
+MEDIA_INVENTORY_ITEMS = 5000 # most pfps, videos and thumbnails the server remembers a client holds, older ones are sent again
+MEDIA_HASH_SIZE = 16 # bytes of a media file's content hash
+MEDIA_CACHE_BYTES = 1024 * 1024 * 1024 # most bytes of media the client keeps, the least recently used files are deleted
+MEDIA_CACHE_INDEX_PATH = "media\\media_index.json" # the client's index of the media it keeps, kept between runs
+MEDIA_CACHE_SAVE_INTERVAL = 30 # seconds between saves of the client's media index while files arrive
+MEDIA_HELD_BATCH = 500 # amount of held media files the client advertises in a single message
+
+HANDLER_WORKERS = 1 # amount of threads handling clients' messages at the server, 1 handles them on the logic's thread
+ASYNC_COMM = False # serve all clients on one asyncio event loop, with one shared video port, instead of threads
+DB_CONNECTION_PER_THREAD = True # every thread using the database has its own connection, instead of sharing one
+DB_BUSY_TIMEOUT = 10 # seconds a connection waits for another connection's write to finish before failing
+DB_MMAP_SIZE = 256 * 1024 * 1024 # bytes of the database file read through memory mapping
+DB_CACHE_SIZE = 16 * 1024 * 1024 # bytes of pages cached by every connection
+DB_GROUP_COMMIT = True # views, likes and report notifications are written together in one transaction, not each alone
+DB_FLUSH_INTERVAL = 0.05 # seconds a buffered write waits for more writes to be committed with it
+DB_FLUSH_ROWS = 500 # amount of buffered writes that are committed without waiting for the interval to pass
+IN_MEMORY_RECOMMENDER = True # feed videos are recommended from sorted lists kept in memory, not by aggregate queries
+MIN_INDEXED_SEARCH_LENGTH = 3 # shorter video searches scan the videos, the search index is made of 3 letter parts
+SEARCH_VIEWS_WEIGHT = 1 # a video with many views ranks up to twice as relevant as a video without views
+SEARCH_VIEWS_HALF = 100 # amount of views that gets half of the views' weight
+USERNAME_INDEX = True # creators are searched in a trigram index of the active usernames kept in memory
+HOT_CACHE_TTL = 30 # seconds videos' details, users' summaries and first comment pages are kept in the server's caches
+HOT_CACHE_ITEMS = 10000 # most values kept in each of the server's caches, 0 turns the caches off
 
 PHYSICAL_FPS = 60
 
 AMOUNT_OF_USERS_TO_SEND = 20
 AMOUNT_OF_VIDEOS_TO_SEND = 20
 AMOUNT_OF_VIDEOS_TO_REQ = 4 # amount of videos to request from server when first moving to feed
+MAX_VIDEOS_TO_REQ = 10 # most videos the server sends for a single feed request
 AMOUNT_OF_COMMENTS_TO_SEND = 20
 
 MAX_VIDEO_LENGTH = 2 # minutes
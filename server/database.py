@@ -1,16 +1,83 @@
+import base64
+import json
 import sqlite3
+import threading
 from datetime import datetime
 
+import recommender
+import settings
+import usernameIndex
+
+
+def encode_cursor(*key):
+    """
+    Builds the cursor a list is continued from after an item, clients send it back without reading it.
+    :param key: The values the list is ordered by, of the item
+    :return: The cursor, a url safe base64 string
+    """
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(",", ":")).encode()).decode()
+
+
+def decode_cursor(cursor, key_types):
+    """
+    Gets the key a list is continued from out of a cursor built by encode_cursor.
+    :param cursor: The cursor, an empty cursor starts the list
+    :param key_types: Tuple of the types of the values the list is ordered by, a value's type is a type or
+        a tuple of types, like (int, float) for a number
+    :return: List of the key's values, None for an empty cursor
+    :raises ValueError: If the cursor was not built by encode_cursor for such a list
+    """
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(str(cursor).encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"invalid cursor - {e}")
+    if not isinstance(key, list) or len(key) != len(key_types):
+        raise ValueError("invalid cursor - wrong key")
+    for value, value_type in zip(key, key_types):
+        # a client's cursor reaches the queries' parameters, bool is an int but is not a key's value
+        if isinstance(value, bool) or not isinstance(value, value_type):
+            raise ValueError("invalid cursor - wrong key")
+    return key
+
 
 class DataBase:
 
-    def __init__(self):
-        """
-        Opens a connection to the SQLite database and initializes all tables.
+    def __init__(self, path="ucademy.db", connection_per_thread=settings.DB_CONNECTION_PER_THREAD,
+                 group_commit=settings.DB_GROUP_COMMIT, in_memory_recommender=settings.IN_MEMORY_RECOMMENDER,
+                 username_index=settings.USERNAME_INDEX):
+        """
+        Opens a connection to the SQLite database, initializes all tables and migrates their schema.
+        :param path: Path of the database file
+        :param connection_per_thread: Whether every thread using the database opens its own connection,
+            instead of all of them sharing a single connection
+        :param group_commit: Whether views, likes and report notifications are buffered and committed together
+            by a flushing thread, instead of every one of them committed on its own
+        :param in_memory_recommender: Whether feed videos are recommended by a recommender.Recommender loaded
+            from the database, instead of by the recommendation queries
+        :param username_index: Whether creators are searched in a usernameIndex.UsernameIndex of the active
+            users, instead of by a LIKE query
         :return: Creates all required tables in the database if they do not exist
         """
-        self.conn = sqlite3.connect("ucademy.db")
-        self.cur = self.conn.cursor()
+        self.path = path
+        self.thread_data = threading.local()
+        self.connections = []  # every connection that was opened, closed together
+        self.connections_lock = threading.Lock()
+        # a shared connection is used by the logic's handler threads together, each thread uses its own cursor
+        self.shared_conn = None if connection_per_thread else self._connect()
+
+        self.group_commit = group_commit
+        self.closed = False
+        self.pending = {}  # [row key] = (statement, params), the buffered writes, the last write of a row wins
+        self.pending_usernames = set()  # users that have buffered writes
+        self.flushing = {}  # the buffered writes being committed
+        self.flushing_usernames = set()
+        self.pending_condition = threading.Condition()  # guards pending, notifies the flushing thread
+        self.flush_lock = threading.Lock()  # a single flush commits at a time, so the writes are committed in order
+        self.flush_conn = None  # the flushes' own connection, so a flush never commits a handler's transaction
+        if group_commit:
+            threading.Thread(target=self._flush_loop, daemon=True).start()
 
         self._create_users_table()
         self._create_videos_table()
@@ -24,13 +91,184 @@ class DataBase:
         self._create_reports_table()
         self._create_system_managers_table()
 
+        self._migrate()
+
+        self.recommender = None
+        if in_memory_recommender:
+            self._load_recommender()
+
+        self.username_index = None
+        if username_index:
+            self.cur.execute("SELECT username FROM live_users")
+            self.username_index = usernameIndex.UsernameIndex(i[0] for i in self.cur.fetchall())
+
     # ==== db in general ====
+    def _connect(self):
+        """
+        Opens a connection to the database file.
+        The database is in WAL mode, so readers read the last committed data without waiting for the
+        connection that writes, and a commit is only synced at checkpoints.
+        :return: The new connection
+        """
+        conn = sqlite3.connect(self.path, timeout=settings.DB_BUSY_TIMEOUT, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA mmap_size = {settings.DB_MMAP_SIZE}")
+        conn.execute(f"PRAGMA cache_size = -{settings.DB_CACHE_SIZE // 1024}")  # negative is in KiB
+        with self.connections_lock:
+            self.connections.append(conn)
+        return conn
+
+    @property
+    def conn(self):
+        """
+        The connection of the calling thread, opened on its first use, so the transactions of handlers
+        running on different threads do not commit each other's writes.
+        The database's threads are the logic's thread and the dispatcher's workers, so the amount of
+        connections is bounded by settings.HANDLER_WORKERS.
+        :return: The calling thread's connection, or the shared connection
+        """
+        if self.shared_conn:
+            return self.shared_conn
+        if not hasattr(self.thread_data, "conn"):
+            self.thread_data.conn = self._connect()
+        return self.thread_data.conn
+
+    @property
+    def cur(self):
+        """
+        The cursor of the calling thread, so handlers running on different threads
+        do not overwrite each other's results.
+        :return: The calling thread's cursor
+        """
+        if not hasattr(self.thread_data, "cur"):
+            self.thread_data.cur = self.conn.cursor()
+        return self.thread_data.cur
+
     def close(self):
         """
-        Closes the database connection.
-        :return: Closes the active database connection
+        Commits the buffered writes and closes the database connections.
+        :return: Closes the connections of every thread that used the database
+        """
+        self.closed = True
+        with self.pending_condition:
+            self.pending_condition.notify()
+        self.flush()
+        with self.connections_lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections = []
+
+    # ===== group commit =====
+
+    def _buffered_write(self, key, username, statement, params):
+        """
+        Writes a row, buffered until the next group commit when group commit is on.
+        :param key: Key of the row written, a later write of the same row replaces this one
+        :param username: The user the write is of, whose reads flush it first
+        :param statement: The statement writing the row
+        :param params: The statement's parameters
+        """
+        self._buffered_writes(username, [(key, statement, params)])
+
+    def _buffered_writes(self, username, writes):
+        """
+        Writes rows together, in the same group commit when group commit is on, or in one transaction.
+        :param username: The user the writes are of, whose reads flush them first
+        :param writes: List of (key, statement, params) of the rows, like _buffered_write's parameters
+        """
+        if not self.group_commit:
+            for key, statement, params in writes:
+                self.cur.execute(statement, params)
+            self.conn.commit()
+            return
+
+        with self.pending_condition:
+            was_empty = not self.pending
+            for key, statement, params in writes:
+                self.pending[key] = (statement, params)
+            self.pending_usernames.add(username)
+            if was_empty or len(self.pending) >= settings.DB_FLUSH_ROWS:
+                self.pending_condition.notify()
+
+    def _buffered_row(self, key):
+        """
+        Gets the buffered write of a row that was not committed yet.
+        :param key: Key of the row
+        :return: Tuple of (statement, params) of the row's last write, None if it has no buffered write
+        """
+        with self.pending_condition:
+            return self.pending.get(key) or self.flushing.get(key)
+
+    def _flush_if_pending(self, username):
+        """
+        Commits the buffered writes if a user has some, so the user's reads see the user's own writes.
+        :param username: The user that reads
+        """
+        if username in self.pending_usernames or username in self.flushing_usernames:
+            self.flush()
+
+    def flush_video_likes(self, video_id):
+        """
+        Commits the buffered writes if a video has buffered likes, so its likes amount counts them, like before
+        caching the video's details.
+        :param video_id: ID of the video
         """
-        self.conn.close()
+        with self.pending_condition:
+            buffered = any(key[:2] == ("likes", int(video_id)) for key in [*self.pending, *self.flushing])
+        if buffered:
+            self.flush()
+
+    def flush(self):
+        """
+        Commits the buffered writes in a single transaction, a single executemany for every statement, on
+        a connection of their own, so a shared connection's handler transactions are not committed with them.
+        Writes whose transaction failed because the database stayed locked for longer than the busy timeout
+        are buffered again and retried by the next flush, behind any newer write of the same row. Writes that
+        failed for any other reason would fail again, so they are dropped.
+        """
+        with self.flush_lock:
+            if self.flush_conn is None:
+                self.flush_conn = self._connect()
+            with self.pending_condition:
+                self.flushing, self.pending = self.pending, {}
+                self.flushing_usernames, self.pending_usernames = self.pending_usernames, set()
+
+            if self.flushing:
+                rows = {}  # [statement] = [params, ...]
+                for statement, params in self.flushing.values():
+                    rows.setdefault(statement, []).append(params)
+                try:
+                    for statement, params in rows.items():
+                        self.flush_conn.executemany(statement, params)
+                    self.flush_conn.commit()
+                except sqlite3.Error as e:
+                    self.flush_conn.rollback()
+                    if isinstance(e, sqlite3.OperationalError) and ("locked" in str(e) or "busy" in str(e)):
+                        print(f"error at committing buffered writes, retrying {len(self.flushing)} of them -", e)
+                        with self.pending_condition:
+                            failed = self.flushing
+                            failed.update(self.pending)  # a write buffered since replaces the failed write of its row
+                            self.pending = failed
+                            self.pending_usernames |= self.flushing_usernames
+                    else:
+                        print(f"error at committing buffered writes, dropping {len(self.flushing)} of them -", e)
+
+            with self.pending_condition:
+                self.flushing = {}
+                self.flushing_usernames = set()
+
+    def _flush_loop(self):
+        """
+        Commits the buffered writes once DB_FLUSH_INTERVAL passed since the first of them was buffered,
+        or once DB_FLUSH_ROWS of them are buffered.
+        """
+        while not self.closed:
+            with self.pending_condition:
+                self.pending_condition.wait_for(lambda: self.pending or self.closed)
+                self.pending_condition.wait_for(lambda: len(self.pending) >= settings.DB_FLUSH_ROWS or self.closed,
+                                                settings.DB_FLUSH_INTERVAL)
+            self.flush()
 
     def print_tables(self):
         """
@@ -57,7 +295,7 @@ class DataBase:
         CREATE TABLE IF NOT EXISTS users (
             username TEXT PRIMARY KEY,
             email TEXT,
-            password_hash TEXT
+            password_hash TEXT,
             deleted INTEGER DEFAULT 0
         ) """)
         self.conn.commit()
@@ -220,29 +458,218 @@ class DataBase:
         """)
         self.conn.commit()
 
-    # ===== users =====
-
-    def get_deleted_usernames(self):
-        """
-            returns every username of a user that has been deleted
-        :return: list of deleted usernames
+    # ===== schema migrations =====
+
+    def _migrate(self):
+        """
+        Brings the schema of the database up to date by running the migrations it did not run yet, in order.
+        The schema's version is the amount of migrations that ran, kept in the database's user_version,
+        and every migration runs in a transaction together with setting the version it migrated to.
+        """
+        migrations = [self._add_users_deleted_column, self._create_indexes, self._create_video_stats,
+                      self._create_videos_search_index, self._create_comments_commenter_index,
+                      self._create_live_views]
+
+        self.cur.execute("PRAGMA user_version")
+        version = self.cur.fetchone()[0]
+        for version, migration in enumerate(migrations[version:], version + 1):
+            self.cur.execute("BEGIN")
+            try:
+                migration()
+                self.cur.execute(f"PRAGMA user_version = {version}")
+                self.conn.commit()
+            except sqlite3.Error:
+                self.conn.rollback()
+                raise
+            print(f"database migrated to schema version {version} - {migration.__name__}")
+
+    def _add_users_deleted_column(self):
+        """
+        Migration 1 - adds the deleted column to a users table created without it,
+        when a missing comma in its create statement made it a part of the password_hash column's type.
+        """
+        self.cur.execute("PRAGMA table_info(users)")
+        if "deleted" not in [column[1] for column in self.cur.fetchall()]:
+            self.cur.execute("ALTER TABLE users ADD COLUMN deleted INTEGER DEFAULT 0")
+
+    def _create_indexes(self):
+        """
+        Migration 2 - creates the secondary indexes of the lookups that are not by a primary key,
+        holding the columns the lookups read so they are answered from the index alone.
+        likes is already indexed by video_id, the first column of its primary key.
+        """
+        # comments of a video, counting them and its deleted comments, comment_id is the rowid every index holds
+        self.cur.execute("CREATE INDEX IF NOT EXISTS comments_video_idx ON comments (video_id, deleted)")
+        # a creator's videos, newest first
+        self.cur.execute("CREATE INDEX IF NOT EXISTS videos_creator_idx ON videos (creator, deleted, created_at)")
+        # views of a video, the primary key is by username first
+        self.cur.execute("CREATE INDEX IF NOT EXISTS watched_videos_video_idx ON watched_videos (video_id, username)")
+        # followers of a user, the primary key is by follower first
+        self.cur.execute("CREATE INDEX IF NOT EXISTS following_followed_idx ON following (followed, follower)")
+        # reports of a target, the primary key is by reporter first
+        self.cur.execute("""CREATE INDEX IF NOT EXISTS reports_target_idx
+                            ON reports (target_id, target_type, status)""")
+        # videos of a topic, the primary key is by video_id first
+        self.cur.execute("CREATE INDEX IF NOT EXISTS video_topics_topic_idx ON video_topics (topic, video_id)")
+        # users are looked up by username or email regardless of case
+        self.cur.execute("CREATE INDEX IF NOT EXISTS users_username_nocase_idx ON users (username COLLATE NOCASE)")
+        self.cur.execute("CREATE INDEX IF NOT EXISTS users_email_nocase_idx ON users (email COLLATE NOCASE)")
+
+    def _create_video_stats(self):
+        """
+        Migration 3 - creates the video_stats table, every video's views, likes and comments amounts and its
+        likes to views ratio the recommendations are ordered by. The amounts are kept up to date by triggers
+        on the tables they count, so buffered writes that were ignored as duplicates are not counted.
+        """
+        # a video with less than 10 views does not have a meaningful ratio yet, it gets an average one
+        self.cur.execute("""
+            CREATE TABLE IF NOT EXISTS video_stats (
+                video_id INTEGER PRIMARY KEY,
+                views INTEGER DEFAULT 0,
+                likes INTEGER DEFAULT 0,
+                comments INTEGER DEFAULT 0,
+                like_view_ratio REAL GENERATED ALWAYS AS (
+                    CASE WHEN views < 10 THEN 0.5 ELSE CAST(likes AS REAL) / views END
+                ) VIRTUAL
+            )
+        """)
+        self.cur.execute("CREATE INDEX IF NOT EXISTS video_stats_ratio_idx ON video_stats (like_view_ratio)")
+
+        self.cur.execute("""CREATE TRIGGER IF NOT EXISTS video_stats_add_video AFTER INSERT ON videos BEGIN
+                                INSERT OR IGNORE INTO video_stats (video_id) VALUES (NEW.video_id);
+                            END""")
+        for table, column in [("watched_videos", "views"), ("likes", "likes"), ("comments", "comments")]:
+            self.cur.execute(f"""CREATE TRIGGER IF NOT EXISTS video_stats_add_{column} AFTER INSERT ON {table} BEGIN
+                                     UPDATE video_stats SET {column} = {column} + 1 WHERE video_id = NEW.video_id;
+                                 END""")
+            self.cur.execute(f"""CREATE TRIGGER IF NOT EXISTS video_stats_remove_{column} AFTER DELETE ON {table} BEGIN
+                                     UPDATE video_stats SET {column} = {column} - 1 WHERE video_id = OLD.video_id;
+                                 END""")
+
+        self._count_video_stats()
+
+    def _count_video_stats(self):
+        """
+        Counts the views, likes and comments of every video into video_stats, without committing.
+        :return: Amount of videos whose stats were different from their counts
+        """
+        counts = """SELECT videos.video_id,
+                           (SELECT COUNT(*) FROM watched_videos WHERE video_id = videos.video_id) AS views,
+                           (SELECT COUNT(*) FROM likes WHERE video_id = videos.video_id) AS likes,
+                           (SELECT COUNT(*) FROM comments WHERE video_id = videos.video_id AND deleted = 0) AS comments
+                    FROM videos"""
+
+        self.cur.execute(f"""SELECT COUNT(*)
+                             FROM ({counts}) AS counts
+                             LEFT JOIN video_stats ON video_stats.video_id = counts.video_id
+                             WHERE video_stats.video_id IS NULL OR video_stats.views != counts.views
+                                OR video_stats.likes != counts.likes OR video_stats.comments != counts.comments""")
+        drifted = self.cur.fetchone()[0]
+
+        self.cur.execute("DELETE FROM video_stats")
+        self.cur.execute(f"INSERT INTO video_stats (video_id, views, likes, comments) {counts}")
+        return drifted
+
+    def _create_videos_search_index(self):
+        """
+        Migration 4 - creates videos_search, a full text index of the live videos' names and descriptions.
+        The index is split into trigrams, so a search matches any part of a word like the LIKE search did.
+        It is kept in sync by triggers adding uploaded videos to it and removing deleted videos from it,
+        and its text is read from the videos table instead of being stored twice.
         """
-        self.cur.execute("SELECT username FROM users WHERE deleted = 1 ")
-        return [i[0] for i in self.cur.fetchall()]
+        self.cur.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS videos_search USING fts5 (
+                name, description, content = 'videos', content_rowid = 'video_id', tokenize = 'trigram'
+            )
+        """)
+        self.cur.execute("""CREATE TRIGGER IF NOT EXISTS videos_search_add AFTER INSERT ON videos
+                            WHEN NEW.deleted = 0 BEGIN
+                                INSERT INTO videos_search (rowid, name, description)
+                                VALUES (NEW.video_id, NEW.name, NEW.description);
+                            END""")
+        self.cur.execute("""CREATE TRIGGER IF NOT EXISTS videos_search_remove AFTER UPDATE OF deleted ON videos
+                            WHEN OLD.deleted = 0 AND NEW.deleted = 1 BEGIN
+                                INSERT INTO videos_search (videos_search, rowid, name, description)
+                                VALUES ('delete', OLD.video_id, OLD.name, OLD.description);
+                            END""")
+        self.cur.execute("""INSERT INTO videos_search (rowid, name, description)
+                            SELECT video_id, name, description FROM videos WHERE deleted = 0""")
+
+    def _create_comments_commenter_index(self):
+        """
+        Migration 5 - indexes a video's comments by commenter, so a page of the requesting user's own comments,
+        which are sent first, is read in order from the index instead of sorting all of the video's comments.
+        """
+        self.cur.execute("""CREATE INDEX IF NOT EXISTS comments_video_commenter_idx
+                            ON comments (video_id, commenter, deleted)""")
+
+    def _create_live_views(self):
+        """
+        Migration 6 - creates the live_users, live_videos and live_comments views, the rows that were not deleted,
+        which every read of active rows selects from instead of filtering deleted ids in Python. A view's
+        deleted = 0 condition is merged into the queries selecting from it, so they use the indexes of the table.
+        The comments amount in video_stats is changed to count only live comments, like the comments sent.
+        """
+        for table in ["users", "videos", "comments"]:
+            self.cur.execute(f"CREATE VIEW IF NOT EXISTS live_{table} AS SELECT * FROM {table} WHERE deleted = 0")
+
+        self.cur.execute("DROP TRIGGER IF EXISTS video_stats_add_comments")
+        self.cur.execute("DROP TRIGGER IF EXISTS video_stats_remove_comments")
+        self.cur.execute("""CREATE TRIGGER video_stats_add_comments AFTER INSERT ON comments
+                            WHEN NEW.deleted = 0 BEGIN
+                                UPDATE video_stats SET comments = comments + 1 WHERE video_id = NEW.video_id;
+                            END""")
+        self.cur.execute("""CREATE TRIGGER video_stats_remove_comments AFTER DELETE ON comments
+                            WHEN OLD.deleted = 0 BEGIN
+                                UPDATE video_stats SET comments = comments - 1 WHERE video_id = OLD.video_id;
+                            END""")
+        self.cur.execute("""CREATE TRIGGER IF NOT EXISTS video_stats_delete_comment AFTER UPDATE OF deleted ON comments
+                            WHEN OLD.deleted = 0 AND NEW.deleted = 1 BEGIN
+                                UPDATE video_stats SET comments = comments - 1 WHERE video_id = OLD.video_id;
+                            END""")
+        self.cur.execute("""UPDATE video_stats
+                            SET comments = (SELECT COUNT(*) FROM live_comments
+                                            WHERE live_comments.video_id = video_stats.video_id)""")
+
+    def rebuild_video_stats(self):
+        """
+        Recounts video_stats from the tables it counts, reconciling stats that drifted from them,
+        like after rows were changed with the triggers off or by an older version of the server.
+        :return: Amount of videos whose stats were different from their counts
+        """
+        self.flush()
+        drifted = self._count_video_stats()
+        self.conn.commit()
+        if self.recommender:
+            self._load_recommender()
+        return drifted
+
+    # ===== users =====
 
     def delete_user(self, username):
         """
-        Removes a user from the database.
+        Marks a user as deleted. Their followings are kept, the follow lists and counts read only live users.
         :param username: Username of the user to delete
         """
         self.cur.execute("UPDATE users SET deleted = 1 WHERE username = ? COLLATE NOCASE", (username,))
         self.conn.commit()
+        if self.username_index:
+            self.username_index.remove(username)
 
     def user_exists(self, username):
         """
-        Checks whether a user exists.
+        Checks whether a user exists and was not deleted.
+        :param username: Username to check
+        :return: True if the user is a live user, False otherwise
+        """
+        self.cur.execute("SELECT 1 FROM live_users WHERE username = ? COLLATE NOCASE", (username,))
+        return self.cur.fetchone() is not None
+
+    def username_taken(self, username):
+        """
+        Checks whether a username belongs to a user, deleted users included, so it can't be signed up with again.
         :param username: Username to check
-        :return: True if the user exists in the users table, False otherwise
+        :return: True if the username is in the users table, False otherwise
         """
         self.cur.execute("SELECT 1 FROM users WHERE username = ? COLLATE NOCASE", (username,))
         return self.cur.fetchone() is not None
@@ -277,24 +704,64 @@ class DataBase:
         :return: Inserts a new row into the users table if the username is available
         """
         added = False
-        if not self.user_exists(username):
-            self.cur.execute("INSERT INTO users VALUES (?,?,?)", (username, email, password_hash))
+        if not self.username_taken(username):
+            self.cur.execute("INSERT INTO users (username, email, password_hash) VALUES (?,?,?)",
+                             (username, email, password_hash))
             self.conn.commit()
             added = True
+            if self.username_index:
+                self.username_index.add(username)
         return added
 
     def get_similar_usernames(self, username):
         """
-        Retrieves users whose usernames contain the username inputted
+        Retrieves active users whose usernames contain the username inputted
         :param username: Username to check
-        :return: List of matching usernames
+        :return: List of matching usernames, ranked by the username index when it is used
         """
-        self.cur.execute("SELECT username FROM users WHERE username LIKE ? COLLATE NOCASE AND deleted = 0", ("%" + username + "%",))
+        if self.username_index:
+            return self.username_index.search(username)
+
+        self.cur.execute("SELECT username FROM live_users WHERE username LIKE ? COLLATE NOCASE", ("%" + username + "%",))
         res = self.cur.fetchall()
         if res:
             res = [i[0] for i in res]
         return res
 
+    def get_similar_usernames_page(self, username, cursor="", amount=settings.AMOUNT_OF_USERS_TO_SEND):
+        """
+        Retrieves a page of the active users whose usernames contain the username inputted, the exact username
+        first, then the usernames starting with it, then the others, alphabetically within each.
+        :param username: Username to check
+        :param cursor: cursor of the last user of the previous page, empty for the first page
+        :param amount: Most usernames to retrieve
+        :return: List of (username, cursor of the user) of the page's usernames
+        :raises ValueError: If the cursor is invalid
+        """
+        key = decode_cursor(cursor, (int, str))  # (rank, lowercase username)
+        if self.username_index:
+            found = self.username_index.search_ranked(username, amount, key and tuple(key))
+            return [(found_username, encode_cursor(rank, lower)) for rank, lower, found_username in found]
+
+        lower_search = username.lower()
+        query = """
+                SELECT username, rank, lower FROM (
+                    SELECT username, lower(username) AS lower,
+                           CASE WHEN lower(username) = ? THEN 0 WHEN substr(lower(username), 1, ?) = ? THEN 1
+                                ELSE 2 END AS rank
+                    FROM live_users
+                    WHERE username LIKE ? COLLATE NOCASE)
+                """
+        params = [lower_search, len(lower_search), lower_search, "%" + username + "%"]
+        if key is not None:
+            query += "WHERE (rank, lower) > (?, ?) "
+            params.extend(key)
+        query += "ORDER BY rank, lower LIMIT ?"
+        params.append(amount)
+
+        self.cur.execute(query, params)
+        return [(found_username, encode_cursor(rank, lower)) for found_username, rank, lower in self.cur.fetchall()]
+
     def get_user_email(self, username):
         """
         Retrieves the email of a user.
@@ -321,6 +788,27 @@ class DataBase:
 
     # ===== videos =====
 
+    def get_videos_by_creator_page(self, username, cursor="", amount=settings.AMOUNT_OF_VIDEOS_TO_SEND):
+        """
+        Retrieves a page of the active videos of a creator, newest first.
+        :param username: Creator username
+        :param cursor: cursor of the last video of the previous page, empty for the first page
+        :param amount: Most videos to retrieve
+        :return: List of (video ID, cursor of the video) of the page's videos
+        :raises ValueError: If the cursor is invalid
+        """
+        key = decode_cursor(cursor, (str, int))  # (created_at, video_id)
+        query = "SELECT video_id, created_at FROM live_videos WHERE creator = ? "
+        params = [username]
+        if key is not None:
+            query += "AND (created_at, video_id) < (?, ?) "
+            params.extend(key)
+        query += "ORDER BY created_at DESC, video_id DESC LIMIT ?"
+        params.append(amount)
+
+        self.cur.execute(query, params)
+        return [(video_id, encode_cursor(created_at, video_id)) for video_id, created_at in self.cur.fetchall()]
+
     def get_videos_by_creator(self, username, matter_deleted=True):
         """
         Retrieves video IDs created by a specific user ordered by views.
@@ -329,31 +817,13 @@ class DataBase:
         :return: List of video IDs sorted by number of views
         """
 
-        query = """
-                SELECT video_id, created_at
-                from videos
-                WHERE videos.creator = ? 
-                """
-
-        if matter_deleted:
-            query += "AND videos.deleted = 0 "
-
-        query += "ORDER BY created_at DESC"
-
-        self.cur.execute(query, (username,))
+        table = "live_videos" if matter_deleted else "videos"
+        self.cur.execute(f"SELECT video_id FROM {table} WHERE creator = ? ORDER BY created_at DESC", (username,))
 
         results = self.cur.fetchall()
         results = [i[0] for i in results]
         return results
 
-    def get_deleted_videos_ids(self):
-        """
-            Retrieves the IDs of all videos marked as deleted.
-        :return: List of video IDs where deleted is set to 1.
-        """
-        self.cur.execute("SELECT video_id FROM videos WHERE deleted = 1")
-        return [i[0] for i in self.cur.fetchall()]
-
     def is_the_video_creator(self, video_id, username):
         """
         Checks if a user is the creator of a video.
@@ -370,7 +840,7 @@ class DataBase:
         :param video_id: ID of the video
         :return: True if the video exists, False otherwise
         """
-        self.cur.execute("SELECT 1 FROM videos WHERE video_id = ? and deleted = 0", (video_id,))
+        self.cur.execute("SELECT 1 FROM live_videos WHERE video_id = ?", (video_id,))
         return self.cur.fetchone() is not None
 
     def are_there_videos(self):
@@ -382,7 +852,7 @@ class DataBase:
 
         :return: True if there are non-deleted videos in the database, False otherwise
         """
-        self.cur.execute("SELECT 1 FROM videos WHERE deleted = 0")
+        self.cur.execute("SELECT 1 FROM live_videos")
         return self.cur.fetchone() is not None
 
     def get_specific_video(self, video_id, matter_deleted=True):
@@ -392,22 +862,20 @@ class DataBase:
         :param matter_deleted: A boolean indicating whether deleted videos should be excluded from the results.
         :return: video details: creator, name, description, created_at, likes_amount, comments_amount
         """
-        query = """
+        table = "live_videos" if matter_deleted else "videos"
+        self.cur.execute(f"""
                          SELECT videos.creator,
                                 videos.name,
                                 videos.description,
                                 strftime('%d/%m/%Y %H:%M', videos.created_at),
-                               (SELECT COUNT(*) FROM likes WHERE video_id = videos.video_id) AS likes_count,
-                               (SELECT COUNT(*) FROM comments WHERE video_id = videos.video_id) AS comments_count,
-                               test_link
-                         FROM videos
+                                video_stats.likes,
+                                video_stats.comments,
+                                test_link
+                         FROM {table} AS videos
+                                  JOIN video_stats ON video_stats.video_id = videos.video_id
 
                          WHERE videos.video_id = ?
-                         """
-        if matter_deleted:
-            query += "AND videos.deleted = 0"
-
-        self.cur.execute(query, (video_id,))
+                         """, (video_id,))
 
         ret_val = self.cur.fetchone()
         print("video id in get specific video: ", video_id, "likes amount: ", ret_val[4], "comments amount: ", ret_val[5])
@@ -427,6 +895,8 @@ class DataBase:
                          (creator, name, description, test_link))
         self.conn.commit()
         video_id = self.cur.lastrowid
+        if self.recommender:
+            self.recommender.add_video(video_id)
         return video_id
 
     def delete_video(self, video_id):
@@ -437,6 +907,8 @@ class DataBase:
         """
         self.cur.execute("UPDATE videos SET deleted = 1 WHERE video_id = ?", (video_id,))
         self.conn.commit()
+        if self.recommender:
+            self.recommender.remove_video(int(video_id))
 
     def search_videos(self, name_or_desc, topics):
         """
@@ -445,17 +917,78 @@ class DataBase:
         :param topics: List of topics to filter results by; pass an empty list for no filter.
         :return: List of video IDs ordered by relevance score and view count.
         """
-        query = """SELECT videos.video_id,
+        return [video_id for video_id, cursor in self.search_videos_page(name_or_desc, topics, amount=-1)]
+
+    def search_videos_page(self, name_or_desc, topics, cursor="", amount=settings.AMOUNT_OF_VIDEOS_TO_SEND):
+        """
+            Retrieves a page of the videos matching a name or description, optionally filtered by topics.
+            The videos_search index finds the matches, ranked by BM25 with name matches weighing twice
+            description matches, and boosted by their views. A search shorter than a trigram scans the videos.
+        :param name_or_desc: A string to match against video names and descriptions.
+        :param topics: List of topics to filter results by; pass an empty list for no filter.
+        :param cursor: cursor of the last video of the previous page, empty for the first page
+        :param amount: Most videos to retrieve, -1 for all of them
+        :return: List of (video ID, cursor of the video) ordered by relevance score and view count.
+        :raises ValueError: If the cursor is invalid
+        """
+        if len(name_or_desc) < settings.MIN_INDEXED_SEARCH_LENGTH:
+            return self._scan_videos(name_or_desc, topics, cursor, amount)
+
+        key = decode_cursor(cursor, ((int, float), int))  # (rank, video_id)
+        # bm25 is negative, a more relevant video has a lower rank. views multiply it by up to 1 + the weight
+        query = """SELECT video_id, rank FROM (
+            SELECT videos_search.rowid AS video_id,
+                   bm25(videos_search, 2.0, 1.0) *
+                   (1 + ? * CAST(video_stats.views AS REAL) / (video_stats.views + ?)) AS rank
+            FROM videos_search
+            JOIN video_stats ON videos_search.rowid = video_stats.video_id
+            WHERE videos_search MATCH ?
+            """
+
+        if topics:
+            placeholders = ("?," * len(topics))[:-1]
+            query += f"""
+            AND EXISTS (SELECT 1 FROM video_topics
+                        WHERE video_topics.video_id = videos_search.rowid AND video_topics.topic IN ({placeholders}))
+            """
+        query += ")"
+
+        params = [settings.SEARCH_VIEWS_WEIGHT, settings.SEARCH_VIEWS_HALF]
+        params.append('"' + name_or_desc.replace('"', '""') + '"')  # searched as a single phrase
+        params.extend(topics)
+        if key is not None:
+            query += " WHERE (rank, video_id) > (?, ?)"
+            params.extend(key)
+        query += " ORDER BY rank, video_id LIMIT ?"
+        params.append(amount)
+
+        self.cur.execute(query, params)
+        return [(video_id, encode_cursor(rank, video_id)) for video_id, rank in self.cur.fetchall()]
+
+    def _scan_videos(self, name_or_desc, topics, cursor="", amount=-1):
+        """
+            Searches for videos containing a name or description by scanning all of them,
+            for searches too short for the videos_search index.
+        :param name_or_desc: A string to match against video names and descriptions.
+        :param topics: List of topics to filter results by; pass an empty list for no filter.
+        :param cursor: cursor of the last video of the previous page, empty for the first page
+        :param amount: Most videos to retrieve, -1 for all of them
+        :return: List of (video ID, cursor of the video) ordered by relevance score and view count.
+        :raises ValueError: If the cursor is invalid
+        """
+        key = decode_cursor(cursor, (int, int, int))  # (-score, -views, video_id)
+        query = """SELECT video_id, -score AS score_key, -views AS views_key FROM (
+            SELECT videos.video_id,
             
             (
             CASE WHEN videos.name LIKE ? THEN 2 ELSE 0 END +
             CASE WHEN videos.description LIKE ? THEN 1 ELSE 0 END
             ) AS score,
             
-            COUNT(DISTINCT watched_videos.username) AS views
+            video_stats.views
             
-            FROM videos
-            LEFT JOIN watched_videos ON videos.video_id = watched_videos.video_id
+            FROM live_videos AS videos
+            JOIN video_stats ON videos.video_id = video_stats.video_id
             """
 
         if topics:
@@ -466,56 +999,44 @@ class DataBase:
             """
 
         query += """
-            WHERE videos.deleted = 0
             GROUP BY videos.video_id
-            HAVING score > 0
-            ORDER BY score DESC, views DESC
+            HAVING score > 0)
             """
         params = [f"%{name_or_desc}%", f"%{name_or_desc}%"]
         if topics:
             params.extend(topics)
+        if key is not None:  # score and views descending
+            query += "WHERE (score_key, views_key, video_id) > (?, ?, ?) "
+            params.extend(key)
+        query += "ORDER BY score_key, views_key, video_id LIMIT ?"
+        params.append(amount)
 
         self.cur.execute(query, params)
+        return [(row[0], encode_cursor(row[1], row[2], row[0])) for row in self.cur.fetchall()]
 
-        res = self.cur.fetchall()
-        res = [i[0] for i in res]
-        return res
-
-
-    def get_best_like_views_ratio_video_for_user(self, username):
+    def get_best_like_views_ratio_videos_for_user(self, username, amount=1):
         """
-        Retrieves the most viewed video the user has not watched yet.
+        Retrieves the videos with the best likes to views ratio the user has not watched yet.
         :param username: Username of the viewer
-        :return: Video ID of the most viewed unseen video or None
+        :param amount: Amount of videos to retrieve
+        :return: List of the IDs of the best unseen videos
         """
+        self._flush_if_pending(username)  # videos the user just watched are not recommended again
         self.cur.execute("""
-                         SELECT videos.video_id,
-                         
-                         CASE 
-                            WHEN COUNT(DISTINCT watched_videos.username) < 10 THEN 0.5
-                            ELSE CAST(COUNT(DISTINCT likes.username) AS FLOAT) /
-                            NULLIF(COUNT(DISTINCT watched_videos.username), 0)
-                         END AS likes_views_ratio
-                   
-                         FROM videos
-                                  LEFT JOIN watched_videos ON videos.video_id = watched_videos.video_id
-                                  LEFT JOIN likes ON videos.video_id = likes.video_id
-
-                         WHERE videos.deleted = 0
-                           AND NOT EXISTS (SELECT 1
+                         SELECT videos.video_id
+                         FROM video_stats
+                                  JOIN live_videos AS videos ON videos.video_id = video_stats.video_id
+
+                         WHERE NOT EXISTS (SELECT 1
                                            FROM watched_videos
                                            WHERE watched_videos.video_id = videos.video_id
                                              AND watched_videos.username = ?)
 
-                         GROUP BY videos.video_id
-                         ORDER BY likes_views_ratio DESC
-
-                         """, (username,))
+                         ORDER BY video_stats.like_view_ratio DESC
+                         LIMIT ?
+                         """, (username, amount))
 
-        res = self.cur.fetchone()
-        if res:
-            res = res[0]
-        return res
+        return [i[0] for i in self.cur.fetchall()]
 
     # ===== comments =====
 
@@ -545,13 +1066,11 @@ class DataBase:
         :param matter_deleted: A boolean indicating whether deleted comments should be excluded from the results.
         :return: Tuple representing the comment: video_id, comment_id, commenter, comment, created_at
         """
-        res = None
-        if self.comment_exists(comment_id) and not (matter_deleted and self.is_comment_deleted(comment_id)):
-            self.cur.execute(
-                "SELECT comment_id, video_id, commenter, comment, strftime('%d/%m/%Y %H:%M', created_at) FROM comments WHERE comment_id = ?",
-                (comment_id,))
-            res = self.cur.fetchone()
-        return res
+        table = "live_comments" if matter_deleted else "comments"
+        self.cur.execute(
+            f"SELECT comment_id, video_id, commenter, comment, strftime('%d/%m/%Y %H:%M', created_at) FROM {table} WHERE comment_id = ?",
+            (comment_id,))
+        return self.cur.fetchone()
 
     def is_comment_deleted(self, comment_id):
         """
@@ -577,14 +1096,38 @@ class DataBase:
         comments = self.cur.fetchall()
         return comments
 
-    def get_deleted_command_ids(self, video_id):
-        """
-            Retrieves the IDs of all deleted comments for a specific video.
-        :param video_id: ID of the video to check for deleted comments.
-        :return: List of comment IDs where deleted is set to 1.
+    def get_comments_page(self, video_id, username, cursor="", amount=settings.AMOUNT_OF_COMMENTS_TO_SEND):
         """
-        self.cur.execute("SELECT comment_id FROM comments WHERE video_id = ? AND deleted = 1", (video_id,))
-        return [i[0] for i in self.cur.fetchall()]
+        Retrieves a page of the active comments of a video, ordered like get_comments: the comments of username,
+        then the others, each newest first. Each of them is read in order from an index, until the page is full.
+        :param video_id: ID of the video
+        :param username: username of the user requesting the comments
+        :param cursor: cursor of the last comment of the previous page, empty for the first page
+        :param amount: Most comments to retrieve
+        :return: List of (comment row, cursor of the comment) of the page's comments
+        :raises ValueError: If the cursor is invalid
+        """
+        key = decode_cursor(cursor, (int, int))  # (0 for the user's comments or 1 for the others, comment_id)
+        comments = []
+        for others, commenter_condition in [(0, "commenter = ?"), (1, "commenter <> ?")]:
+            if len(comments) == amount or (key is not None and key[0] > others):
+                continue
+
+            query = f"""
+                    SELECT comment_id, video_id, commenter, comment, strftime('%d/%m/%Y %H:%M', created_at)
+                    FROM live_comments
+                    WHERE video_id = ? AND {commenter_condition}
+                    """
+            params = [video_id, username]
+            if key is not None and key[0] == others:
+                query += "AND comment_id < ? "
+                params.append(key[1])
+            query += "ORDER BY comment_id DESC LIMIT ?"
+            params.append(amount - len(comments))
+
+            self.cur.execute(query, params)
+            comments += [(row, encode_cursor(others, row[0])) for row in self.cur.fetchall()]
+        return comments
 
     def delete_comment(self, comment_id):
         """
@@ -625,8 +1168,11 @@ class DataBase:
         :param username: Username of the liking user
         :return: Inserts a new row into the likes table
         """
-        self.cur.execute("INSERT INTO likes VALUES (?,?)", (video_id, username))
-        self.conn.commit()
+        counted = self.recommender and not self.is_liked_by_user(video_id, username)
+        self._buffered_write(("likes", int(video_id), username), username,
+                             "INSERT OR IGNORE INTO likes VALUES (?,?)", (video_id, username))
+        if counted:
+            self.recommender.add_like(int(video_id))
 
     def remove_video_like(self, video_id, username):
         """
@@ -635,8 +1181,11 @@ class DataBase:
         :param username: Username of the user
         :return: Deletes the like row from the likes table
         """
-        self.cur.execute("DELETE FROM likes WHERE video_id = ? AND username = ?", (video_id, username))
-        self.conn.commit()
+        counted = self.recommender and self.is_liked_by_user(video_id, username)
+        self._buffered_write(("likes", int(video_id), username), username,
+                             "DELETE FROM likes WHERE video_id = ? AND username = ?", (video_id, username))
+        if counted:
+            self.recommender.remove_like(int(video_id))
 
     def get_video_likes_amount(self, video_id):
         """
@@ -644,8 +1193,9 @@ class DataBase:
         :param video_id: ID of the video
         :return: Number of likes for the video
         """
-        self.cur.execute("SELECT COUNT(*) FROM likes WHERE video_id = ?", (video_id,))
-        return self.cur.fetchone()[0]
+        self.cur.execute("SELECT likes FROM video_stats WHERE video_id = ?", (video_id,))
+        res = self.cur.fetchone()
+        return res[0] if res else 0
 
     def is_liked_by_user(self, video_id, username):
         """
@@ -654,6 +1204,10 @@ class DataBase:
         :param username: Username of the user
         :return: True if the user liked the video, False otherwise
         """
+        buffered_like = self._buffered_row(("likes", int(video_id), username))
+        if buffered_like:
+            return buffered_like[0].startswith("INSERT")
+
         self.cur.execute("SELECT 1 FROM likes WHERE video_id = ? AND username = ?", (video_id, username))
         return self.cur.fetchone() is not None
 
@@ -674,7 +1228,8 @@ class DataBase:
         :param username: Username of the user
         :return: List of followed usernames
         """
-        self.cur.execute("SELECT followed FROM following WHERE follower = ?", (username,))
+        self.cur.execute("""SELECT followed FROM following JOIN live_users ON live_users.username = following.followed
+                            WHERE follower = ?""", (username,))
         followings = [i[0] for i in self.cur.fetchall()]
         return followings  # Return a list of followed usernames
 
@@ -684,17 +1239,44 @@ class DataBase:
         :param username: Username of the user
         :return: List of follower usernames
         """
-        self.cur.execute("SELECT following FROM following WHERE followed = ?", (username,))
+        self.cur.execute("""SELECT follower FROM following JOIN live_users ON live_users.username = following.follower
+                            WHERE followed = ?""", (username,))
         followers = [i[0] for i in self.cur.fetchall()]
         return followers
 
+    def get_follow_list_page(self, username, followers, cursor="", amount=settings.AMOUNT_OF_USERS_TO_SEND):
+        """
+        Retrieves a page of the live followers or followings of a user, alphabetically.
+        :param username: Username of the user
+        :param followers: Whether to retrieve the user's followers, or else the users they follow
+        :param cursor: cursor of the last user of the previous page, empty for the first page
+        :param amount: Most users to retrieve
+        :return: List of (username, cursor of the user) of the page's users
+        :raises ValueError: If the cursor is invalid
+        """
+        key = decode_cursor(cursor, (str,))  # (username,)
+        listed, by = ("follower", "followed") if followers else ("followed", "follower")
+        query = f"""SELECT following.{listed}
+                    FROM following
+                    JOIN live_users ON live_users.username = following.{listed}
+                    WHERE following.{by} = ? """
+        params = [username]
+        if key is not None:
+            query += f"AND following.{listed} > ? "
+            params.extend(key)
+        query += f"ORDER BY following.{listed} LIMIT ?"
+        params.append(amount)
+
+        self.cur.execute(query, params)
+        return [(i[0], encode_cursor(i[0])) for i in self.cur.fetchall()]
+
     def remove_following(self, following, followed):
         """
         Removes a following relationship between two users
         :param following: Username of the follower
         :param followed: Username of the user being unfollowed
         """
-        self.cur.execute("DELETE FROM follower WHERE following = ? and followed = ?", (following, followed))
+        self.cur.execute("DELETE FROM following WHERE follower = ? and followed = ?", (following, followed))
         self.conn.commit()
 
     def is_following(self, following, followed):
@@ -713,7 +1295,8 @@ class DataBase:
         :param username: Username of the user
         :return: Number of followers
         """
-        self.cur.execute("SELECT COUNT(*) FROM following WHERE followed = ?", (username,))
+        self.cur.execute("""SELECT COUNT(*) FROM following JOIN live_users ON live_users.username = following.follower
+                            WHERE followed = ?""", (username,))
         return self.cur.fetchone()[0]
 
     def get_following_amount(self, username):
@@ -722,7 +1305,8 @@ class DataBase:
         :param username: Username of the user
         :return: Number of followings
         """
-        self.cur.execute("SELECT COUNT(*) FROM following WHERE follower = ?", (username,))
+        self.cur.execute("""SELECT COUNT(*) FROM following JOIN live_users ON live_users.username = following.followed
+                            WHERE follower = ?""", (username,))
         return self.cur.fetchone()[0]
 
     # ===== video topics =====
@@ -733,9 +1317,10 @@ class DataBase:
         :param video_id: ID of the video
         :param topics: iterable of topics to associate with the video
         """
-        for topic in topics:
-            self.cur.execute("INSERT INTO video_topics VALUES (?,?)", (video_id, topic))
+        self.cur.executemany("INSERT INTO video_topics VALUES (?,?)", [(video_id, topic) for topic in topics])
         self.conn.commit()
+        if self.recommender:
+            self.recommender.add_video(int(video_id), [int(topic) for topic in topics])
 
     def get_video_topics(self, video_id):
         """
@@ -761,31 +1346,26 @@ class DataBase:
 
         return video_ids
 
-    def get_video_for_user_topics(self, username):
+    def get_videos_for_user_topics(self, username, amount=1):
         """
-        Retrieves a recommended video for a user based on shared topics and likes to views ratio
+        Retrieves recommended videos for a user based on shared topics and likes to views ratio
         :param username: Username of the user
-        :return: Video ID if found, otherwise None
+        :param amount: Amount of videos to retrieve
+        :return: List of the IDs of the recommended videos
         """
+        self._flush_if_pending(username)  # videos the user just watched are not recommended again
         self.cur.execute("""
                          SELECT video_topics.video_id,
-                                COUNT(DISTINCT video_topics.topic)      AS shared_topics,
-                                
-                               CASE 
-                                   WHEN COUNT(DISTINCT watched_videos.username) < 10 THEN 0.5
-                                   ELSE CAST(COUNT(DISTINCT likes.username) AS FLOAT) /
-                                        NULLIF(COUNT(DISTINCT watched_videos.username), 0)
-                               END AS likes_views_ratio
+                                COUNT(video_topics.topic) AS shared_topics,
+                                video_stats.like_view_ratio
 
                          FROM user_topics
-                                  LEFT JOIN video_topics ON user_topics.topic = video_topics.topic
-                                  LEFT JOIN watched_videos ON video_topics.video_id = watched_videos.video_id
-                                  LEFT JOIN likes ON video_topics.video_id = likes.video_id
+                                  JOIN video_topics ON user_topics.topic = video_topics.topic
+                                  JOIN video_stats ON video_topics.video_id = video_stats.video_id
                                 
                          WHERE EXISTS(SELECT 1 
-                                      FROM videos
-                                      WHERE videos.video_id = video_topics.video_id
-                                        AND deleted = 0)
+                                      FROM live_videos
+                                      WHERE live_videos.video_id = video_topics.video_id)
                            AND user_topics.username = ?
                            AND NOT EXISTS (SELECT 1
                                            FROM watched_videos
@@ -793,44 +1373,36 @@ class DataBase:
                                              AND watched_videos.username = ?)
 
                          GROUP BY video_topics.video_id
-                         ORDER BY shared_topics + likes_views_ratio*5 DESC
-                         """, (username, username))
+                         ORDER BY shared_topics + video_stats.like_view_ratio*5 DESC
+                         LIMIT ?
+                         """, (username, username, amount))
 
+        return [i[0] for i in self.cur.fetchall()]
 
-        res = self.cur.fetchone()
-        if res:
-            res = res[0]
-        return res
-
-    def get_video_for_user_filter(self, username, filter):
+    def get_videos_for_user_filter(self, username, filter, amount=1):
         """
-        Retrieves a recommended video for a user based on a filter of topics
+        Retrieves recommended videos for a user based on a filter of topics
         :param username: Username of the user
         :param filter: list of topics to filter videos
-        :return: Video ID if found, otherwise None
+        :param amount: Amount of videos to retrieve
+        :return: List of the IDs of the recommended videos
         """
-        res = None
+        self._flush_if_pending(username)  # videos the user just watched are not recommended again
+        res = []
         if filter:
             placeholders = ("?," * len(filter))[:-1]
             self.cur.execute(
                 f"""
                 SELECT video_topics.video_id, 
                    COUNT(video_topics.topic) AS shared_topics,
-                   
-                   CASE 
-                       WHEN COUNT(DISTINCT watched_videos.username) < 10 THEN 0.5
-                       ELSE CAST(COUNT(DISTINCT likes.username) AS FLOAT) /
-                            NULLIF(COUNT(DISTINCT watched_videos.username), 0)
-                   END AS likes_views_ratio
-                
+                   video_stats.like_view_ratio
                     
                 FROM video_topics
-                  LEFT JOIN watched_videos ON video_topics.video_id = watched_videos.video_id
-                  LEFT JOIN likes ON video_topics.video_id = likes.video_id
+                  JOIN video_stats ON video_topics.video_id = video_stats.video_id
                                 
                 WHERE EXISTS(
-                    SELECT 1 FROM videos
-                    WHERE videos.video_id = video_topics.video_id AND deleted = 0
+                    SELECT 1 FROM live_videos
+                    WHERE live_videos.video_id = video_topics.video_id
                 )
                 AND video_topics.topic IN ({placeholders})
                 AND NOT EXISTS (
@@ -838,12 +1410,11 @@ class DataBase:
                     WHERE watched_videos.video_id = video_topics.video_id AND watched_videos.username = ?
                 )
                 GROUP BY video_topics.video_id
-                ORDER BY shared_topics + likes_views_ratio*5 DESC
-            """, (*filter, username))
+                ORDER BY shared_topics + video_stats.like_view_ratio*5 DESC
+                LIMIT ?
+            """, (*filter, username, amount))
 
-            res = self.cur.fetchone()
-            if res:
-                res = res[0]
+            res = [i[0] for i in self.cur.fetchall()]
         return res
 
     def get_video_for_user(self, username, filter=None):
@@ -851,44 +1422,82 @@ class DataBase:
         Retrieves video_id of a recommended video for a user based on filters, topics, or popularity
         :param username: Username of the user
         :param filter: optional list of topics to filter videos
-        :return: Video ID of the recommended video
+        :return: Video ID of the recommended video, None if the user watched every video
         """
-        # returns the best video for the user that he has not seen
+        res = self.get_videos_for_user(username, filter)
+        return res[0] if res else None
 
-        res = None
-        print(filter, bool(filter))
+    def get_videos_for_user(self, username, filter=None, amount=1):
+        """
+        Retrieves the IDs of the next recommended videos for a user in a single pass, the videos of the filter,
+        then of the user's topics, then the most popular ones, like recommending one at a time would
+        :param username: Username of the user
+        :param filter: optional list of topics to filter videos
+        :param amount: Amount of videos to retrieve
+        :return: List of the IDs of the recommended videos, shorter if the user watched every other video
+        """
+        # returns the best videos for the user that he has not seen
+        if self.recommender:
+            return self.recommender.recommend(username, filter, amount)
+
+        res = []
         if filter:
-            res = self.get_video_for_user_filter(username, filter)
+            res = self.get_videos_for_user_filter(username, filter, amount)
 
-        if not res: # if not filter or no videos matching filter
-            res = self.get_video_for_user_topics(username)
+        # every query is asked for the whole amount, the videos it returns that were already chosen are skipped
+        if len(res) < amount: # if not filter or not enough videos matching filter
+            res += [i for i in self.get_videos_for_user_topics(username, amount) if i not in res][:amount - len(res)]
 
-        if not res:  # if no video matches filter or topics
-            res = self.get_best_like_views_ratio_video_for_user(username)
+        if len(res) < amount:  # if not enough videos match filter or topics
+            res += [i for i in self.get_best_like_views_ratio_videos_for_user(username, amount)
+                    if i not in res][:amount - len(res)]
 
         return res
 
+    def _load_recommender(self):
+        """
+        Creates the recommender and loads every live video's topics, views and likes into it.
+        Users are loaded into it on their first recommendation.
+        """
+        self.cur.execute("SELECT video_id, topic FROM video_topics")
+        topics = {}
+        for video_id, topic in self.cur.fetchall():
+            topics.setdefault(video_id, []).append(topic)
+
+        self.cur.execute("""SELECT videos.video_id, video_stats.views, video_stats.likes
+                            FROM live_videos AS videos
+                                     JOIN video_stats ON video_stats.video_id = videos.video_id""")
+        loaded_recommender = recommender.Recommender(self._load_recommender_user)
+        loaded_recommender.load_videos((video_id, topics.get(video_id, ()), views, likes)
+                                       for video_id, views, likes in self.cur.fetchall())
+        self.recommender = loaded_recommender
+
+    def _load_recommender_user(self, username):
+        """
+        Reads what the recommender keeps of a user.
+        :param username: Username of the user
+        :return: Tuple of (the user's topics, IDs of the videos the user watched)
+        """
+        return self.get_user_topics(username), [i[0] for i in self.get_watched_videos(username)]
+
     # ===== user topics =====
 
     def _add_user_topics(self, username, topics):
         """
-        Adds topics to a user's preferences
+        Adds topics to a user's preferences, without committing
         :param username: Username of the user
         :param topics: iterable of topics to add
         """
-        for topic in topics:
-            self.cur.execute("INSERT INTO user_topics VALUES (?, ?)", (username, topic))
-        self.conn.commit()
+        self.cur.executemany("INSERT INTO user_topics VALUES (?, ?)", [(username, topic) for topic in topics])
 
     def _remove_user_topics(self, username, topics):
         """
-        Removes topics from a user's preferences
+        Removes topics from a user's preferences, without committing
         :param username: Username of the user
         :param topics: iterable of topics to remove
         """
-        for topic in topics:
-            self.cur.execute("DELETE FROM user_topics WHERE username = ? AND topic = ?", (username, topic))
-        self.conn.commit()
+        self.cur.executemany("DELETE FROM user_topics WHERE username = ? AND topic = ?",
+                             [(username, topic) for topic in topics])
 
     def get_user_topics(self, username):
         """
@@ -912,6 +1521,9 @@ class DataBase:
 
         self._add_user_topics(username, to_add_topics)
         self._remove_user_topics(username, to_remove_topics)
+        self.conn.commit()  # the topics change in a single transaction
+        if self.recommender:
+            self.recommender.set_user_topics(username, new_topics)
 
     # ===== Watched videos =====
 
@@ -921,8 +1533,20 @@ class DataBase:
         :param username: Username of the user
         :param video_id: ID of the watched video
         """
-        self.cur.execute("INSERT INTO watched_videos VALUES (?,?)", (username, video_id))
-        self.conn.commit()
+        self.add_watched_videos(username, [video_id])
+
+    def add_watched_videos(self, username, video_ids):
+        """
+        Adds records of a user watching videos, committed together
+        :param username: Username of the user
+        :param video_ids: IDs of the watched videos
+        """
+        counted = [int(i) for i in video_ids if self.recommender and not self.has_watched_video(username, i)]
+        self._buffered_writes(username, [(("watched_videos", username, int(video_id)),
+                                          "INSERT OR IGNORE INTO watched_videos VALUES (?,?)", (username, video_id))
+                                         for video_id in video_ids])
+        for video_id in counted:
+            self.recommender.add_view(username, video_id)
 
     def get_watched_videos(self, username):
         """
@@ -930,6 +1554,7 @@ class DataBase:
         :param username: Username of the user
         :return: List of video IDs watched by the user
         """
+        self._flush_if_pending(username)
         self.cur.execute("SELECT video_id FROM watched_videos WHERE username = ?", (username,))
         return self.cur.fetchall()
 
@@ -939,8 +1564,9 @@ class DataBase:
         :param video_id: ID of the video
         :return: Number of views for the video
         """
-        self.cur.execute("SELECT COUNT(*) FROM watched_videos WHERE video_id = ?", (video_id,))
-        return self.cur.fetchone()[0]
+        self.cur.execute("SELECT views FROM video_stats WHERE video_id = ?", (video_id,))
+        res = self.cur.fetchone()
+        return res[0] if res else 0
 
     def has_watched_video(self, username, video_id):
         """
@@ -949,6 +1575,9 @@ class DataBase:
         :param video_id: ID of the video
         :return: True if the user has watched the video, False otherwise
         """
+        if self._buffered_row(("watched_videos", username, int(video_id))):
+            return True
+
         self.cur.execute("SELECT 1 FROM watched_videos WHERE username = ? AND video_id = ?", (username, video_id))
         return self.cur.fetchone() is not None
 
@@ -957,6 +1586,10 @@ class DataBase:
             Removes all watched video records for a specific user.
         :param username: Username of the user whose watch history should be cleared.
         """
+        self._flush_if_pending(username)  # a buffered view committed after the delete would be kept
+        if self.recommender:
+            self.cur.execute("SELECT video_id FROM watched_videos WHERE username = ?", (username,))
+            self.recommender.remove_views(username, [i[0] for i in self.cur.fetchall()])
         self.cur.execute("DELETE FROM watched_videos WHERE username = ?", (username, ))
         self.conn.commit()
 
@@ -999,10 +1632,9 @@ class DataBase:
         :param id: ID of the target (video or comment)
         :param type: Type of the target (VIDEO_REPORT or COMMENT_REPORT)
         """
-        self.cur.execute(
-            "UPDATE reports SET notified = 1 WHERE reporter_name = ? AND target_id = ? AND target_type = ?",
-            (username, id, type))
-        self.conn.commit()
+        self._buffered_write(("reports", username, int(id), int(type)), username,
+                             "UPDATE reports SET notified = 1 WHERE reporter_name = ? AND target_id = ? AND target_type = ?",
+                             (username, id, type))
 
     def has_user_reported(self, username, id, type):
         """
@@ -1085,6 +1717,7 @@ class DataBase:
         :param username: Username of the reporter
         :return: List of pending report notifications
         """
+        self._flush_if_pending(username)
         self.cur.execute(
             "SELECT target_id, target_type, reporter_name FROM reports WHERE reporter_name = ? and status IS NOT NULL and notified = 0",
             (username,))
@@ -1130,6 +1763,409 @@ class DataBase:
 
 
 if __name__ == "__main__":
+    import os
+    import random
+    import sys
+    import tempfile
+    import time
+
+    if sys.argv[1:] == ["rebuild_video_stats"]:
+        # python database.py rebuild_video_stats - recounts the server's video stats from their rows
+        db = DataBase()
+        print(f"rebuilt video stats, {db.rebuild_video_stats()} videos' stats had drifted")
+        db.close()
+        sys.exit()
+
+    WORDS = ["derivative", "integral", "limit", "matrix", "vector", "python", "recursion", "sorting", "graph",
+             "physics", "energy", "momentum", "chemistry", "molecule", "history", "empire", "revolution", "guitar",
+             "chord", "melody", "painting", "sketch", "recipe", "baking", "bread", "pasta", "workout", "running",
+             "travel", "mountain", "ocean", "camera", "portrait", "football", "chess", "strategy", "novel", "poetry"]
+    SYLLABLES = ["ba", "ko", "ri", "mu", "te", "sa", "lo", "ne", "vi", "da", "pe", "zu"]
+    WORDS += [first + second + third for first in SYLLABLES for second in SYLLABLES for third in SYLLABLES]
+
+    def seed_database(seeded_db, users, videos, views_per_user, comments):
+        """
+        Fills a benchmark database with users, videos, their topics, views, likes, comments, followings and reports.
+        """
+        seeded_db.cur.executemany("INSERT INTO users (username, email, password_hash) VALUES (?,?,?)",
+                                  ((f"user{i}", f"user{i}@gmail.com", "") for i in range(users)))
+        seeded_db.cur.executemany("INSERT INTO videos (creator, name, description, test_link) VALUES (?,?,?,?)",
+                                  ((f"user{i % 500}", " ".join(random.sample(WORDS, 3)),
+                                    " ".join(random.choices(WORDS, k=20)), "") for i in range(videos)))
+        seeded_db.cur.executemany("INSERT INTO video_topics VALUES (?,?)",
+                                  ((video_id, topic) for video_id in range(1, videos + 1)
+                                   for topic in random.sample(range(30), 3)))
+        seeded_db.cur.executemany("INSERT INTO user_topics VALUES (?,?)",
+                                  ((f"user{i}", topic) for i in range(users) for topic in random.sample(range(30), 3)))
+        seeded_db.cur.executemany("INSERT INTO watched_videos VALUES (?,?)",
+                                  ((f"user{i}", video_id) for i in range(users)
+                                   for video_id in random.sample(range(1, videos + 1), views_per_user)))
+        seeded_db.cur.executemany("INSERT INTO likes VALUES (?,?)",
+                                  ((video_id, f"user{i}") for video_id in range(1, videos + 1)
+                                   for i in random.sample(range(users), 5)))
+        seeded_db.cur.executemany("INSERT INTO comments (video_id, commenter, comment) VALUES (?,?,?)",
+                                  ((random.randint(1, videos), f"user{random.randrange(users)}", "comment")
+                                   for _ in range(comments)))
+        seeded_db.cur.executemany("INSERT INTO following VALUES (?,?)",
+                                  ((f"user{i}", f"user{followed}") for i in range(users)
+                                   for followed in random.sample(range(users), 5)))
+        seeded_db.cur.executemany("INSERT INTO reports (reporter_name, target_id, target_type) VALUES (?,?,?)",
+                                  ((f"user{i}", random.randint(1, videos), 1) for i in range(users)))
+        seeded_db.conn.commit()
+
+    # index benchmark - a temporary database is seeded with 1M watched videos rows and queried without the
+    # secondary indexes, then the indexes' migration runs again and the same queries are timed with them
+    USERS = 20000
+    VIDEOS = 20000
+
+    random.seed(0)
+    benchmark_db = DataBase(os.path.join(tempfile.mkdtemp(), "benchmark.db"))
+    seed_database(benchmark_db, USERS, VIDEOS, 50, 200000)
+
+    queries = [
+        ("views of a video", 20, lambda: benchmark_db.get_amount_of_views(random.randint(1, VIDEOS))),
+        ("comments of a video", 20, lambda: benchmark_db.get_comments(random.randint(1, VIDEOS), "user0")),
+        ("videos of a creator", 20, lambda: benchmark_db.get_videos_by_creator(f"user{random.randrange(500)}")),
+        ("followers amount", 20, lambda: benchmark_db.get_followers_amount(f"user{random.randrange(USERS)}")),
+        ("reporters of a video", 20, lambda: benchmark_db.get_reporters(random.randint(1, VIDEOS), 1)),
+        ("email exists", 20, lambda: benchmark_db.email_exists(f"USER{random.randrange(USERS)}@gmail.com")),
+        ("recommendation by topics", 1, lambda: benchmark_db.get_videos_for_user_topics(f"user{random.randrange(USERS)}")),
+    ]
+
+    def time_queries():
+        random.seed(1)
+        times = []
+        for name, repeats, query in queries:
+            start = time.perf_counter()
+            for _ in range(repeats):
+                query()
+            times.append((time.perf_counter() - start) / repeats * 1000)
+        return times
+
+    benchmark_db.cur.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE '%_idx'")
+    for index_name in [i[0] for i in benchmark_db.cur.fetchall()]:
+        benchmark_db.cur.execute(f"DROP INDEX {index_name}")
+    benchmark_db.cur.execute("PRAGMA user_version = 1")
+    benchmark_db.conn.commit()
+    without_indexes = time_queries()
+
+    benchmark_db._migrate()
+    with_indexes = time_queries()
+
+    for (name, repeats, query), without_time, with_time in zip(queries, without_indexes, with_indexes):
+        print(f"{name:25} - without indexes {without_time:9.2f} ms, with indexes {with_time:9.2f} ms")
+
+    # video stats benchmark - a video's likes and comments amounts and the best ratio recommendation are
+    # counted from the likes, comments and watched videos rows like before, and read from video_stats
+    def counted_video_details(video_id):
+        benchmark_db.cur.execute("""SELECT videos.creator,
+                                           (SELECT COUNT(*) FROM likes WHERE video_id = videos.video_id),
+                                           (SELECT COUNT(*) FROM comments WHERE video_id = videos.video_id)
+                                    FROM videos WHERE videos.video_id = ?""", (video_id,))
+        return benchmark_db.cur.fetchone()
+
+    def stats_video_details(video_id):  # get_specific_video's query, without its print
+        benchmark_db.cur.execute("""SELECT videos.creator, video_stats.likes, video_stats.comments
+                                    FROM videos JOIN video_stats ON video_stats.video_id = videos.video_id
+                                    WHERE videos.video_id = ?""", (video_id,))
+        return benchmark_db.cur.fetchone()
+
+    def counted_best_ratio(username):
+        benchmark_db.cur.execute("""SELECT videos.video_id,
+                                           CASE WHEN COUNT(DISTINCT watched_videos.username) < 10 THEN 0.5
+                                                ELSE CAST(COUNT(DISTINCT likes.username) AS FLOAT) /
+                                                     NULLIF(COUNT(DISTINCT watched_videos.username), 0)
+                                           END AS ratio
+                                    FROM videos
+                                             LEFT JOIN watched_videos ON videos.video_id = watched_videos.video_id
+                                             LEFT JOIN likes ON videos.video_id = likes.video_id
+                                    WHERE videos.deleted = 0
+                                      AND NOT EXISTS (SELECT 1 FROM watched_videos AS watched
+                                                      WHERE watched.video_id = videos.video_id AND watched.username = ?)
+                                    GROUP BY videos.video_id
+                                    ORDER BY ratio DESC""", (username,))
+        return benchmark_db.cur.fetchone()
+
+    stats_queries = [
+        ("video details", 200, lambda: counted_video_details(random.randint(1, VIDEOS)),
+         lambda: stats_video_details(random.randint(1, VIDEOS))),
+        ("best ratio recommendation", 1, lambda: counted_best_ratio(f"user{random.randrange(USERS)}"),
+         lambda: benchmark_db.get_best_like_views_ratio_videos_for_user(f"user{random.randrange(USERS)}")),
+    ]
+    for name, repeats, counted, with_stats in stats_queries:
+        query_times = []
+        for query in [counted, with_stats]:
+            random.seed(1)
+            start = time.perf_counter()
+            for _ in range(repeats):
+                query()
+            query_times.append((time.perf_counter() - start) / repeats * 1000)
+        print(f"{name:25} - counted {query_times[0]:9.2f} ms, from video_stats {query_times[1]:9.2f} ms")
+
+    benchmark_db.cur.execute("UPDATE video_stats SET views = views + 1 WHERE video_id % 100 = 0")
+    benchmark_db.conn.commit()
+    start = time.perf_counter()
+    drifted = benchmark_db.rebuild_video_stats()
+    print(f"rebuilding video stats took {time.perf_counter() - start:.2f} s, found {drifted} drifted videos")
+    benchmark_db.close()
+
+    # search benchmark - videos are searched in a database of 100k videos by scanning them like before,
+    # and with the videos_search index
+    SEARCH_VIDEOS = 100000
+    SEARCHES = 20
+
+    random.seed(0)
+    benchmark_db = DataBase(os.path.join(tempfile.mkdtemp(), "benchmark.db"), in_memory_recommender=False)
+    seed_database(benchmark_db, 2000, SEARCH_VIDEOS, 50, 0)
+    searches = [("a word", lambda: random.choice(WORDS), []),
+                ("a part of a word", lambda: random.choice(WORDS)[1:5], []),
+                ("two words", lambda: " ".join(random.sample(WORDS, 2)), []),
+                ("a word in 2 topics", lambda: random.choice(WORDS), [1, 2])]
+    for name, search, topics in searches:
+        search_times = []
+        for search_videos in [benchmark_db._scan_videos, benchmark_db.search_videos]:
+            random.seed(1)
+            start = time.perf_counter()
+            for _ in range(SEARCHES):
+                results = search_videos(search(), topics)
+            search_times.append((time.perf_counter() - start) / SEARCHES * 1000)
+        print(f"search {name:18} - scan {search_times[0]:8.2f} ms, index {search_times[1]:8.2f} ms, "
+              f"{len(results)} results")
+    benchmark_db.close()
+
+    # pagination benchmark - all the pages of a video's comments and of a search are read by fetching the whole
+    # list and slicing it after the last item like before, and with keyset pages
+    PAGED_COMMENTS = 20000
+
+    random.seed(0)
+    benchmark_db = DataBase(os.path.join(tempfile.mkdtemp(), "benchmark.db"), in_memory_recommender=False)
+    seed_database(benchmark_db, 2000, 20000, 10, 0)
+    benchmark_db.cur.executemany("INSERT INTO comments (video_id, commenter, comment, deleted) VALUES (1,?,?,?)",
+                                 ((f"user{random.randrange(2000)}", "comment", random.random() < 0.01)
+                                  for _ in range(PAGED_COMMENTS)))
+    benchmark_db.conn.commit()
+    paged_search = random.choice(WORDS)
+
+    def sliced_comments_pages():
+        pages = 0
+        last_id = 0
+        while True:
+            comments = benchmark_db.get_comments(1, "user0")
+            comments_ids = [i[0] for i in comments]
+            comments = comments[comments_ids.index(last_id) + 1 if last_id else 0:]
+            benchmark_db.cur.execute("SELECT comment_id FROM comments WHERE video_id = 1 AND deleted = 1")
+            deleted_comments_ids = [i[0] for i in benchmark_db.cur.fetchall()]
+            comments = [i for i in comments if i[0] not in deleted_comments_ids][:settings.AMOUNT_OF_COMMENTS_TO_SEND]
+            if not comments:
+                return pages
+            pages += 1
+            last_id = comments[-1][0]
+
+    def keyset_comments_pages():
+        pages = 0
+        cursor = ""
+        while True:
+            comments = benchmark_db.get_comments_page(1, "user0", cursor)
+            if not comments:
+                return pages
+            pages += 1
+            cursor = comments[-1][1]
+
+    def sliced_search_pages():
+        pages = 0
+        last_id = 0
+        while True:
+            videos_ids = benchmark_db.search_videos(paged_search, [])
+            videos_ids = videos_ids[videos_ids.index(last_id) + 1 if last_id else 0:]
+            benchmark_db.cur.execute("SELECT video_id FROM videos WHERE deleted = 1")
+            deleted_videos_ids = [i[0] for i in benchmark_db.cur.fetchall()]
+            videos_ids = [i for i in videos_ids if i not in deleted_videos_ids][:settings.AMOUNT_OF_VIDEOS_TO_SEND]
+            if not videos_ids:
+                return pages
+            pages += 1
+            last_id = videos_ids[-1]
+
+    def keyset_search_pages():
+        pages = 0
+        cursor = ""
+        while True:
+            videos = benchmark_db.search_videos_page(paged_search, [], cursor)
+            if not videos:
+                return pages
+            pages += 1
+            cursor = videos[-1][1]
+
+    for name, read_pages in [("comments pages", (sliced_comments_pages, keyset_comments_pages)),
+                             ("search pages", (sliced_search_pages, keyset_search_pages))]:
+        page_times = []
+        for read_all_pages in read_pages:
+            start = time.perf_counter()
+            pages = read_all_pages()
+            page_times.append((time.perf_counter() - start) / pages * 1000)
+        print(f"{name:15} - {pages} pages, sliced {page_times[0]:8.2f} ms per page, keyset {page_times[1]:6.2f} ms per page")
+    benchmark_db.close()
+
+    # deleted content benchmark - the first page of a video's comments, a creator's videos and a user's followers
+    # is read while deleted comments, videos and followers accumulate, by filtering the deleted ids in Python
+    # like before, and from the live views
+    LIVE_ROWS = 1000
+    DELETED_STEPS = [0, 1000, 2000, 4000, 8000]
+
+    random.seed(0)
+    benchmark_db = DataBase(os.path.join(tempfile.mkdtemp(), "benchmark.db"), in_memory_recommender=False)
+    seed_database(benchmark_db, LIVE_ROWS, LIVE_ROWS, 0, 0)
+    benchmark_db.cur.executemany("INSERT INTO comments (video_id, commenter, comment) VALUES (1,?,?)",
+                                 ((f"user{i}", "comment") for i in range(LIVE_ROWS)))
+    benchmark_db.cur.execute("UPDATE videos SET creator = 'user1'")
+    benchmark_db.cur.executemany("INSERT OR IGNORE INTO following VALUES (?, 'user1')",
+                                 ((f"user{i}",) for i in range(LIVE_ROWS)))
+    benchmark_db.conn.commit()
+
+    def filtered_first_pages():
+        benchmark_db.cur.execute("SELECT comment_id FROM comments WHERE video_id = 1 ORDER BY comment_id DESC")
+        comments_ids = [i[0] for i in benchmark_db.cur.fetchall()]
+        benchmark_db.cur.execute("SELECT comment_id FROM comments WHERE video_id = 1 AND deleted = 1")
+        deleted_comments_ids = [i[0] for i in benchmark_db.cur.fetchall()]
+        comments_ids = [i for i in comments_ids if i not in deleted_comments_ids]
+
+        videos_ids = benchmark_db.get_videos_by_creator("user1", False)
+        benchmark_db.cur.execute("SELECT video_id FROM videos WHERE deleted = 1")
+        deleted_videos_ids = [i[0] for i in benchmark_db.cur.fetchall()]
+        videos_ids = [i for i in videos_ids if i not in deleted_videos_ids]
+
+        benchmark_db.cur.execute("SELECT follower FROM following WHERE followed = 'user1'")
+        followers = [i[0] for i in benchmark_db.cur.fetchall()]
+        benchmark_db.cur.execute("SELECT username FROM users WHERE deleted = 1")
+        deleted_usernames = [i[0] for i in benchmark_db.cur.fetchall()]
+        followers = [i for i in followers if i not in deleted_usernames]
+        return comments_ids[:20], videos_ids[:20], followers[:20]
+
+    def live_first_pages():
+        return (benchmark_db.get_comments_page(1, "user0"), benchmark_db.get_videos_by_creator_page("user1"),
+                benchmark_db.get_follow_list_page("user1", True))
+
+    deleted = 0
+    for step in DELETED_STEPS:
+        benchmark_db.cur.executemany("INSERT INTO comments (video_id, commenter, comment, deleted) VALUES (1,?,?,1)",
+                                     (("user0", "deleted comment") for _ in range(step - deleted)))
+        benchmark_db.cur.executemany("INSERT INTO videos (creator, name, description, test_link, deleted) "
+                                     "VALUES ('user1', 'deleted', '', '', 1)", (() for _ in range(step - deleted)))
+        benchmark_db.cur.executemany("INSERT INTO users (username, email, password_hash) VALUES (?,?,'')",
+                                     ((f"deleted{i}", f"deleted{i}@gmail.com") for i in range(deleted, step)))
+        benchmark_db.cur.executemany("INSERT INTO following VALUES (?, 'user1')",
+                                     ((f"deleted{i}",) for i in range(deleted, step)))
+        benchmark_db.conn.commit()
+        for i in range(deleted, step):
+            benchmark_db.delete_user(f"deleted{i}")
+        deleted = step
+
+        page_times = []
+        for (read_first_pages, repeats) in [(filtered_first_pages, 1), (live_first_pages, 100)]:
+            start = time.perf_counter()
+            for _ in range(repeats):
+                read_first_pages()
+            page_times.append((time.perf_counter() - start) / repeats * 1000)
+        print(f"{deleted:5} deleted comments, videos and followers - filtered in python {page_times[0]:8.2f} ms, "
+              f"live views {page_times[1]:5.2f} ms")
+    benchmark_db.close()
+
+    # concurrency benchmark - THREADS threads read a video's feed details and like or comment on videos,
+    # with a single shared connection and a rollback journal like before, and with a WAL connection per thread
+    OPERATIONS_PER_THREAD = 500
+    WRITES_RATIO = 0.2
+    CONCURRENCY_VIDEOS = 2000
+
+    def feed_and_writes(thread_db, thread_number, read_times, errors):
+        username = f"user{thread_number}"
+        for _ in range(OPERATIONS_PER_THREAD):
+            video_id = random.randint(1, CONCURRENCY_VIDEOS)
+            try:
+                if random.random() < WRITES_RATIO:
+                    if random.random() < 0.5:
+                        thread_db.add_comment(video_id, username, "benchmark comment")
+                    elif thread_db.is_liked_by_user(video_id, username):
+                        thread_db.remove_video_like(video_id, username)
+                    else:
+                        thread_db.add_video_like(video_id, username)
+                else:
+                    start = time.perf_counter()
+                    thread_db.get_comments(video_id, username)
+                    thread_db.get_video_likes_amount(video_id)
+                    thread_db.get_amount_of_views(video_id)
+                    thread_db.is_liked_by_user(video_id, username)
+                    read_times.append(time.perf_counter() - start)
+            except Exception as e:  # threads sharing a connection commit each other's transactions and reset their cursors
+                errors.append(e)
+
+    for connection_per_thread in [False, True]:
+        random.seed(0)
+        benchmark_db = DataBase(os.path.join(tempfile.mkdtemp(), "benchmark.db"), connection_per_thread,
+                                group_commit=connection_per_thread)
+        if not connection_per_thread:
+            benchmark_db.cur.execute("PRAGMA journal_mode = DELETE")
+            benchmark_db.cur.execute("PRAGMA synchronous = FULL")
+        seed_database(benchmark_db, 2000, CONCURRENCY_VIDEOS, 50, 20000)
+
+        for threads_amount in [1, 4, 16]:
+            read_times = []
+            errors = []
+            threads = [threading.Thread(target=feed_and_writes, args=(benchmark_db, i, read_times, errors))
+                       for i in range(threads_amount)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            took = time.perf_counter() - start
+
+            read_times.sort()
+            mode = "connection per thread, WAL" if connection_per_thread else "shared connection, journal"
+            print(f"{mode:27} - {threads_amount:2} threads - "
+                  f"{threads_amount * OPERATIONS_PER_THREAD / took:7.0f} operations/s, "
+                  f"feed read p50 {read_times[len(read_times) // 2] * 1000:6.2f} ms, "
+                  f"p99 {read_times[int(len(read_times) * 0.99)] * 1000:6.2f} ms, {len(errors)} failed operations")
+        benchmark_db.close()
+
+    # group commit benchmark - threads record views and toggle likes, every write committed alone and
+    # buffered into group commits, and every thread checks that it reads its own last writes
+    WRITES_PER_THREAD = 2000
+
+    def views_and_likes(thread_db, thread_number, wrong_reads):
+        username = f"user{thread_number}"
+        for i in range(WRITES_PER_THREAD // 2):
+            video_id = random.randint(1, CONCURRENCY_VIDEOS)
+            thread_db.add_watched_video(username, video_id)
+            liked = thread_db.is_liked_by_user(video_id, username)
+            if liked:
+                thread_db.remove_video_like(video_id, username)
+            else:
+                thread_db.add_video_like(video_id, username)
+            if not thread_db.has_watched_video(username, video_id) or \
+                    thread_db.is_liked_by_user(video_id, username) == liked:
+                wrong_reads.append(video_id)
+
+    for group_commit in [False, True]:
+        random.seed(0)
+        benchmark_db = DataBase(os.path.join(tempfile.mkdtemp(), "benchmark.db"), group_commit=group_commit)
+        seed_database(benchmark_db, 2000, CONCURRENCY_VIDEOS, 10, 0)
+
+        for threads_amount in [1, 4, 16]:
+            wrong_reads = []
+            threads = [threading.Thread(target=views_and_likes, args=(benchmark_db, i, wrong_reads))
+                       for i in range(threads_amount)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            benchmark_db.flush()
+            took = time.perf_counter() - start
+
+            mode = "group commit" if group_commit else "commit every write"
+            print(f"{mode:18} - {threads_amount:2} threads - {threads_amount * WRITES_PER_THREAD / took:7.0f} writes/s, "
+                  f"{len(wrong_reads)} reads that missed the thread's own write")
+        benchmark_db.close()
+
     db = DataBase()
 
     # db.print_tables()
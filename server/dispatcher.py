@@ -0,0 +1,97 @@
+import queue
+import threading
+import time
+from collections import deque
+
+
+class Dispatcher:
+    """Runs the logic's message handlers on a pool of worker threads.
+
+    Messages are grouped by the client that sent them. A client's messages are handled one at a time
+    and in the order they arrived, while messages of different clients are handled in parallel, so a
+    slow handler (a heavy feed query, an SMTP send) only delays the client that caused it.
+
+    :ivar handler: Function called with (client_ip, msg) for every dispatched message.
+    :ivar pending: Dictionary mapping a client ip to a deque of its messages that were not handled yet.
+    :ivar readyQ: Queue of client ips that have pending messages and are not being handled by a worker.
+    """
+
+    def __init__(self, handler, workers):
+        """Initialize the Dispatcher and start its workers.
+
+        :param handler: Function called with (client_ip, msg) for every dispatched message.
+        :param workers: Amount of worker threads to handle messages with.
+        """
+        self.handler = handler
+        self.pending = {}  # [client_ip] = deque([msg, ...])
+        self.pending_lock = threading.Lock()
+        self.readyQ = queue.Queue()
+
+        for _ in range(workers):
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def dispatch(self, client_ip, msg):
+        """Queue a message to be handled by one of the workers.
+
+        :param client_ip: ip of the client that sent the message.
+        :param msg: The message to handle.
+        """
+        with self.pending_lock:
+            if client_ip in self.pending:  # the client is already queued or being handled by a worker
+                self.pending[client_ip].append(msg)
+                return
+            self.pending[client_ip] = deque([msg])
+        self.readyQ.put(client_ip)
+
+    def _worker(self):
+        """Handle one message of a ready client at a time.
+
+        After handling a message the client is put back at the end of the ready queue if it has more
+        pending messages, so a client sending many messages can not starve the other clients.
+        """
+        while True:
+            client_ip = self.readyQ.get()
+            with self.pending_lock:
+                msg = self.pending[client_ip].popleft()
+
+            try:
+                self.handler(client_ip, msg)
+            except Exception as e:
+                print(f"error when handling message of {client_ip} -", e)
+
+            with self.pending_lock:
+                if self.pending[client_ip]:
+                    self.readyQ.put(client_ip)
+                else:
+                    del self.pending[client_ip]
+
+
+if __name__ == '__main__':
+    # load benchmark - every handler blocks for HANDLE_TIME like a db query or an smtp send would
+    CLIENTS = 32
+    MSGS_PER_CLIENT = 25
+    HANDLE_TIME = 0.005
+
+    for workers in [1, 2, 4, 8, 16, 32]:
+        done = threading.Event()
+        handled = {}  # [client_ip] = [msg, ...]
+        handled_lock = threading.Lock()
+
+        def handler(client_ip, msg):
+            time.sleep(HANDLE_TIME)
+            with handled_lock:
+                handled.setdefault(client_ip, []).append(msg)
+                if sum(len(i) for i in handled.values()) == CLIENTS * MSGS_PER_CLIENT:
+                    done.set()
+
+        dispatcher = Dispatcher(handler, workers)
+        start = time.perf_counter()
+        for msg in range(MSGS_PER_CLIENT):
+            for client in range(CLIENTS):
+                dispatcher.dispatch(f"10.0.0.{client}", msg)
+        done.wait()
+        took = time.perf_counter() - start
+
+        in_order = all(msgs == list(range(MSGS_PER_CLIENT)) for msgs in handled.values())
+        print(f"workers: {workers:2} - {CLIENTS * MSGS_PER_CLIENT / took:8.1f} msgs/s, "
+              f"per client order kept: {in_order}")
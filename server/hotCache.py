@@ -0,0 +1,203 @@
+import threading
+import time
+from collections import OrderedDict
+
+import settings
+
+
+class HotCache:
+    """A read-through cache of values read often and written rarely, like video details and users' summaries.
+
+    A value is loaded on its first read and kept for ttl seconds, and the least recently used values are
+    dropped once there are more than the cache's capacity. The handlers that write a value invalidate it,
+    or a group of values, like the comment pages of a video, so a read after a write never gets the old value.
+    A value loaded while it was invalidated is returned but not kept, since it may have been read before the write.
+
+    :ivar name: Name of the cache, in its stats.
+    :ivar ttl: Seconds a value is kept.
+    :ivar capacity: Most values kept, 0 to keep none.
+    :ivar entries: OrderedDict mapping a key to (expiry time, value), least recently used first.
+    :ivar groups: Dictionary mapping a group to the set of its keys that are kept.
+    :ivar key_groups: Dictionary mapping a key that is in a group to its group.
+    :ivar generation: Amount of invalidations, a load is kept only if no invalidation happened while it ran.
+    :ivar hits: Amount of reads answered from the cache.
+    :ivar misses: Amount of reads that loaded their value.
+    :ivar lock: Lock of the entries, handlers run on several threads.
+    """
+
+    def __init__(self, name, ttl=settings.HOT_CACHE_TTL, capacity=settings.HOT_CACHE_ITEMS):
+        """Initialize the HotCache object.
+
+        :param name: Name of the cache, in its stats.
+        :param ttl: Seconds a value is kept.
+        :param capacity: Most values kept, 0 to keep none.
+        """
+        self.name = name
+        self.ttl = ttl
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.groups = {}
+        self.key_groups = {}
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        """Amount of values kept."""
+        return len(self.entries)
+
+    def get(self, key, load, group=None):
+        """
+        Reads a value, loading it if it is not kept or expired.
+        :param key: The value's key
+        :param load: Function that loads the value, called without arguments
+        :param group: Group the value is invalidated with, None if it is only invalidated by its key
+        :return: The value
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self.generation
+
+        value = load()
+
+        with self.lock:
+            if self.capacity and generation == self.generation:
+                self._remove(key)
+                self.entries[key] = (time.monotonic() + self.ttl, value)
+                if group is not None:
+                    self.groups.setdefault(group, set()).add(key)
+                    self.key_groups[key] = group
+                while len(self.entries) > self.capacity:
+                    self._remove(next(iter(self.entries)))
+        return value
+
+    def update(self, key, change):
+        """
+        Changes a kept value the way a write changed it, instead of loading it again.
+        :param key: The value's key
+        :param change: Function that gets the kept value and returns the changed value
+        """
+        with self.lock:
+            self.generation += 1
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries[key] = (entry[0], change(entry[1]))
+
+    def invalidate(self, *keys):
+        """
+        Drops values that were written, they are loaded again on their next read.
+        :param keys: The values' keys
+        """
+        with self.lock:
+            self.generation += 1
+            for key in keys:
+                self._remove(key)
+
+    def invalidate_group(self, group):
+        """
+        Drops all the values of a group that was written.
+        :param group: The group
+        """
+        with self.lock:
+            self.generation += 1
+            for key in list(self.groups.get(group, ())):
+                self._remove(key)
+
+    def _remove(self, key):
+        """
+        Drops a value and its group membership. The lock must be held.
+        :param key: The value's key
+        """
+        if self.entries.pop(key, None) is None:
+            return
+        group = self.key_groups.pop(key, None)
+        if group is not None:
+            keys = self.groups[group]
+            keys.discard(key)
+            if not keys:
+                del self.groups[group]
+
+    def stats(self):
+        """
+        The cache's hit rate.
+        :return: Dictionary of the cache's name, hits, misses, hit rate and amount of values kept
+        """
+        with self.lock:
+            reads = self.hits + self.misses
+            return {"name": self.name, "hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / reads if reads else 0.0, "size": len(self.entries)}
+
+
+if __name__ == '__main__':
+    # hot objects benchmark - READS feed and search reads of popular videos and creators, the videos' details
+    # with whether the reader liked them and the creators' summaries, are answered from the database like before
+    # and through caches, with a like, a follow or a comment invalidating them every WRITE_EVERY reads
+    import io
+    import os
+    import random
+    import tempfile
+    from contextlib import redirect_stdout
+
+    import database
+
+    USERS = 2000
+    VIDEOS = 5000
+    FOLLOWS = 20000
+    READS = 20000
+    WRITE_EVERY = 50
+
+    random.seed(0)
+    db = database.DataBase(os.path.join(tempfile.mkdtemp(), "benchmark.db"), in_memory_recommender=False)
+    usernames = [f"user{i}" for i in range(USERS)]
+    db.cur.executemany("INSERT INTO users (username, email, password_hash) VALUES (?,?,?)",
+                       ((username, f"{username}@gmail.com", "") for username in usernames))
+    db.cur.executemany("INSERT INTO videos (creator, name, description, test_link) VALUES (?,?,?,?)",
+                       ((random.choice(usernames), f"video {i}", "description", "") for i in range(VIDEOS)))
+    db.cur.executemany("INSERT OR IGNORE INTO following VALUES (?,?)",
+                       ((random.choice(usernames), random.choice(usernames)) for _ in range(FOLLOWS)))
+    db.conn.commit()
+
+    popularity = [1 / (rank + 1) for rank in range(VIDEOS)]
+    reads = [(random.choices(range(1, VIDEOS + 1), popularity)[0], random.choice(usernames)) for _ in range(READS)]
+    video_creators = dict(db.cur.execute("SELECT video_id, creator FROM videos").fetchall())
+
+    def user_summary(username):
+        if not db.user_exists(username):
+            return False, 0, 0, []
+        return True, db.get_followers_amount(username), db.get_following_amount(username), \
+            db.get_videos_by_creator(username)
+
+    def read_uncached(video_id, reader):
+        video_details = db.get_specific_video(video_id)
+        liked = db.is_liked_by_user(video_id, reader)
+        return video_details, liked, user_summary(video_creators[video_id])
+
+    videos_cache = HotCache("videos")
+    users_cache = HotCache("users")
+
+    def read_cached(video_id, reader):
+        video_details = videos_cache.get(video_id, lambda: db.get_specific_video(video_id))
+        liked = db.is_liked_by_user(video_id, reader)
+        creator = video_creators[video_id]
+        return video_details, liked, users_cache.get(creator, lambda: user_summary(creator))
+
+    for name, read in [("database", read_uncached), ("hot cache", read_cached)]:
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):  # get_specific_video prints every video it reads
+            for i, (video_id, reader) in enumerate(reads):
+                read(video_id, reader)
+                if i % WRITE_EVERY == 0:
+                    videos_cache.invalidate(video_id)
+                    users_cache.invalidate(video_creators[video_id])
+        elapsed = time.perf_counter() - start
+        print(f"{name:9} - {elapsed * 1000:8.1f} ms for {READS} reads, {elapsed / READS * 1e6:6.1f} us per read")
+
+    for cache in [videos_cache, users_cache]:
+        print(cache.stats())
+    db.close()
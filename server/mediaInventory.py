@@ -0,0 +1,182 @@
+import os
+import string
+import threading
+from collections import OrderedDict
+
+import contentHash
+import settings
+
+# kinds of media a client is sent
+PFP = "pfp"
+VIDEO = "video"
+THUMBNAIL = "thumbnail"
+
+USERNAME_CHARACTERS = set(string.ascii_letters + string.digits + "_-.")
+
+content_hashes = {}  # [file_path] = (version, content hash), the hashes of the media files the clients hold
+content_hashes_lock = threading.Lock()
+
+
+def media_version(file_path):
+    """
+    The version of a media file, which changes when the file is replaced, like a pfp the user changed.
+    :param file_path: Path of the media file
+    :return: The file's modification time in nanoseconds, None if the file does not exist
+    """
+    try:
+        return os.stat(file_path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def media_item(file_name):
+    """
+    The item of a media file the client holds, by the name it was sent with.
+    :param file_name: The file's name, {username}.png for a pfp, {video_id}.png for a thumbnail and
+        {video_id}.{settings.VIDEO_EXTENSION} for a video
+    :return: Tuple of (kind, key, path of the server's file), None if the name is not of a media file
+    """
+    stem, _, extension = file_name.rpartition(".")
+    if stem.isdigit() and extension == settings.VIDEO_EXTENSION:
+        return VIDEO, int(stem), f"media\\videos\\{int(stem)}.{settings.VIDEO_EXTENSION}"
+    if stem.isdigit() and extension == "png":
+        return THUMBNAIL, int(stem), f"media\\videos\\{int(stem)}.png"
+    if stem and stem[0] in string.ascii_letters and set(stem) <= USERNAME_CHARACTERS and extension == "png":
+        return PFP, stem, f"media\\pfps\\{stem}.png"
+    return None
+
+
+def media_content_hash(file_path, version):
+    """
+    The content hash of a media file, hashed once for every version of the file.
+    :param file_path: Path of the media file
+    :param version: The file's current version, from media_version
+    :return: The hash as hex, None if the file can't be read
+    """
+    with content_hashes_lock:
+        hashed_version, file_hash = content_hashes.get(file_path, (None, None))
+    if hashed_version != version or file_hash is None:
+        file_hash = contentHash.content_hash(file_path)
+        with content_hashes_lock:
+            content_hashes[file_path] = (version, file_hash)
+    return file_hash
+
+
+class MediaInventory:
+    """The media a client holds, because it was sent to it during its session.
+
+    Every item is a (kind, key) pair, like (PFP, username) or (VIDEO, video_id), with the version of the file
+    that was sent, so a file that changed since is sent again. Items are kept in least recently used order
+    and the least recently used items are forgotten once there are more than the inventory's capacity,
+    so a forgotten item is one the client may not hold anymore and is sent again if it is needed.
+    At login the client tells the server which files its media cache holds, and they are added to the
+    inventory if they are the server's current files, and it tells the server which files its cache deleted.
+
+    :ivar capacity: Most items remembered.
+    :ivar items: OrderedDict mapping (kind, key) to the version sent, least recently used first.
+    :ivar lock: Lock of the items, media is sent to a client from other clients' handlers too.
+    """
+
+    def __init__(self, capacity=settings.MEDIA_INVENTORY_ITEMS):
+        """Initialize the MediaInventory object.
+
+        :param capacity: Most items remembered.
+        """
+        self.capacity = capacity
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        """Amount of items remembered."""
+        return len(self.items)
+
+    def holds(self, kind, key, version=None):
+        """
+        Checks whether the client holds an item, and marks it as recently used if it does.
+        :param kind: The item's kind
+        :param key: The item's key, its username or video id
+        :param version: The item's current version, None if any version is up to date
+        :return: True if the client holds the item's current version, False otherwise
+        """
+        with self.lock:
+            held_version = self.items.get((kind, key), False)
+            if held_version is False or (version is not None and held_version != version):
+                return False
+            self.items.move_to_end((kind, key))
+            return True
+
+    def add(self, kind, key, version=None):
+        """
+        Remembers that the client holds an item, forgetting the least recently used items above the capacity.
+        :param kind: The item's kind
+        :param key: The item's key, its username or video id
+        :param version: The version of the item the client holds
+        """
+        with self.lock:
+            self.items[(kind, key)] = version
+            self.items.move_to_end((kind, key))
+            while len(self.items) > self.capacity:
+                self.items.popitem(last=False)
+
+    def discard(self, kind, key):
+        """
+        Forgets an item the client deleted, so it is sent again if it is needed.
+        :param kind: The item's kind
+        :param key: The item's key, its username or video id
+        """
+        with self.lock:
+            self.items.pop((kind, key), None)
+
+    def claim(self, kind, key, version=None):
+        """
+        Checks whether an item has to be sent to the client, remembering it as held if it does.
+        :param kind: The item's kind
+        :param key: The item's key, its username or video id
+        :param version: The item's current version, None if any version is up to date
+        :return: True if the item has to be sent, False if the client holds it
+        """
+        if self.holds(kind, key, version):
+            return False
+        self.add(kind, key, version)
+        return True
+
+
+if __name__ == '__main__':
+    # session benchmark - a session scrolls through SESSION_VIDEOS videos, checking every video, its thumbnail and
+    # its creator's pfp before sending them, with the lists of sent items like before and with an inventory
+    import random
+    import time
+
+    SESSION_VIDEOS = 20000
+    CREATORS = 2000
+
+    random.seed(0)
+    session = [(random.randint(1, SESSION_VIDEOS * 2), f"user{random.randrange(CREATORS)}")
+               for _ in range(SESSION_VIDEOS)]
+
+    def lists_session():
+        pfps_sent, videos_sent, thumbnails_sent = [], [], []
+        for video_id, creator in session:
+            if creator not in pfps_sent:
+                pfps_sent.append(creator)
+            if video_id not in videos_sent:
+                videos_sent.append(video_id)
+            if video_id not in thumbnails_sent:
+                thumbnails_sent.append(video_id)
+        return len(pfps_sent) + len(videos_sent) + len(thumbnails_sent)
+
+    def inventory_session():
+        inventory = MediaInventory()
+        sent = 0
+        for video_id, creator in session:
+            sent += inventory.claim(PFP, creator, 1)
+            sent += inventory.claim(VIDEO, video_id)
+            sent += inventory.claim(THUMBNAIL, video_id)
+        return sent, len(inventory)
+
+    for name, run_session in [("sent lists", lists_session), ("inventory", inventory_session)]:
+        start = time.perf_counter()
+        result = run_session()
+        elapsed = time.perf_counter() - start
+        print(f"{name:10} - {elapsed * 1000:8.1f} ms for the session, "
+              f"{elapsed / SESSION_VIDEOS * 1e6:6.2f} us per video, result {result}")
@@ -0,0 +1,440 @@
+import threading
+from array import array
+from bisect import bisect_left, insort
+from heapq import heappush, heapreplace
+
+TOPIC_WEIGHT = 1  # score of every topic a video shares with the user's topics or filter
+RATIO_WEIGHT = 5  # score of the video's likes to views ratio
+MIN_RATIO_VIEWS = 10  # a video with less views has the average ratio, like video_stats' like_view_ratio
+AVERAGE_RATIO = 0.5
+
+
+def likes_views_ratio(views, likes):
+    """
+    The likes to views ratio of a video, computed like video_stats' like_view_ratio.
+    :param views: Amount of views of the video
+    :param likes: Amount of likes of the video
+    :return: The ratio
+    """
+    if views < MIN_RATIO_VIEWS:
+        return AVERAGE_RATIO
+    return likes / views
+
+
+class VideoIdSet:
+    """A compact set of video ids, split into containers like a roaring bitmap.
+
+    A video id's high 16 bits select its container and its low 16 bits are kept in it. A container is a
+    sorted array of 2 byte values while it is small, and becomes a 8 KiB bitmap once it holds more than
+    ARRAY_LIMIT values, so a set takes at most 2 bytes per id and at most a bitmap's size per 65536 ids.
+
+    :ivar containers: Dictionary mapping the high bits of ids to an array('H') or a bytearray bitmap.
+    :ivar size: Amount of ids in the set.
+    """
+
+    ARRAY_LIMIT = 4096  # a bitmap is smaller than an array of more values
+    BITMAP_SIZE = 65536 // 8
+
+    def __init__(self, video_ids=()):
+        """Initialize the VideoIdSet object.
+
+        :param video_ids: Iterable of ids the set starts with.
+        """
+        self.containers = {}
+        self.size = 0
+        for video_id in video_ids:
+            self.add(video_id)
+
+    def __len__(self):
+        """Amount of ids in the set."""
+        return self.size
+
+    def __contains__(self, video_id):
+        """Whether the id is in the set."""
+        container = self.containers.get(video_id >> 16)
+        if container is None:
+            return False
+        low = video_id & 0xFFFF
+        if isinstance(container, bytearray):
+            return bool(container[low >> 3] & (1 << (low & 7)))
+        index = bisect_left(container, low)
+        return index < len(container) and container[index] == low
+
+    def __iter__(self):
+        """The set's ids, ordered by container."""
+        for high, container in self.containers.items():
+            if isinstance(container, bytearray):
+                for low in range(65536):
+                    if container[low >> 3] & (1 << (low & 7)):
+                        yield high << 16 | low
+            else:
+                for low in container:
+                    yield high << 16 | low
+
+    def add(self, video_id):
+        """Add an id to the set.
+
+        :param video_id: The id to add.
+        :return: True if the id was added, False if it was already in the set.
+        """
+        high, low = video_id >> 16, video_id & 0xFFFF
+        container = self.containers.get(high)
+        if container is None:
+            container = self.containers[high] = array('H')
+
+        if isinstance(container, bytearray):
+            if container[low >> 3] & (1 << (low & 7)):
+                return False
+            container[low >> 3] |= 1 << (low & 7)
+        else:
+            index = bisect_left(container, low)
+            if index < len(container) and container[index] == low:
+                return False
+            container.insert(index, low)
+            if len(container) > self.ARRAY_LIMIT:
+                bitmap = bytearray(self.BITMAP_SIZE)
+                for value in container:
+                    bitmap[value >> 3] |= 1 << (value & 7)
+                self.containers[high] = bitmap
+        self.size += 1
+        return True
+
+    def discard(self, video_id):
+        """Remove an id from the set if it is in it.
+
+        :param video_id: The id to remove.
+        """
+        if video_id not in self:
+            return
+        high, low = video_id >> 16, video_id & 0xFFFF
+        container = self.containers[high]
+        if isinstance(container, bytearray):
+            container[low >> 3] &= ~(1 << (low & 7)) & 0xFF
+        else:
+            del container[bisect_left(container, low)]
+            if not container:
+                del self.containers[high]
+        self.size -= 1
+
+
+class Recommender:
+    """Recommends feed videos from memory, instead of aggregating the views, likes and topics tables.
+
+    Every topic has a list of its videos sorted by their likes to views ratio, and all the videos have one
+    more such list. The best unseen video for a set of topics, ordered by shared topics + ratio*5 like the
+    database's recommendation queries, is found by walking the topics' lists together from their best
+    videos and stopping once no video further down can score higher than the best one found, so a
+    recommendation reads a few entries of each list. Every user that asked for a recommendation has its
+    topics and a VideoIdSet of the videos it watched, loaded from the database on its first request.
+    The lists are updated as videos are viewed, liked, uploaded and deleted.
+
+    :ivar load_user: Function called with a username, returns its topics and the ids of the videos it watched.
+    :ivar videos: Dictionary mapping a live video's id to [views, likes, topics, sort key].
+    :ivar topic_lists: Dictionary mapping a topic to the sort keys of its videos, best video first.
+    :ivar all_videos: The sort keys of all the live videos, best video first.
+    :ivar users: Dictionary mapping a loaded username to [topics, watched VideoIdSet].
+    :ivar lock: Guards the lists and the users, the recommender is used by the logic's handler threads.
+    """
+
+    def __init__(self, load_user):
+        """Initialize the Recommender object.
+
+        :param load_user: Function called with a username, returns its topics and the ids of the videos it
+            watched, called when the user first asks for a recommendation.
+        """
+        self.load_user = load_user
+        self.videos = {}  # [video_id] = [views, likes, topics, (-ratio, video_id)]
+        self.topic_lists = {}  # [topic] = [(-ratio, video_id), ...] sorted, the best ratio first
+        self.all_videos = []
+        self.users = {}  # [username] = [topics, VideoIdSet of watched videos]
+        self.lock = threading.RLock()
+
+    # ===== videos =====
+
+    def load_videos(self, videos):
+        """
+        Adds many live videos at once, sorting every list once instead of inserting into it per video.
+        :param videos: iterable of (video_id, topics, views, likes) of the videos
+        """
+        with self.lock:
+            for video_id, topics, views, likes in videos:
+                key = (-likes_views_ratio(views, likes), video_id)
+                self.videos[video_id] = [views, likes, frozenset(topics), key]
+                self.all_videos.append(key)
+                for topic in topics:
+                    self.topic_lists.setdefault(topic, []).append(key)
+
+            self.all_videos.sort()
+            for sorted_list in self.topic_lists.values():
+                sorted_list.sort()
+
+    def add_video(self, video_id, topics=(), views=0, likes=0):
+        """
+        Adds a live video, or adds topics to a video that was already added.
+        :param video_id: ID of the video
+        :param topics: iterable of the video's topics
+        :param views: Amount of views of the video
+        :param likes: Amount of likes of the video
+        """
+        with self.lock:
+            video = self.videos.get(video_id)
+            if video is None:
+                key = (-likes_views_ratio(views, likes), video_id)
+                video = self.videos[video_id] = [views, likes, frozenset(), key]
+                insort(self.all_videos, key)
+
+            new_topics = frozenset(topics) - video[2]
+            for topic in new_topics:
+                insort(self.topic_lists.setdefault(topic, []), video[3])
+            video[2] = video[2] | new_topics
+
+    def remove_video(self, video_id):
+        """
+        Removes a deleted video, so it is not recommended.
+        :param video_id: ID of the video
+        """
+        with self.lock:
+            video = self.videos.pop(video_id, None)
+            if video is None:
+                return
+            for sorted_list in self._video_lists(video):
+                del sorted_list[bisect_left(sorted_list, video[3])]
+
+    def _video_lists(self, video):
+        """
+        The sorted lists a video is in.
+        :param video: The video's [views, likes, topics, sort key]
+        :return: List of the lists
+        """
+        return [self.all_videos] + [self.topic_lists[topic] for topic in video[2]]
+
+    def _update_counts(self, video_id, views_change, likes_change):
+        """
+        Changes the views and likes amounts of a video and moves it in its lists if its ratio changed.
+        :param video_id: ID of the video
+        :param views_change: Amount added to the video's views
+        :param likes_change: Amount added to the video's likes
+        """
+        video = self.videos.get(video_id)
+        if video is None:  # a deleted video, or one that was not added yet
+            return
+        video[0] += views_change
+        video[1] += likes_change
+        key = (-likes_views_ratio(video[0], video[1]), video_id)
+        if key == video[3]:  # a video with less than MIN_RATIO_VIEWS views keeps its place
+            return
+
+        for sorted_list in self._video_lists(video):
+            del sorted_list[bisect_left(sorted_list, video[3])]
+            insort(sorted_list, key)
+        video[3] = key
+
+    def add_like(self, video_id):
+        """
+        Counts a like of a video.
+        :param video_id: ID of the liked video
+        """
+        with self.lock:
+            self._update_counts(video_id, 0, 1)
+
+    def remove_like(self, video_id):
+        """
+        Uncounts a like of a video.
+        :param video_id: ID of the video
+        """
+        with self.lock:
+            self._update_counts(video_id, 0, -1)
+
+    # ===== users =====
+
+    def _user(self, username):
+        """
+        The in memory state of a user, loaded on its first use.
+        :param username: Username of the user
+        :return: The user's [topics, watched VideoIdSet]
+        """
+        user = self.users.get(username)
+        if user is None:
+            topics, watched = self.load_user(username)
+            user = self.users[username] = [frozenset(topics), VideoIdSet(watched)]
+        return user
+
+    def add_view(self, username, video_id):
+        """
+        Counts a user's view of a video.
+        :param username: Username of the viewer
+        :param video_id: ID of the watched video
+        """
+        with self.lock:
+            user = self.users.get(username)
+            if user is not None and not user[1].add(video_id):  # the user already watched it
+                return
+            self._update_counts(video_id, 1, 0)
+
+    def remove_views(self, username, video_ids):
+        """
+        Uncounts a user's views, when its watch history is cleared.
+        :param username: Username of the viewer
+        :param video_ids: IDs of the videos the user watched
+        """
+        with self.lock:
+            for video_id in video_ids:
+                self._update_counts(video_id, -1, 0)
+            if username in self.users:
+                self.users[username][1] = VideoIdSet()
+
+    def set_user_topics(self, username, topics):
+        """
+        Updates the topics of a loaded user.
+        :param username: Username of the user
+        :param topics: iterable of the user's topics
+        """
+        with self.lock:
+            if username in self.users:
+                self.users[username][0] = frozenset(topics)
+
+    def forget_user(self, username):
+        """
+        Drops a user's in memory state, it is loaded again on its next recommendation.
+        :param username: Username of the user
+        """
+        with self.lock:
+            self.users.pop(username, None)
+
+    # ===== recommendations =====
+
+    def _best_for_topics(self, topics, watched, amount, chosen):
+        """
+        Finds the unseen videos with the best shared topics + ratio*5 scores, among the videos of the topics.
+
+        The topics' lists are read one entry of each at a time. A video that was not read yet is in at most
+        the lists that were not read to their end, and its ratio is at most the ratio of the next entry of
+        each of them, so once the amount of videos found all score at least the best score such a video can
+        have, no video further down the lists can beat them.
+        :param topics: frozenset of the topics
+        :param watched: VideoIdSet of the videos the user watched
+        :param amount: Amount of videos to find
+        :param chosen: set of IDs of videos that were already recommended, they are skipped
+        :return: List of the IDs of the best videos, best first, shorter if not enough videos are unseen
+        """
+        lists = [self.topic_lists[topic] for topic in topics if self.topic_lists.get(topic)]
+        positions = [0] * len(lists)
+        seen = set()
+        best = []  # heap of (score, -video_id) of the best videos found, the worst of them first
+
+        while lists:
+            for i, sorted_list in enumerate(lists):
+                negative_ratio, video_id = sorted_list[positions[i]]
+                positions[i] += 1
+                if video_id in seen or video_id in watched or video_id in chosen:
+                    continue
+                seen.add(video_id)
+                score = TOPIC_WEIGHT * len(self.videos[video_id][2] & topics) - RATIO_WEIGHT * negative_ratio
+                if len(best) < amount:
+                    heappush(best, (score, -video_id))
+                elif score > best[0][0]:
+                    heapreplace(best, (score, -video_id))
+
+            remaining = [(sorted_list, position) for sorted_list, position in zip(lists, positions)
+                         if position < len(sorted_list)]
+            lists = [sorted_list for sorted_list, position in remaining]
+            positions = [position for sorted_list, position in remaining]
+
+            # the best score of an unread video that is in k of the remaining lists
+            next_ratios = sorted((-sorted_list[position][0] for sorted_list, position in remaining), reverse=True)
+            bound = max((TOPIC_WEIGHT * k + RATIO_WEIGHT * ratio for k, ratio in enumerate(next_ratios, 1)),
+                        default=None)
+            if len(best) == amount and (bound is None or best[0][0] >= bound):
+                break
+
+        return [-negative_video_id for score, negative_video_id in sorted(best, reverse=True)]
+
+    def recommend(self, username, filter=None, amount=1):
+        """
+        Finds recommended videos for a user, like DataBase.get_videos_for_user: the best unseen videos of the
+        filter's topics, then of the user's topics, then the unseen videos with the best ratio.
+        :param username: Username of the user
+        :param filter: optional list of topics to filter videos
+        :param amount: Amount of videos to find
+        :return: List of the IDs of the recommended videos, shorter if the user watched every other video
+        """
+        with self.lock:
+            topics, watched = self._user(username)
+
+            res = []
+            if filter:
+                res = self._best_for_topics(frozenset(filter), watched, amount, set())
+
+            if len(res) < amount:
+                res += self._best_for_topics(topics, watched, amount - len(res), set(res))
+
+            if len(res) < amount:
+                chosen = set(res)
+                for negative_ratio, video_id in self.all_videos:
+                    if len(res) == amount:
+                        break
+                    if video_id not in watched and video_id not in chosen:
+                        res.append(video_id)
+            return res
+
+
+if __name__ == '__main__':
+    # recommendation benchmark - a temporary database is seeded with 100k videos and 100k users, and feed
+    # recommendations are found with the database's queries and with the recommender
+    import os
+    import random
+    import tempfile
+    from itertools import accumulate
+    import time
+
+    import database
+
+    VIDEOS = 100000
+    USERS = 100000
+    VIEWS_PER_USER = 20
+    TOPICS = 16
+    REQUESTS = 50
+
+    random.seed(0)
+    db = database.DataBase(os.path.join(tempfile.mkdtemp(), "benchmark.db"))
+    db.cur.executemany("INSERT INTO users (username, email, password_hash) VALUES (?,?,?)",
+                       ((f"user{i}", f"user{i}@gmail.com", "") for i in range(USERS)))
+    db.cur.executemany("INSERT INTO videos (creator, name, description, test_link) VALUES (?,?,?,?)",
+                       ((f"user{i % 1000}", f"video {i}", "", "") for i in range(VIDEOS)))
+    db.cur.executemany("INSERT INTO video_topics VALUES (?,?)",
+                       ((video_id, topic) for video_id in range(1, VIDEOS + 1)
+                        for topic in random.sample(range(TOPICS), 3)))
+    db.cur.executemany("INSERT INTO user_topics VALUES (?,?)",
+                       ((f"user{i}", topic) for i in range(USERS) for topic in random.sample(range(TOPICS), 3)))
+    popular = list(range(1, VIDEOS + 1))
+    popularity = list(accumulate(1 / video_id for video_id in popular))  # a few videos get most views and likes
+    db.cur.executemany("INSERT INTO watched_videos VALUES (?,?)",
+                       ((f"user{i}", video_id) for i in range(USERS)
+                        for video_id in set(random.choices(popular, cum_weights=popularity, k=VIEWS_PER_USER))))
+    db.cur.executemany("INSERT OR IGNORE INTO likes VALUES (?,?)",
+                       ((video_id, f"user{i}") for i in range(USERS)
+                        for video_id in random.choices(popular, cum_weights=popularity, k=5)))
+    db.conn.commit()
+    db.close()
+
+    for in_memory in [False, True]:
+        start = time.perf_counter()
+        db = database.DataBase(db.path, in_memory_recommender=in_memory)
+        load_time = time.perf_counter() - start
+
+        random.seed(1)
+        times = []
+        for _ in range(REQUESTS):
+            username = f"user{random.randrange(USERS)}"
+            filter = random.sample(range(TOPICS), 2) if random.random() < 0.5 else []
+            start = time.perf_counter()
+            video_id = db.get_video_for_user(username, filter)
+            db.add_watched_video(username, video_id)
+            times.append(time.perf_counter() - start)
+
+        times.sort()
+        mode = "recommender" if in_memory else "database queries"
+        print(f"{mode:16} - {VIDEOS} videos, {USERS} users - loaded in {load_time:5.2f} s, "
+              f"recommendation p50 {times[len(times) // 2] * 1000:8.2f} ms, "
+              f"p99 {times[int(len(times) * 0.99)] * 1000:8.2f} ms")
+        db.close()
@@ -0,0 +1,231 @@
+import os
+import tempfile
+import threading
+
+from Cryptodome.Random import get_random_bytes
+
+import aesCipher
+import settings
+
+SEALED_SUFFIX = ".sealed"
+FILE_KEY_SIZE = 32
+HEADER_SIZE = 8 + 4 + aesCipher.STREAM_NONCE_SIZE + FILE_KEY_SIZE + aesCipher.STREAM_TAG_SIZE
+
+media_key = None
+media_key_lock = threading.Lock()
+seal_locks = {}  # [file_path] = RLock held while the file's sealed copy is checked or written
+seal_locks_lock = threading.Lock()
+
+
+class SealedFile:
+    """A media file encrypted at rest, in the format encrypt_file_stream sends files in.
+
+    The file starts with a header of the content's size, the chunk size it was encrypted with and its
+    file key, wrapped with the server's media key. The rest of the file is the encrypted chunks, so it
+    can be sent to a client as it is, with sendfile, after only sending it the file key.
+
+    The file is kept open, and its header and chunks are read from the same descriptor, so a file that is
+    sealed again while it is sent can't give the client one file's key with the other file's chunks.
+
+    :ivar path: Path of the sealed file.
+    :ivar file: The sealed file, opened for reading in binary mode, closed by whoever sends it.
+    :ivar file_size: Size of the file's content before it was encrypted.
+    :ivar chunk_size: The chunk size the content was encrypted with.
+    :ivar file_key: The key the content was encrypted with.
+    """
+
+    def __init__(self, path):
+        """Initialize the SealedFile object by reading its header.
+
+        :param path: Path of the sealed file.
+        :raises ValueError: If the header was not wrapped with the server's media key.
+        """
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            header = self.file.read(HEADER_SIZE)
+            # the sizes are authenticated with the wrapped key, so they can not be changed either
+            self.file_key = aesCipher.AESCipher(get_media_key()).decrypt_authenticated(header[12:], header[:12])
+        except ValueError:
+            self.file.close()
+            raise
+
+        self.file_size = int.from_bytes(header[:8], "big")
+        self.chunk_size = int.from_bytes(header[8:12], "big")
+
+    def chunks(self, first_index=0):
+        """The positions of the encrypted chunks in the sealed file.
+
+        :param first_index: Index of the first chunk, more than 0 when resuming a transfer.
+        :return: Generator of (offset, count) of the chunks from the first index, in order.
+        """
+        offset = HEADER_SIZE
+        for index, size in enumerate(aesCipher.AESCipher.get_stream_chunk_sizes(self.file_size, self.chunk_size)):
+            if index >= first_index:
+                yield offset, size
+            offset += size
+
+    def content_size(self):
+        """Size of the encrypted content, the sealed file without its header.
+
+        :return: The size in bytes.
+        """
+        return os.fstat(self.file.fileno()).st_size - HEADER_SIZE
+
+
+def get_media_key():
+    """Load the server's media key, creating it on first use.
+
+    :return: The media key as bytes.
+    """
+    global media_key
+    with media_key_lock:
+        if media_key is None:
+            if not os.path.isfile(settings.MEDIA_KEY_PATH):
+                with open(settings.MEDIA_KEY_PATH, 'wb') as f:
+                    f.write(get_random_bytes(FILE_KEY_SIZE))
+
+            with open(settings.MEDIA_KEY_PATH, 'rb') as f:
+                media_key = f.read()
+    return media_key
+
+
+def seal_lock(file_path):
+    """The lock held while a media file's sealed copy is checked or written.
+
+    :param file_path: Path of the media file.
+    :return: The file's RLock, seal_media holds it while sealing the file.
+    """
+    with seal_locks_lock:
+        return seal_locks.setdefault(file_path, threading.RLock())
+
+
+def seal_file(file_path):
+    """Encrypt a media file at rest with a new file key, next to the file.
+
+    The sealed file is written to a temporary file first, so a file being sent is never replaced
+    with a half written one, and files are sealed one at a time per path.
+
+    :param file_path: Path of the media file.
+    """
+    with seal_lock(file_path):
+        file_key = get_random_bytes(FILE_KEY_SIZE)
+        file_size = os.path.getsize(file_path)
+        sizes = file_size.to_bytes(8, "big") + settings.FILE_CHUNK_SIZE.to_bytes(4, "big")
+        wrapped_key = aesCipher.AESCipher(get_media_key()).encrypt_authenticated(file_key, sizes)
+
+        fd, temp_path = tempfile.mkstemp(suffix=".part", dir=os.path.dirname(file_path) or ".")
+        with os.fdopen(fd, 'wb') as sealed, open(file_path, 'rb') as f:
+            sealed.write(sizes + wrapped_key)
+            for chunk in aesCipher.AESCipher(file_key).encrypt_file_stream(f, settings.FILE_CHUNK_SIZE):
+                sealed.write(chunk)
+
+        os.replace(temp_path, file_path + SEALED_SUFFIX)
+
+
+def get_sealed_file(file_path):
+    """Get the sealed version of a media file, without sealing it.
+
+    Files are sealed when they are stored, and the ones stored before are sealed by seal_media at startup,
+    so a file is never encrypted on the path that sends it.
+
+    :param file_path: Path of the media file.
+    :return: The SealedFile, None if the file changed after it was sealed (a new pfp that is being sealed),
+        or was sealed with another chunk size, or can't be opened.
+    """
+    sealed_path = file_path + SEALED_SUFFIX
+    try:
+        if os.path.getmtime(sealed_path) < os.path.getmtime(file_path):
+            return None
+        sealed_file = SealedFile(sealed_path)
+    except (OSError, ValueError):
+        return None
+    if sealed_file.chunk_size != settings.FILE_CHUNK_SIZE:
+        sealed_file.file.close()
+        return None
+    return sealed_file
+
+
+def seal_media(directories):
+    """Seal the media files that were not sealed yet, or changed since, run once when the server starts.
+
+    :param directories: Directories of the media files.
+    :return: Amount of files sealed.
+    """
+    sealed = 0
+    for directory in directories:
+        if not os.path.isdir(directory):
+            continue
+        for file_name in os.listdir(directory):
+            file_path = os.path.join(directory, file_name)
+            if file_name.endswith((SEALED_SUFFIX, ".part")) or not os.path.isfile(file_path):
+                continue
+            with seal_lock(file_path):
+                sealed_file = get_sealed_file(file_path)
+                if sealed_file:
+                    sealed_file.file.close()
+                    continue
+                seal_file(file_path)
+            sealed += 1
+    return sealed
+
+
+if __name__ == '__main__':
+    # throughput benchmark - a video is served over loopback with encrypt_file like before streaming, streamed
+    # with a chunk encrypted per send, and sealed with sendfile. the sending thread's cpu time is measured.
+    import socket
+    import time
+
+    VIDEO_SIZE = 64 * 1024 * 1024
+    SENDS = 5
+
+    os.makedirs("benchmark_media", exist_ok=True)
+    settings.MEDIA_KEY_PATH = os.path.join("benchmark_media", "media_key.bin")
+    video_path = os.path.join("benchmark_media", "video.mp4")
+    with open(video_path, 'wb') as f:
+        f.write(os.urandom(VIDEO_SIZE))
+    seal_file(video_path)
+    sealed_file = get_sealed_file(video_path)
+    session_cipher = aesCipher.AESCipher("session key")
+
+    def encrypt_file_send(sock):
+        with open(video_path, 'rb') as f:
+            sock.sendall(session_cipher.encrypt_file(f.read()))
+
+    def stream_send(sock):
+        with open(video_path, 'rb') as f:
+            for chunk in session_cipher.encrypt_file_stream(f, settings.FILE_CHUNK_SIZE):
+                sock.sendall(chunk)
+
+    def sealed_send(sock):
+        session_cipher.encrypt(sealed_file.file_key.hex())  # the file key is sent in the file's details
+        sock.sendfile(sealed_file.file, HEADER_SIZE, sealed_file.content_size())
+
+    def drain(sock):
+        while sock.recv(1024 * 1024):
+            pass
+
+    for name, send in [("encrypt_file", encrypt_file_send), ("stream", stream_send), ("sealed sendfile", sealed_send)]:
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen(1)
+        receiver = socket.create_connection(server.getsockname())
+        sender, _ = server.accept()
+        threading.Thread(target=drain, args=(receiver,), daemon=True).start()
+
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        for _ in range(SENDS):
+            send(sender)
+        cpu = time.thread_time() - cpu_start
+        took = time.perf_counter() - start
+        sender.close()
+        server.close()
+
+        mb = VIDEO_SIZE * SENDS / (1024 * 1024)
+        print(f"{name:16} - {mb / took:8.1f} MB/s, sender cpu: {cpu / mb * 1000:6.3f} ms/MB")
+
+    sealed_file.file.close()
+    for file_name in os.listdir("benchmark_media"):
+        os.remove(os.path.join("benchmark_media", file_name))
+    os.rmdir("benchmark_media")
@@ -1,23 +1,104 @@
-import select
+import os
+import queue
+import selectors
 import socket
+import tempfile
 import threading
 
 import aesCipher
-import diffieHellman
+import frames
+import keyExchange
+import protocolCodec
+import recvBuffer
+import sealedMedia
+import serverProtocol
 import settings
 
 
+class ReceivedFile(aesCipher.FileDecryptor):
+    """A file being received from a client, decrypted into a temporary file as it arrives.
+
+    :ivar file_name: The file's name, formatted filename.extension
+    :ivar video_details: The video's details if the file is a video, empty otherwise.
+    :ivar path: Path of the temporary file.
+    """
+
+    def __init__(self, cipher, file_details):
+        """Initialize the ReceivedFile object and create its temporary file.
+
+        :param cipher: The connection's AESCipher.
+        :param file_details: The decrypted file details or stream details message.
+        """
+        opcode, data = serverProtocol.unpack(file_details)
+        self.file_name, file_size, *self.video_details = data
+        fd, self.path = tempfile.mkstemp(suffix=".part", dir="media")
+        super().__init__(cipher, os.fdopen(fd, 'wb'), int(file_size), serverProtocol.is_stream(file_details),
+                         chunk_size=settings.FILE_CHUNK_SIZE)
+
+    def discard(self):
+        """Delete the temporary file of a file that was not fully received."""
+        self.file.close()
+        os.remove(self.path)
+
+
+class VideoChannel:
+    """A client's video traffic multiplexed over its ServerComm connection.
+
+    Has the same interface the logic uses of ServerCommVideos, so it can be stored in the logic's
+    clients dictionary in its place, without a listening socket and a thread per client.
+
+    :ivar comm: The ServerComm the client is connected to.
+    :ivar client_ip: ip of the client.
+    :ivar idsQ: Queue of the ids the logic gave to the client's uploaded videos, used to name their thumbnails.
+    """
+
+    def __init__(self, comm, client_ip):
+        """Initialize the VideoChannel object.
+
+        :param comm: The ServerComm the client is connected to.
+        :param client_ip: ip of the client.
+        """
+        self.comm = comm
+        self.client_ip = client_ip
+        self.idsQ = queue.Queue()
+
+    def send_msg(self, client_ip, msg):
+        """Send an encrypted message to the client on the video channel.
+
+        :param client_ip: ip of the client, kept for compatibility with ServerCommVideos.
+        :param msg: Message to send.
+        """
+        self.comm.send_msg(self.client_ip, msg, settings.VIDEO_CHANNEL)
+
+    def send_file(self, file_path, offset=0, prefix_msg=None):
+        """Send a file to the client on the video and file channels.
+
+        :param file_path: Path of the file to send.
+        :param offset: Position in the file to start sending from, to resume a transfer.
+        :param prefix_msg: Message to send once the start of the file was sent, the video's details.
+        """
+        self.comm.send_file(self.client_ip, file_path, offset, prefix_msg)
+
+
 class ServerComm:
     """Manages server-sipe communication with multiple clients using encryption.
 
-    Handles client connections, message sending/receiving, and Diffie-Hellman key exchange
-    for encrypted communication. Uses a separate thread for the main loop to monitor
-    incoming connections and messages.
+    Handles client connections, message sending/receiving, and X25519 key exchange, resumed with
+    session tickets, for encrypted communication. Uses a separate thread for the main loop, which waits on a
+    selector (epoll on linux) for incoming connections and messages.
 
     :ivar server_socket: Socket for accepting client connections.
     :ivar port: Port number for the server.
     :ivar recvQ: Queue to store received messages.
     :ivar open_clients: Dictionary mapping client sockets to [ip, cipher] pairs.
+    :ivar client_sockets: Dictionary mapping client ips to their sockets.
+    :ivar key_exchanges: Dictionary mapping sockets that did not finish the key exchange to their ip.
+    :ivar buffers: Dictionary mapping client sockets to the RecvBuffer their bytes are received into.
+    :ivar capabilities: Dictionary mapping client sockets to the optional capabilities accepted for them.
+    :ivar video_channels: Dictionary mapping client ips to their VideoChannel.
+    :ivar received_files: Dictionary mapping client sockets to the file their next file frames hold.
+    :ivar send_locks: Dictionary mapping client sockets to the lock held while sending to them.
+    :ivar close_lock: Lock held while a client is closed, so only one thread closes it.
     """
 
     def __init__(self, port, recvQ):
@@ -30,80 +111,276 @@ class ServerComm:
         self.port = port
         self.recvQ = recvQ
         self.open_clients = {}  # [socket] = ip, cipher
+        self.client_sockets = {}  # [ip] = socket
+        self.key_exchanges = {}  # [socket] = ip
+        self.buffers = {}  # [socket] = RecvBuffer
+        self.capabilities = {}  # [socket] = [capability, ...]
+        self.video_channels = {}  # [ip] = VideoChannel
+        self.received_files = {}  # [socket] = ReceivedFile
+        self.send_locks = {}  # [socket] = Lock, messages can be sent from several handler threads at once
+        self.close_lock = threading.Lock()  # held while a client is closed, by the selector's or a handler's thread
+        self.selector = selectors.DefaultSelector()
 
         threading.Thread(target=self._mainLoop).start()
 
     def _mainLoop(self):
         """Continuously monitor for incoming connections and messages.
 
-        Binds the server socket, listens for new client connections, and processes
-        incoming messages from connected clients. Places received messages in the queue.
+        Binds the server socket and registers it and every connected client at the selector once,
+        the loop only wakes up when a socket is readable. Received bytes are buffered per client
+        until a full message arrived, which is then placed in the queue.
         """
         self.server_socket.bind(("0.0.0.0", self.port))
-        self.server_socket.listen(3)
-        while True:
-            rlist = select.select([self.server_socket] + list(self.open_clients.keys()), [], [], 0.01)[0]
-            for current_socket in rlist:
-                if current_socket is self.server_socket:
-                    client, addr = self.server_socket.accept()
-
-                    if any(ip == addr[0] for ip, _ in self.open_clients.values()):
-                        client.close()
-                        print("attempted to enter through the same ip")
-                    else:
-                        print(f"{addr[0]} - connected")
-                        # Start a new thread to exchange keys with the new client
-                        threading.Thread(target=self._change_key, args=(client, addr[0])).start()
+        self.server_socket.listen(socket.SOMAXCONN)
+        self.selector.register(self.server_socket, selectors.EVENT_READ)
 
+        while True:
+            for key, _ in self.selector.select():
+                if key.fileobj is self.server_socket:
+                    self._accept_client()
                 else:
-                    try:
-                        data_len = current_socket.recv(settings.MESSAGE_LENGTH_LENGTH).decode()
-                        data = current_socket.recv(int(data_len))
-                    except Exception as e:
-                        print("error in comm mainloop -", e)
-                        data = ""
-
-                    if not data:
-                        self._close_client(current_socket)
-                    else:
-                        ip, key = self.open_clients[current_socket]
-                        decrypted_message = key.decrypt(data)
-                        self.recvQ.put((ip, decrypted_message))  # Push received data into the queue
+                    self._recv_from_client(key.fileobj)
+
+    def _accept_client(self):
+        """Accept a new client and start the key exchange with it.
+
+        The client's hello is read by the main loop like any other data, so no thread is needed
+        per key exchange.
+        """
+        client, addr = self.server_socket.accept()
+
+        if addr[0] in self.client_sockets:
+            client.close()
+            print("attempted to enter through the same ip")
+        else:
+            print(f"{addr[0]} - connected")
+            self.client_sockets[addr[0]] = client
+            self.key_exchanges[client] = addr[0]
+            self.buffers[client] = recvBuffer.RecvBuffer(settings.CLIENT_RECV_BUFFER_SIZE)
+            self.selector.register(client, selectors.EVENT_READ)
+
+    def _recv_from_client(self, client_soc):
+        """Read the available bytes of a client and handle every full message received.
+
+        :param client_soc: The readable client socket.
+        """
+        buffer = self.buffers.get(client_soc)
+        if buffer is None:  # client was closed by another thread
+            return
+
+        try:
+            received = buffer.recv(client_soc)
+        except Exception as e:
+            print("error in comm mainloop -", e)
+            received = 0
+
+        if not received:
+            self._close_client(client_soc)
+            return
+
+        if client_soc in self.key_exchanges and not self._finish_key_exchange(client_soc, buffer):
+            return
+
+        self._handle_buffered_messages(client_soc, buffer)
+
+    def _finish_key_exchange(self, client_soc, buffer):
+        """Answer the client's hellos at the start of the buffer, until the client's cipher is created.
+
+        A resumed hello whose ticket is rejected is followed by a full hello, so a client may send two hellos.
+
+        :param client_soc: Client socket that did not finish the key exchange.
+        :param buffer: The client's buffer, starting with its hello.
+        :return: True if the key exchange finished, False if it waits for the rest of a hello or the client was closed.
+        """
+        client_ip = self.key_exchanges[client_soc]
+        while buffer:
+            try:
+                hello_size = keyExchange.hello_size(buffer.peek(1), keyExchange.CLIENT_HELLO_SIZES)
+                if len(buffer) < hello_size:
+                    return False
+                server_hello, cipher = keyExchange.answer_hello(buffer.read(hello_size))
+                client_soc.sendall(server_hello)
+            except Exception as e:
+                print(f"Error in key exchange: {e}")
+                self._close_client(client_soc)
+                return False
+
+            if cipher:
+                del self.key_exchanges[client_soc]
+                self._add_client(client_soc, client_ip, cipher)
+                return True
+        return False
+
+    def _add_client(self, client_soc, client_ip, cipher):
+        """Add a client that finished the key exchange to the open clients.
+
+        :param client_soc: Client socket.
+        :param client_ip: ip of the client.
+        :param cipher: AEADCipher object created by the key exchange.
+        """
+        self.send_locks[client_soc] = threading.Lock()
+        self.open_clients[client_soc] = [client_ip, cipher]
+        self.client_sockets[client_ip] = client_soc
+
+    def _handle_buffered_messages(self, client_soc, buffer):
+        """Handle every full frame in a client's buffer.
+
+        Control messages are pushed to the queue, except capabilities messages which the comm answers
+        itself. Video channel messages are pushed to the queue too, unless they are file details, in
+        which case the file's content is the next file channel frame, or the next frames if streamed.
+        Bytes of a frame that did not fully arrive are left in the buffer, frames are handled
+        straight from the buffer, before the next recv into it.
+
+        :param client_soc: Client socket the buffer belongs to.
+        :param buffer: The client's RecvBuffer.
+        """
+        while client_soc in self.open_clients and buffer:
+            try:
+                frame = frames.parse_frame(buffer, self._supports(client_soc, settings.STREAM_CAPABILITY))
+            except ValueError as e:
+                print("error in comm mainloop -", e)
+                self._close_client(client_soc)
+                break
+
+            if not frame:
+                break
+
+            channel, data, binary = frame
+            if channel == settings.FILE_CHANNEL:
+                self._recv_file(client_soc, data)
+                continue
 
-    def _change_key(self, client_soc, client_ip):
-        """Perform Diffie-Hellman key exchange with a client.
+            ip, key = self.open_clients[client_soc]
+            try:
+                decrypted_message = protocolCodec.from_bytes(key.decrypt_bytes(data, binary, channel))
+            except ValueError as e:  # a forged or garbled frame, only its connection is closed
+                print("error in message decrypt -", e)
+                self._close_client(client_soc)
+                break
+            if channel == settings.CONTROL_CHANNEL and serverProtocol.is_capabilities(decrypted_message):
+                self._set_capabilities(client_soc, decrypted_message)
+            elif channel == settings.VIDEO_CHANNEL and serverProtocol.is_file(decrypted_message):
+                self.received_files[client_soc] = ReceivedFile(key, decrypted_message)
+            else:
+                self.recvQ.put((ip, decrypted_message))  # Push received data into the queue
 
-        Generates a public key, sends it to the client, receives the client's public key,
-        and establishes a shared key for AES encryption.
+    def _set_capabilities(self, client_soc, msg):
+        """Accept the capabilities of a client that the server supports, and answer them to the client.
+
+        :param client_soc: Client socket that sent its capabilities.
+        :param msg: The client's capabilities message.
+        """
+        supported = []
+        if settings.MULTIPLEX_VIDEO:
+            supported.append(settings.MULTIPLEX_CAPABILITY)
+        if settings.STREAM_FILES:
+            supported.append(settings.STREAM_CAPABILITY)
+        if settings.SEALED_MEDIA:
+            supported.append(settings.SEALED_CAPABILITY)
+        if settings.BINARY_FRAMES:
+            supported.append(settings.BINARY_CAPABILITY)
+        if settings.PROTOCOL_CODEC:
+            supported.append(settings.CODEC_CAPABILITY)
+
+        opcode, capabilities = serverProtocol.unpack(msg)
+        self.capabilities[client_soc] = [i for i in capabilities if i in supported]
+        self.send_msg(self.open_clients[client_soc][0], serverProtocol.build_capabilities(self.capabilities[client_soc]))
+
+    def _supports(self, client_soc, capability):
+        """Check whether a capability was accepted for a client.
+
+        :param client_soc: Client socket.
+        :param capability: The capability to check.
+        :return: True if the capability was accepted, False otherwise.
+        """
+        return capability in self.capabilities.get(client_soc, [])
+
+    def _recv_file(self, client_soc, data):
+        """Handle a file's content, or the next chunk of a streamed file, received on the file channel.
+
+        Once the whole file was written, handle_received_file runs on its own thread, as it can wait
+        for the logic (a thumbnail's video id), so the main loop keeps serving the other clients.
+
+        :param client_soc: Client socket the file was received from.
+        :param data: The encrypted content or chunk.
+        """
+        ip = self.open_clients[client_soc][0]
+        received_file = self.received_files.get(client_soc)
+        video_channel = self.video_channels.get(ip)
+        if not received_file or not video_channel:
+            print("received file content without file details")
+            return
+
+        try:
+            done = received_file.write(data)
+        except ValueError as e:
+            print("error in file receive -", e)
+            self._close_client(client_soc)
+            return
+
+        if done:
+            del self.received_files[client_soc]
+            threading.Thread(target=handle_received_file, args=(self.recvQ, video_channel.idsQ, ip, received_file.file_name,
+                                                                received_file.path, received_file.video_details)).start()
+
+    def _change_key(self, client_soc, client_ip, buffer):
+        """Perform the key exchange with a client on its own thread, see keyExchange.answer_hello.
+
+        Receives the client's hello, answers it and establishes the AES key of the connection,
+        receiving a full hello after a rejected session ticket.
 
         :param client_soc: Client socket for communication.
         :param client_ip: Unique ip assigned to the client.
+        :param buffer: RecvBuffer the client's bytes are received into, the bytes after the hellos are kept in it.
         """
-        diffie_hellman = diffieHellman.DiffieHellman()
-        public_key = diffie_hellman.get_public_key()
-
+        cipher = None
         try:
-            client_soc.send(str(public_key).zfill(settings.P_SIZE).encode())
-            client_public_key = int(client_soc.recv(settings.P_SIZE).decode())
+            while not cipher:
+                hello_start = buffer.read_exact(client_soc, 1)
+                if hello_start is None:
+                    break
+                hello_size = keyExchange.hello_size(hello_start, keyExchange.CLIENT_HELLO_SIZES)
+                hello_rest = buffer.read_exact(client_soc, hello_size - 1)
+                if hello_rest is None:
+                    break
+                server_hello, cipher = keyExchange.answer_hello(bytes(hello_start) + bytes(hello_rest))
+                client_soc.sendall(server_hello)
         except Exception as e:
-            print(f"Error in key recv: {e}")
-            client_public_key = ""
+            print(f"Error in key exchange: {e}")
+            cipher = None
 
-        if not client_public_key:
+        if not cipher:
             self._close_client(client_soc)
         else:
-            shared_key = diffie_hellman.generate_shared_key(client_public_key)
-            self.open_clients[client_soc] = [client_ip, aesCipher.AESCipher(str(shared_key))]
+            self._add_client(client_soc, client_ip, cipher)
 
     def _close_client(self, client_soc):
         """Close a client connection and notify the logic.
 
+        The selector's thread and handler threads that failed to send can close the same client at once,
+        only the first of them unregisters, closes and notifies the logic.
+
         :param client_soc: Client socket to close.
         """
-        if client_soc in self.open_clients.keys():
-            print(f"{self.open_clients[client_soc]} - disconnected")
-            self.recvQ.put((self.open_clients[client_soc][0], '97'))  # Notify logic a player has left
-            del self.open_clients[client_soc]
+        with self.close_lock:
+            if self.buffers.pop(client_soc, None) is None:  # client was closed by another thread
+                return
+            self.selector.unregister(client_soc)
+
+            client_ip = self.key_exchanges.pop(client_soc, None)
+            open_client = self.open_clients.pop(client_soc, None)
+            if open_client:
+                print(f"{open_client} - disconnected")
+                client_ip = open_client[0]
+                self.recvQ.put((client_ip, '97'))  # Notify logic a player has left
+                self.video_channels.pop(client_ip, None)
+                self.capabilities.pop(client_soc, None)
+                received_file = self.received_files.pop(client_soc, None)
+                if received_file:
+                    received_file.discard()
+                self.send_locks.pop(client_soc, None)
+
+            self.client_sockets.pop(client_ip, None)
             client_soc.close()
 
     def _find_socket_by_ip(self, client_ip):
@@ -112,28 +389,268 @@ class ServerComm:
         :param client_ip: ip of the client to find.
         :return: Client socket if found, None otherwise.
         """
-        socket = None
-        for sock in self.open_clients.keys():
-            if self.open_clients[sock][0] == client_ip:
-                socket = sock
-                break
-        return socket
+        client_soc = self.client_sockets.get(client_ip)
+        if client_soc not in self.open_clients:  # key exchange is not done yet
+            client_soc = None
+        return client_soc
 
-    def send_msg(self, client_ip, msg):
+    def send_msg(self, client_ip, msg, channel=settings.CONTROL_CHANNEL):
         """Send an encrypted message to a specific client.
 
         :param client_ip: ip of the client to send the message to.
         :param msg: Message to send.
+        :param channel: Channel to send the message on, the control channel by default.
         """
         client_soc = self._find_socket_by_ip(client_ip)
         if client_soc:
-            encrypted_message = self.open_clients[client_soc][1].encrypt(msg)
-            msg = str(len(encrypted_message)).zfill(settings.MESSAGE_LENGTH_LENGTH).encode() + encrypted_message
-            try:
-                client_soc.send(msg)
-            except Exception as e:
-                print(f"Error sending message: {e}")
-                self._close_client(client_soc)
+            self._send(client_soc, self._msg_frames(client_soc, channel, msg))
+
+    def send_file(self, client_ip, file_path, offset=0, prefix_msg=None):
+        """Send a file to a client whose video traffic is multiplexed over its connection.
+
+        The file's details are sent on the video channel and its encrypted content on the file channel,
+        a streamed file's chunks are each sent in a frame of their own.
+
+        :param client_ip: ip of the client to send the file to.
+        :param file_path: Path of the file to send.
+        :param offset: Position in the file to start sending from, to resume a transfer.
+        :param prefix_msg: Message to send on the video channel once the start of the file was sent.
+        """
+        client_soc = self._find_socket_by_ip(client_ip)
+        if not client_soc:
+            return
+
+        if os.path.isfile(file_path):
+            self._send(client_soc, self._file_frames(client_soc, file_path, settings.VIDEO_CHANNEL,
+                                                     settings.FILE_CHANNEL, offset, prefix_msg))
+        else:
+            print("file does not exist")
+
+    def _file_frames(self, client_soc, file_path, details_channel, content_channel, offset=0, prefix_msg=None):
+        """Encrypt a file and build the frames to send it in.
+
+        A client that accepted sealed media gets the file as it is encrypted at rest, only its file key is
+        encrypted for the client. A client that accepted streaming gets the file in chunks encrypted with
+        AES-GCM, only a single chunk of the file is read and encrypted at a time. Other clients get it
+        encrypted whole. Chunks can be sent from an offset, to resume a transfer that was interrupted.
+
+        :param client_soc: Client socket the file is sent to.
+        :param file_path: Path of the file to send.
+        :param details_channel: Channel to send the file's details on.
+        :param content_channel: Channel to send the file's content on, None to send it without framing.
+        :param offset: Position in the file to start sending from, rounded down to the start of its chunk.
+        :param prefix_msg: Message to send on the details channel once the first settings.PLAYBACK_PREFIX_CHUNKS
+            chunks were sent, so a video can start playing while the rest of it arrives. Sent after the
+            file if its content is not framed.
+        :return: Generator of the frames, in order. Parts of a sealed file are (file, offset, count) to sendfile.
+        """
+        cipher = self.open_clients[client_soc][1]
+        file_name = os.path.basename(file_path)
+        file_size = os.path.getsize(file_path)
+        # a resumed transfer starts at the chunk the offset is in, and sends at least the file's last chunk
+        first_index = min(offset, max(file_size - 1, 0)) // settings.FILE_CHUNK_SIZE
+        offset = first_index * settings.FILE_CHUNK_SIZE
+
+        sealed_file = None
+        if self._supports(client_soc, settings.SEALED_CAPABILITY):
+            sealed_file = sealedMedia.get_sealed_file(file_path)  # None while a changed file is sealed again
+
+        if sealed_file:
+            msg = serverProtocol.build_sealed_details(file_name, sealed_file.file_size, offset, sealed_file.file_key.hex())
+            f = sealed_file.file  # the key was read from this descriptor, so the chunks are of the same file
+            chunks = [(f, chunk_offset, count) for chunk_offset, count in sealed_file.chunks(first_index)]
+            if content_channel is None:  # the chunks are sent at once, the kernel copies them in one call
+                chunks = [(f, chunks[0][1], sum(count for _, _, count in chunks))]
+
+        elif self._supports(client_soc, settings.STREAM_CAPABILITY):
+            msg = serverProtocol.build_stream_details(file_name, file_size, offset)
+            f = open(file_path, 'rb')
+            f.seek(offset)
+            chunks = cipher.encrypt_file_stream(f, settings.FILE_CHUNK_SIZE, first_index)
+
+        else:
+            f = open(file_path, 'rb')
+            chunks = [cipher.encrypt_file(f.read())]
+            msg = serverProtocol.build_file_details(file_name, len(chunks[0]))
+
+        binary = self._supports(client_soc, settings.BINARY_CAPABILITY)
+        with f:
+            yield self._build_msg_frame(client_soc, details_channel, msg)
+            for index, chunk in enumerate(chunks):
+                if content_channel is not None:
+                    if prefix_msg and index == settings.PLAYBACK_PREFIX_CHUNKS:
+                        yield self._build_msg_frame(client_soc, details_channel, prefix_msg)
+                        prefix_msg = None
+                    chunk_len = chunk[2] if isinstance(chunk, tuple) else len(chunk)
+                    yield frames.build_frame_header(content_channel, chunk_len, binary)
+                yield chunk
+
+        if prefix_msg:
+            yield self._build_msg_frame(client_soc, details_channel, prefix_msg)
+
+    def _msg_frames(self, client_soc, channel, msg):
+        """Build a message's frame once the send lock is held, so frames are sent in the order of their nonces.
+
+        :param client_soc: Client socket the message is sent to.
+        :param channel: Channel to send the message on.
+        :param msg: Message to send.
+        :return: Generator of the message's frame.
+        """
+        yield self._build_msg_frame(client_soc, channel, msg)
+
+    def _build_msg_frame(self, client_soc, channel, msg):
+        """Encrypt a message and build its frame, a binary frame if the client accepted binary frames.
+
+        The message is encoded with protocolCodec if the client accepted the codec.
+
+        :param client_soc: Client socket the message is sent to.
+        :param channel: Channel to send the message on.
+        :param msg: Message to send, a protocolCodec.Command or a command string.
+        :return: The frame's bytes.
+        """
+        cipher = self.open_clients[client_soc][1]
+        data = protocolCodec.to_bytes(msg, self._supports(client_soc, settings.CODEC_CAPABILITY))
+        if self._supports(client_soc, settings.BINARY_CAPABILITY):
+            return frames.build_frame(channel, cipher.encrypt_binary(data, channel), binary=True)
+        return frames.build_frame(channel, cipher.encrypt(data, channel))
+
+    def _send(self, client_soc, frames):
+        """Send frames to a client, without frames sent by other threads getting in between them.
+
+        :param client_soc: Client socket to send to.
+        :param frames: Iterable of the frames to send, in order, built while sending if a generator. Frames of
+            encrypted messages are built here, the client rejects a message whose nonce is older than the last one.
+            A (file, offset, count) frame is sent from the file by the kernel, without copying it to python.
+        """
+        send_lock = self.send_locks.get(client_soc)
+        if not send_lock:  # client was closed by another thread
+            return
+
+        try:
+            with send_lock:
+                for frame in frames:
+                    if isinstance(frame, tuple):
+                        client_soc.sendfile(*frame)
+                    else:
+                        client_soc.sendall(frame)
+        except Exception as e:
+            print(f"Error sending message: {e}")
+            self._close_client(client_soc)
+
+    def is_multiplexed(self, client_ip):
+        """Check whether a client's video traffic can be multiplexed over its connection.
+
+        :param client_ip: ip of the client.
+        :return: True if both the client and the server support multiplexing, False otherwise.
+        """
+        return self._supports(self._find_socket_by_ip(client_ip), settings.MULTIPLEX_CAPABILITY)
+
+    def open_video_channel(self, client_ip):
+        """Open a video channel multiplexed over a client's connection.
+
+        :param client_ip: ip of the client to open the channel for.
+        :return: The client's VideoChannel.
+        """
+        channel = VideoChannel(self, client_ip)
+        self.video_channels[client_ip] = channel
+        self.recvQ.put((client_ip, "19"))  # send the user its pfp, like when it connects to a ServerCommVideos
+        return channel
+
+
+def handle_received_file(recvQ, idsQ, client_ip, file_name, received_path, video_details):
+    """
+    Moves a file received from a client to the proper location based on the type of file received
+    (video, thumbnail, pfp), or passes it to the logic if it is a video.
+
+    :param recvQ: The queue object used for sending data to the server logic.
+    :param idsQ: Queue of the ids the logic gave to the client's uploaded videos, used to name their thumbnails.
+    :param client_ip: ip of the client that sent the file.
+    :param file_name: The file's name, formatted filename.extension
+    :param received_path: Path of the temporary file the decrypted content was written to.
+    :param video_details: The video's details if the file is a video, empty otherwise.
+    :return: moves file to media\\videos if thumbnail and media\\pfps if pfp
+    """
+    file_name, extension = file_name.split(".") # the filename received from the server is filename.extension
+
+    # this code assumes that pfp names are strings (the user's name) and video and thumbnail file names are a rnd int
+    file_path = "media\\pfps"
+    if file_name.isnumeric():
+        file_path = "media\\videos"
+        if video_details: # if video details is not empty, it means that it is a video
+            recvQ.put((client_ip, (received_path, extension, video_details))) # sending file path with details to logic
+
+        else: # if file_name is a number but video_details is empty, it is a thumbnail
+            file_name = idsQ.get()
+
+    if file_name and not video_details: # id 0 indicates that the video already exists, so to not save the thumbnail
+        os.replace(received_path, f"{file_path}\\{file_name}.{extension}")
+        if settings.SEALED_MEDIA:
+            sealedMedia.seal_file(f"{file_path}\\{file_name}.{extension}")
+    elif not video_details:
+        os.remove(received_path)
+
+    if isinstance(file_name, str): # if filename is a str, it means the file is a pfp, so send user its pfp
+        recvQ.put((client_ip, "19"))
+
+
+if __name__ == '__main__':
+    # connections benchmark - CLIENTS clients connect from different loopback ips, the cpu used while they
+    # are idle is measured, then messages are echoed back through the logic's queue to measure latency
+    import random
+    import time
+
+    CLIENTS = 1000
+    IDLE_SECONDS = 3
+    MESSAGES = 2000
+    BENCHMARK_PORT = 12000
+
+    def recv_exact(sock, size):
+        data = b""
+        while len(data) < size:
+            data += sock.recv(size - len(data))
+        return data
+
+    recvQ = queue.Queue()
+    comm = ServerComm(BENCHMARK_PORT, recvQ)
+
+    def echo():
+        while True:
+            ip, msg = recvQ.get()
+            if msg != "97":
+                comm.send_msg(ip, msg)
+
+    threading.Thread(target=echo, daemon=True).start()
+    time.sleep(0.2)
+
+    clients = []
+    for i in range(CLIENTS):
+        sock = socket.socket()
+        sock.bind((f"127.0.{i // 250 + 1}.{i % 250 + 1}", 0))
+        sock.connect(("127.0.0.1", BENCHMARK_PORT))
+        handshake = keyExchange.ClientHandshake()
+        sock.sendall(handshake.hello())
+        server_hello = recv_exact(sock, keyExchange.SERVER_HELLO_SIZES[keyExchange.FULL_HANDSHAKE])
+        clients.append((sock, handshake.receive_hello(server_hello)))
+
+    while len(comm.open_clients) < CLIENTS:
+        time.sleep(0.01)
+    print(f"{CLIENTS} clients connected")
 
+    cpu_start = time.process_time()
+    time.sleep(IDLE_SECONDS)
+    print(f"idle cpu usage: {(time.process_time() - cpu_start) / IDLE_SECONDS * 100:.2f}%")
 
+    latencies = []
+    for _ in range(MESSAGES):
+        sock, cipher = random.choice(clients)
+        encrypted_message = cipher.encrypt("15@#0")
+        start = time.perf_counter()
+        sock.sendall(str(len(encrypted_message)).zfill(settings.MESSAGE_LENGTH_LENGTH).encode() + encrypted_message)
+        data_len = int(recv_exact(sock, settings.MESSAGE_LENGTH_LENGTH).decode())
+        cipher.decrypt(recv_exact(sock, data_len))
+        latencies.append(time.perf_counter() - start)
 
+    latencies.sort()
+    print(f"message latency - p50: {latencies[len(latencies) // 2] * 1000:.3f}ms, "
+          f"p99: {latencies[int(len(latencies) * 0.99)] * 1000:.3f}ms")
+    os._exit(0)  # the comm's main loop thread never returns
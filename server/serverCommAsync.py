@@ -0,0 +1,310 @@
+import asyncio
+import os
+import queue
+import threading
+
+import keyExchange
+import serverComm
+import serverProtocol
+import settings
+
+
+class AsyncConnection:
+    """An encrypted connection served by ServerCommAsync.
+
+    Everything written to the connection goes through its send queue and is written by a single
+    coroutine, so a message sent while a file is being streamed is written after the file and not
+    in the middle of it.
+
+    :ivar client_ip: ip of the connected client.
+    :ivar cipher: AEADCipher object created by the key exchange, None until the key exchange is done.
+    :ivar sendQ: asyncio queue of (is_file, message or file path) to write to the connection.
+    """
+
+    def __init__(self, client_ip):
+        """Initialize the AsyncConnection object.
+
+        :param client_ip: ip of the connected client.
+        """
+        self.client_ip = client_ip
+        self.cipher = None
+        self.sendQ = asyncio.Queue()
+
+
+class AsyncVideoChannel(AsyncConnection):
+    """The logic's handle to a client's video connection served by ServerCommAsync.
+
+    Has the same interface the logic uses of ServerCommVideos, so it can be stored in the logic's
+    clients dictionary in its place. Can be used before the client connected, what is sent is
+    written once the client connects.
+
+    :ivar comm: The ServerCommAsync serving the channel.
+    :ivar idsQ: Queue of the ids the logic gave to the client's uploaded videos, used to name their thumbnails.
+    :ivar connected: Whether the client has connected to the channel.
+    """
+
+    def __init__(self, comm, client_ip):
+        """Initialize the AsyncVideoChannel object.
+
+        :param comm: The ServerCommAsync serving the channel.
+        :param client_ip: ip of the client the channel is opened for.
+        """
+        super().__init__(client_ip)
+        self.comm = comm
+        self.idsQ = queue.Queue()
+        self.connected = False
+
+    def send_msg(self, client_ip, msg):
+        """Send an encrypted message to the client over the video connection.
+
+        :param client_ip: ip of the client, kept for compatibility with ServerCommVideos.
+        :param msg: Message to send.
+        """
+        self.comm.loop.call_soon_threadsafe(self.sendQ.put_nowait, (False, msg))
+
+    def send_file(self, file_path, offset=0, prefix_msg=None):
+        """Send a file to the client over the video connection.
+
+        Files are always streamed from their start, the client gets no offset in the file's details and
+        writes it from the start.
+
+        :param file_path: Path of the file to send.
+        :param offset: Not used, kept for compatibility with ServerCommVideos.
+        :param prefix_msg: Message to send after the file, the video's details.
+        """
+        if os.path.isfile(file_path):
+            self.comm.loop.call_soon_threadsafe(self.sendQ.put_nowait, (True, file_path))
+            if prefix_msg:
+                self.send_msg(self.client_ip, prefix_msg)
+        else:
+            print("file does not exist")
+
+
+class ServerCommAsync:
+    """Manages server-side communication with every client on a single asyncio event loop.
+
+    Serves the same protocol as ServerComm and ServerCommVideos: X25519 key exchange,
+    length prefixed encrypted messages and file transfers. Every connection is handled by
+    coroutines on one thread, and all video connections share one port instead of a listening
+    socket and a thread per logged-in user. Received messages are pushed to recvQ exactly like
+    ServerComm does, so the logic's handlers stay the same.
+
+    :ivar port: Port number for the clients' connections.
+    :ivar video_port: Port number for the clients' video connections.
+    :ivar recvQ: Queue to store received messages.
+    :ivar loop: The event loop serving every connection.
+    :ivar connections: Dictionary mapping client ips to their AsyncConnection.
+    :ivar video_channels: Dictionary mapping client ips to their AsyncVideoChannel.
+    """
+
+    def __init__(self, port, video_port, recvQ):
+        """Initialize the ServerCommAsync object and start its event loop.
+
+        :param port: Port number for the clients' connections.
+        :param video_port: Port number for the clients' video connections.
+        :param recvQ: Queue to store received messages.
+        """
+        self.port = port
+        self.video_port = video_port
+        self.recvQ = recvQ
+        self.loop = asyncio.new_event_loop()
+        self.connections = {}  # [ip] = AsyncConnection
+        self.video_channels = {}  # [ip] = AsyncVideoChannel
+
+        threading.Thread(target=self.loop.run_until_complete, args=(self._serve(),)).start()
+
+    async def _serve(self):
+        """Listen for connections on the control port and the video port."""
+        server = await asyncio.start_server(self._handle_client, "0.0.0.0", self.port)
+        video_server = await asyncio.start_server(self._handle_video_client, "0.0.0.0", self.video_port)
+        async with server, video_server:
+            await asyncio.gather(server.serve_forever(), video_server.serve_forever())
+
+    async def _handle_client(self, reader, writer):
+        """Serve a client's connection until it disconnects.
+
+        :param reader: The connection's StreamReader.
+        :param writer: The connection's StreamWriter.
+        """
+        client_ip = writer.get_extra_info("peername")[0]
+        if client_ip in self.connections:
+            writer.close()
+            print("attempted to enter through the same ip")
+            return
+
+        print(f"{client_ip} - connected")
+        connection = AsyncConnection(client_ip)
+        self.connections[client_ip] = connection
+        await self._serve_connection(connection, reader, writer)
+        del self.connections[client_ip]
+
+    async def _handle_video_client(self, reader, writer):
+        """Serve a client's video connection until it disconnects.
+
+        Only clients the logic opened a video channel for are served.
+
+        :param reader: The connection's StreamReader.
+        :param writer: The connection's StreamWriter.
+        """
+        client_ip = writer.get_extra_info("peername")[0]
+        channel = self.video_channels.get(client_ip)
+        if not channel or channel.connected:
+            writer.close()
+            return
+
+        channel.connected = True
+        await self._serve_connection(channel, reader, writer)
+        if self.video_channels.get(client_ip) is channel:
+            del self.video_channels[client_ip]
+
+    async def _serve_connection(self, connection, reader, writer):
+        """Exchange keys with a client, then receive its messages and write its send queue.
+
+        :param connection: The AsyncConnection or AsyncVideoChannel being served.
+        :param reader: The connection's StreamReader.
+        :param writer: The connection's StreamWriter.
+        """
+        sender = None
+        try:
+            connection.cipher = await self._change_key(reader, writer)
+            sender = asyncio.create_task(self._send_loop(connection, writer))
+
+            if isinstance(connection, AsyncVideoChannel):
+                # send the user its pfp, notify logic that the client has connected to its video channel
+                self.recvQ.put((connection.client_ip, "19"))
+
+            while True:
+                msg = await self._recv_msg(connection, reader)
+                if isinstance(connection, AsyncVideoChannel) and serverProtocol.is_file(msg):
+                    await self._recv_file(connection, reader, msg)
+                else:
+                    self.recvQ.put((connection.client_ip, msg))  # Push received data into the queue
+
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError) as e:
+            print(f"error in async comm with {connection.client_ip} -", e)
+
+        if sender:
+            sender.cancel()
+        writer.close()
+
+        if connection.cipher:
+            print(f"{connection.client_ip} - disconnected")
+            self.recvQ.put((connection.client_ip, '97'))  # Notify logic a player has left
+
+    @staticmethod
+    async def _change_key(reader, writer):
+        """Perform the key exchange with a client, see keyExchange.answer_hello.
+
+        :param reader: The connection's StreamReader.
+        :param writer: The connection's StreamWriter.
+        :return: AEADCipher object created by the key exchange.
+        """
+        cipher = None
+        while not cipher:
+            hello_start = await reader.readexactly(1)
+            hello_size = keyExchange.hello_size(hello_start, keyExchange.CLIENT_HELLO_SIZES)
+            server_hello, cipher = keyExchange.answer_hello(hello_start + await reader.readexactly(hello_size - 1))
+            writer.write(server_hello)
+            await writer.drain()
+        return cipher
+
+    @staticmethod
+    async def _recv_msg(connection, reader):
+        """Receive and decrypt a single message.
+
+        :param connection: The connection the message is received from.
+        :param reader: The connection's StreamReader.
+        :return: The decrypted message.
+        """
+        data_len = int((await reader.readexactly(settings.MESSAGE_LENGTH_LENGTH)).decode())
+        data = await reader.readexactly(data_len)
+        return connection.cipher.decrypt(data)
+
+    async def _recv_file(self, channel, reader, msg):
+        """Receive a file sent by a client and pass it to serverComm.handle_received_file.
+
+        handle_received_file can wait for the logic (a thumbnail's video id), so it runs in the
+        loop's executor and only this channel waits for it.
+
+        :param channel: The AsyncVideoChannel the file is received from.
+        :param reader: The channel's StreamReader.
+        :param msg: The decrypted file details message.
+        """
+        received_file = serverComm.ReceivedFile(channel.cipher, msg)
+        try:
+            for chunk_size in received_file.chunk_sizes():
+                received_file.write(await reader.readexactly(chunk_size))
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            received_file.discard()
+            raise
+
+        await self.loop.run_in_executor(None, serverComm.handle_received_file, self.recvQ, channel.idsQ,
+                                        channel.client_ip, received_file.file_name, received_file.path,
+                                        received_file.video_details)
+
+    async def _send_loop(self, connection, writer):
+        """Write the messages and files of a connection's send queue, in the order they were sent.
+
+        Files are streamed, read, encrypted with AES-GCM and written one chunk at a time, waiting for the
+        socket to drain between chunks, so a big video does not block the loop or sit in memory.
+
+        :param connection: The connection whose send queue is written.
+        :param writer: The connection's StreamWriter.
+        """
+        cipher = connection.cipher
+        while True:
+            is_file, item = await connection.sendQ.get()
+            try:
+                if is_file:
+                    msg = serverProtocol.build_stream_details(os.path.basename(item), os.path.getsize(item))
+                    writer.write(self._build_msg(cipher, msg))
+                    with open(item, 'rb') as f:
+                        for chunk in cipher.encrypt_file_stream(f, settings.FILE_CHUNK_SIZE):
+                            writer.write(chunk)
+                            await writer.drain()
+                else:
+                    writer.write(self._build_msg(cipher, item))
+                    await writer.drain()
+            except (ConnectionError, OSError) as e:
+                print(f"Error sending message: {e}")
+                writer.close()
+                break
+
+    @staticmethod
+    def _build_msg(cipher, msg):
+        """Encrypt a message and prefix it with its length.
+
+        :param cipher: The connection's AESCipher.
+        :param msg: Message to build, a protocolCodec.Command or a command string, sent as a command string.
+        :return: The bytes to write to the connection.
+        """
+        encrypted_message = cipher.encrypt(str(msg))
+        return str(len(encrypted_message)).zfill(settings.MESSAGE_LENGTH_LENGTH).encode() + encrypted_message
+
+    def send_msg(self, client_ip, msg):
+        """Send an encrypted message to a specific client, can be called from any thread.
+
+        :param client_ip: ip of the client to send the message to.
+        :param msg: Message to send.
+        """
+        self.loop.call_soon_threadsafe(self._queue_msg, client_ip, msg)
+
+    def _queue_msg(self, client_ip, msg):
+        """Put a message in a client's send queue, runs on the loop's thread.
+
+        :param client_ip: ip of the client to send the message to.
+        :param msg: Message to send.
+        """
+        connection = self.connections.get(client_ip)
+        if connection and connection.cipher:
+            connection.sendQ.put_nowait((False, msg))
+
+    def open_video_channel(self, client_ip):
+        """Open a video channel for a client, the client connects to it on the video port.
+
+        :param client_ip: ip of the client to open the channel for.
+        :return: The client's AsyncVideoChannel.
+        """
+        channel = AsyncVideoChannel(self, client_ip)
+        self.video_channels[client_ip] = channel
+        return channel
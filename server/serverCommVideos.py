@@ -6,6 +6,9 @@ import threading
 
 from typing_extensions import override
 
+import frames
+import protocolCodec
+import recvBuffer
 import serverComm
 import serverProtocol
 import settings
@@ -13,7 +16,7 @@ import settings
 class ServerCommVideos (serverComm.ServerComm):
     """Manages server-sipe communication with multiple clients using encryption.
 
-    Handles client connections, message sending/receiving, and Diffie-Hellman key exchange
+    Handles client connections, message sending/receiving, and X25519 key exchange
     for encrypted communication. Uses a separate thread for the main loop to monitor
     incoming connections and messages.
 
@@ -34,6 +37,7 @@ class ServerCommVideos (serverComm.ServerComm):
         self.client_socket = None
         self.client_ip = client_ip
         self.client_cipher = None
+        self.recv_buffer = recvBuffer.RecvBuffer()
 
     # for a single client, still is a thread
     def _mainLoop(self):
@@ -49,7 +53,7 @@ class ServerCommVideos (serverComm.ServerComm):
         self.client_socket = client_socket
 
         # only one client, so no need for thread
-        self._change_key(self.client_socket, self.client_ip)
+        self._change_key(self.client_socket, self.client_ip, self.recv_buffer)
 
         self.client_cipher = self.open_clients[self.client_socket][1]
 
@@ -58,43 +62,41 @@ class ServerCommVideos (serverComm.ServerComm):
 
         while True:
             try:
-                data_len = self.client_socket.recv(settings.MESSAGE_LENGTH_LENGTH).decode()
-                data = self.client_socket.recv(int(data_len)).decode()
+                frame = frames.recv_frame(self.recv_buffer, self.client_socket)  # only control messages are sent here
             except Exception as e:
                 print("error in video comm mainloop -", e)
-                data = ""
+                frame = None
 
-            if not data:
+            if not frame:
                 self._close_client(self.client_socket)
                 break
             else:
-                decrypted_message = self.client_cipher.decrypt(data)
+                channel, data, binary = frame
+                try:
+                    decrypted_message = protocolCodec.from_bytes(self.client_cipher.decrypt_bytes(data, binary, channel))
+                except ValueError as e:
+                    print("error in video comm message decrypt -", e)
+                    self._close_client(self.client_socket)
+                    break
                 if serverProtocol.is_file(decrypted_message):
                     self._recv_file(decrypted_message)
+                elif serverProtocol.is_capabilities(decrypted_message):
+                    self._set_capabilities(self.client_socket, decrypted_message)
                 else:
                     self.recvQ.put((self.client_ip, decrypted_message))
 
-    def send_file(self, file_path):
+    def send_file(self, file_path, offset=0, prefix_msg=None):
         """
-        Send a file to a client after encrypting the file.
+        Send a file to a client after encrypting the file, streamed in chunks if the client accepted streaming.
+
+        :param file_path: Path of the file to send.
+        :param offset: Position in the file to start sending from, to resume a transfer.
+        :param prefix_msg: Message to send after the file, the video's details.
         """
 
         if os.path.isfile(file_path):
-            with open(file_path, 'rb') as f:
-                data = f.read()
-
-            data = self.client_cipher.encrypt_file(data)
-            file_name = os.path.basename(file_path)
-            file_size = len(data)
-            msg = serverProtocol.build_file_details(file_name, file_size)
-            encrypted_message = self.client_cipher.encrypt(msg)
-            try:
-                self.client_socket.send(str(len(encrypted_message)).zfill(settings.MESSAGE_LENGTH_LENGTH).encode() + encrypted_message)
-                self.client_socket.send(data)
-            except Exception as e:
-                print(f"Error sending message: {e}")
-                self._close_client(self.client_socket)
-
+            self._send(self.client_socket, self._file_frames(self.client_socket, file_path, settings.CONTROL_CHANNEL,
+                                                             None, offset, prefix_msg))
         else:
             print("file does not exist")
 
@@ -103,61 +105,43 @@ class ServerCommVideos (serverComm.ServerComm):
         """
         Receive and process a file sent by a client socket.
 
-        This method handles the reception of a file from a client, decrypting its contents,
-         and saving it to the proper location based on the type of file received (video, thumbnail, pfp). It ensures that the file
-        size matches the expected size and takes necessary actions if the size does not
-        match, such as closing the client connection.
+        This method handles the reception of a file from a client, decrypting its contents
+         into a temporary file, one chunk at a time if it is streamed, and passing it to
+         serverComm.handle_received_file. If the connection breaks or the content was
+         modified, the temporary file is deleted and the client connection is closed.
 
         :param decrypted_message: The decrypted message containing metadata about the
             file being transferred.
-        :return: creates file at media\\videos if video or thumbnail and media\\pfps if pfp
         """
-
-        opcode, data = serverProtocol.unpack(decrypted_message)
-
-        file_name, file_size, *video_details = data
-        file_size = int(file_size)
-        print("file_size:", file_size, "file_name:", file_name, "video_details:", video_details)
-        file_content = self._recv_file_content(file_size)
-
-        file_name, extension = file_name.split(".") # the filename received from the server is filename.extension
-
-        if len(file_content) == file_size:
-            file_content = bytearray(self.client_cipher.decrypt_file(file_content)) #  decrypts file content
-
-
-            # this code assumes that pfp names are strings (the user's name) and video and thumbnail file names are a rnd int
-            file_path = "media\\pfps"
-            if file_name.isnumeric():
-                file_path = "media\\videos"
-                if video_details: # if video details is not empty, it means that it is a video
-                    self.recvQ.put((self.client_ip, (file_content, extension, video_details))) # sending file content with details to logic
-
-                else: # if file_name is a number but video_details is empty, it is a thumbnail
-                    file_name = self.idsQ.get()
-
-            if file_name and not video_details: # id 0 indicates that the video already exists, so to not save the thumbnail
-                with open(f"{file_path}\\{file_name}.{extension}", 'wb') as f:
-                    f.write(file_content)
-
-            if isinstance(file_name, str): # if filename is a str, it means the file is a pfp, so send user its pfp
-                self.recvQ.put((self.client_ip, "19"))
-
-        else:
+        received_file = serverComm.ReceivedFile(self.client_cipher, decrypted_message)
+        print("file_size:", received_file.file_size, "file_name:", received_file.file_name,
+              "video_details:", received_file.video_details)
+
+        try:
+            for chunk_size in received_file.chunk_sizes():
+                file_content = self._recv_file_content(chunk_size)
+                if file_content is None:
+                    raise ValueError("connection closed during file transfer")
+                received_file.write(file_content)
+        except ValueError as e:
+            print("Error at receiving file -", e)
+            received_file.discard()
             self._close_client(self.client_socket)
+            return
+
+        serverComm.handle_received_file(self.recvQ, self.idsQ, self.client_ip, received_file.file_name,
+                                        received_file.path, received_file.video_details)
 
     def _recv_file_content(self, file_size):
-        file_content = bytearray()
-        while len(file_content) < file_size:
-            slice = min(1024, (file_size - len(file_content)))
-            try:
-                data = self.client_socket.recv(slice)
-            except Exception as e:
-                print("Error at receiving file -", e)
-                data = b''
+        """
+        Receive file content into the receive buffer.
 
-            if not data:
-                break
+        :param file_size: Amount of bytes to receive.
+        :return: memoryview of the content, valid until the next receive, None if the connection broke.
+        """
+        try:
+            return self.recv_buffer.read_exact(self.client_socket, file_size)
+        except Exception as e:
+            print("Error at receiving file -", e)
+            return None
 
-            file_content.extend(data)
-        return file_content
@@ -1,3 +1,6 @@
+import protocolCodec
+
+
 def build_command(command, params):
     """Build a command string using an opcode and parameters.
 
@@ -7,16 +10,17 @@ def build_command(command, params):
     :param params: List of parameters for the command.
     :return: Formatted command string.
     """
-    while params and params[-1] is None:  # remove None at the end of params
-        params.pop()
+    return protocolCodec.build_text(command, params)
 
-    for index, value in enumerate(params):
-        if isinstance(value, (list, tuple)):
-            value = [str(i) for i in value]
-            params[index] = "#@".join(value)
 
-    params = [str(i) for i in params]
-    return str(command).zfill(2) + "@#".join(params)
+def build_message(command, params):
+    """Build a command that is encoded when it is sent, with protocolCodec if the peer accepted it.
+
+    :param command: The opcode for the command, that has a schema in protocolCodec.SERVER_SCHEMAS.
+    :param params: List of parameters for the command.
+    :return: protocolCodec.Command of the command.
+    """
+    return protocolCodec.Command(command, params, protocolCodec.SERVER_SCHEMAS[command])
 
 
 def build_sign_up_status(status):
@@ -25,7 +29,7 @@ def build_sign_up_status(status):
     :param status: A list of status codes for username, password, and email validation.
     :return: Formatted sign-up status command string.
     """
-    return build_command(0, [status])
+    return build_message(0, [status])
 
 
 def build_email_verification_confirmation(status, username=None, email=None, port=None):
@@ -37,7 +41,7 @@ def build_email_verification_confirmation(status, username=None, email=None, por
     :param port: The video communication port assigned to the client, if successful.
     :return: Formatted email verification confirmation command string.
     """
-    return build_command(1, [status, username, email, port])
+    return build_message(1, [status, username, email, port])
 
 
 def build_sign_in_status(status, port=None, username=None, followers_amount=None,
@@ -55,7 +59,7 @@ def build_sign_in_status(status, port=None, username=None, followers_amount=None
     :param followings_names: List of usernames the user is following.
     :return: Formatted sign-in status command string.
     """
-    return build_command(2, [status, port, username, followers_amount, followings_amount, videos_ids, email, topics,
+    return build_message(2, [status, port, username, followers_amount, followings_amount, videos_ids, email, topics,
                              followings_names])
 
 
@@ -65,7 +69,7 @@ def build_set_topics_confirmation(topics):
     :param topics: The updated list of topics assigned to the user.
     :return: Formatted set-topics confirmation command string.
     """
-    return build_command(3, [topics])
+    return build_message(3, [topics])
 
 
 def build_set_filter_confirmation(filter):
@@ -74,26 +78,27 @@ def build_set_filter_confirmation(filter):
     :param filter: The updated list of topics used as the active filter.
     :return: Formatted set-filter confirmation command string.
     """
-    return build_command(4, [filter])
+    return build_message(4, [filter])
 
 
-def build_user_details_in_search(username, followers_amount, followings_amount, videos_ids):
+def build_user_details_in_search(username, followers_amount, followings_amount, videos_ids, cursor=""):
     """
         Builds a response command containing a user's details for display in search results.
     :param username: The username of the user.
     :param followers_amount: The number of followers the user has.
     :param followings_amount: The number of users the user is following.
     :param videos_ids: List of video IDs uploaded by the user.
+    :param cursor: The cursor the list is continued from after this user.
     :return: Formatted user-details-in-search command string.
     """
-    return build_command(
+    return build_message(
         5,
-        [username, followers_amount, followings_amount, videos_ids]
+        [username, followers_amount, followings_amount, videos_ids, cursor]
     )
 
 
 def build_video_details_in_search(video_id, creator_name, video_name, video_desc, created_at, likes_amount,
-                                  comments_amount, liked, test_link):
+                                  comments_amount, liked, test_link, cursor=""):
     """
         Builds a response command containing a video's details for display in search results.
     :param video_id: The unique ID of the video.
@@ -105,12 +110,13 @@ def build_video_details_in_search(video_id, creator_name, video_name, video_desc
     :param comments_amount: The number of comments on the video.
     :param liked: Integer indicating whether the requesting user has liked the video (1 or 0).
     :param test_link: video's google form test link
+    :param cursor: The cursor the list is continued from after this video.
     :return: Formatted video-details-in-search command string.
     """
-    return build_command(
+    return build_message(
         6,
         [video_id, creator_name, video_name, video_desc, created_at, likes_amount,
-         comments_amount, liked, test_link]
+         comments_amount, liked, test_link, cursor]
     )
 
 
@@ -124,7 +130,7 @@ def build_comment_status(comment_id, video_id, commenter, comment, created_at):
     :param created_at: The formatted timestamp of when the comment was created.
     :return: Formatted comment-status command string.
     """
-    return build_command(7, [comment_id, video_id, commenter, comment, created_at])
+    return build_message(7, [comment_id, video_id, commenter, comment, created_at])
 
 
 def build_user_details_in_profile(username, followers_amount, followings_amount, videos_ids):
@@ -136,7 +142,7 @@ def build_user_details_in_profile(username, followers_amount, followings_amount,
     :param videos_ids: List of video IDs uploaded by the user.
     :return: Formatted user-details-in-profile command string.
     """
-    return build_command(8, [username, followers_amount, followings_amount, videos_ids])
+    return build_message(8, [username, followers_amount, followings_amount, videos_ids])
 
 
 def build_report_status(status, id, type, content, content_publisher, created_at=""):
@@ -150,18 +156,19 @@ def build_report_status(status, id, type, content, content_publisher, created_at
     :param created_at: The formatted timestamp of when the report was created.
     :return: Formatted report-status command string.
     """
-    return build_command(9, [status, id, type, content, content_publisher, created_at])
+    return build_message(9, [status, id, type, content, content_publisher, created_at])
 
 
 def build_send_comments(comments):
     """
         Builds a response command containing a batch of comments for a video.
     :param comments: A list of comment entries, each containing comment_id, video_id,
-                     commenter_name, comment text, and created_at timestamp.
+                     commenter_name, comment text, created_at timestamp, and the cursor the comments
+                     are continued from after it.
     :return: Formatted send-comments command string.
     """
-    # comments = [[comment_id, video_id, commenter_name, comment, created_at], ...]
-    return build_command(10, comments)
+    # comments = [[comment_id, video_id, commenter_name, comment, created_at, cursor], ...]
+    return build_message(10, comments)
 
 
 def build_del_video_confirmation(video_id):
@@ -170,7 +177,7 @@ def build_del_video_confirmation(video_id):
     :param video_id: The ID of the deleted video, or 0 if deletion failed.
     :return: Formatted delete-video confirmation command string.
     """
-    return build_command(11, [video_id])
+    return build_message(11, [video_id])
 
 
 def build_del_comment_confirmation(video_id=0, comment_id=0):
@@ -180,11 +187,11 @@ def build_del_comment_confirmation(video_id=0, comment_id=0):
     :param comment_id: The ID of the deleted comment, or 0 if deletion failed.
     :return: Formatted delete-comment confirmation command string.
     """
-    return build_command(12, [video_id, comment_id])
+    return build_message(12, [video_id, comment_id])
 
 
 def build_video_details_in_profile(video_id, creator_name, video_name, video_desc, created_at, likes_amount,
-                                   comments_amount, liked, test_link):
+                                   comments_amount, liked, test_link, cursor=""):
     """
         Builds a response command containing a video's details for display on a creator's profile.
     :param video_id: The unique ID of the video.
@@ -196,28 +203,30 @@ def build_video_details_in_profile(video_id, creator_name, video_name, video_des
     :param comments_amount: The number of comments on the video.
     :param liked: Integer indicating whether the requesting user has liked the video (1 or 0).
     :param test_link: video's google form test link
+    :param cursor: The cursor the list is continued from after this video.
 
     :return: Formatted video-details-in-profile command string.
     """
-    return build_command(
+    return build_message(
         13,
         [video_id, creator_name, video_name, video_desc, created_at, likes_amount,
-         comments_amount, liked, test_link]
+         comments_amount, liked, test_link, cursor]
     )
 
 
-def build_user_details_follow_list(username, followers_amount, followings_amount, videos_ids):
+def build_user_details_follow_list(username, followers_amount, followings_amount, videos_ids, cursor=""):
     """
         Builds a response command containing a user's details for display in a follow list.
     :param username: The username of the user.
     :param followers_amount: The number of followers the user has.
     :param followings_amount: The number of users the user is following.
     :param videos_ids: List of video IDs uploaded by the user.
+    :param cursor: The cursor the list is continued from after this user.
     :return: Formatted user-details-follow-list command string.
     """
-    return build_command(
+    return build_message(
         14,
-        [username, followers_amount, followings_amount, videos_ids]
+        [username, followers_amount, followings_amount, videos_ids, cursor]
     )
 
 
@@ -237,7 +246,7 @@ def build_video_details(video_id, creator_name, video_name, video_desc, created_
 
     :return: Formatted video-details command string.
     """
-    return build_command(
+    return build_message(
         15,
         [video_id, creator_name, video_name, video_desc, created_at, likes_amount,
          comments_amount, liked, test_link]
@@ -250,7 +259,7 @@ def build_video_upload_confirmation(video_id):
     :param video_id: The ID of the newly uploaded video, or 0 if the video already exists.
     :return: Formatted video-upload confirmation command string.
     """
-    return build_command(16, [video_id])
+    return build_message(16, [video_id])
 
 
 def build_follow_user_status(status, followed):
@@ -260,7 +269,7 @@ def build_follow_user_status(status, followed):
     :param followed: The username of the user that was followed or unfollowed.
     :return: Formatted follow-user status command string.
     """
-    return build_command(17, [status, followed])
+    return build_message(17, [status, followed])
 
 
 def build_like_video_confirmation(status, video_id):
@@ -270,7 +279,7 @@ def build_like_video_confirmation(status, video_id):
     :param video_id: The ID of the video that was liked or unliked.
     :return: Formatted like-video confirmation command string.
     """
-    return build_command(18, [status, video_id])
+    return build_message(18, [status, video_id])
 
 
 def build_update_pfp():
@@ -278,7 +287,25 @@ def build_update_pfp():
         Builds a response command notifying the client that their profile picture has been updated.
     :return: Formatted update-pfp command string.
     """
-    return build_command(19, [])
+    return build_message(19, [])
+
+
+def build_capabilities(capabilities):
+    """
+        Builds a command answering a client's capabilities, with the capabilities the server accepted.
+    :param capabilities: List of the capabilities both the client and the server support.
+    :return: Formatted capabilities command string.
+    """
+    return build_command(96, capabilities)
+
+
+def is_capabilities(msg):
+    """
+        Checks whether a message is a client's capabilities command.
+    :param msg: The message string to check.
+    :return: True if the message is a capabilities command, False otherwise.
+    """
+    return msg[:2] == build_capabilities([])[:2]
 
 
 # ----- Video transfer protocol -----
@@ -293,30 +320,65 @@ def build_file_details(file_name, file_size):
     return build_command(0, [file_name, file_size])
 
 
+def build_stream_details(file_name, file_size, offset=0):
+    """
+        Builds a command containing the metadata of a file streamed in chunks encrypted with AES-GCM,
+        sent instead of the file details to a peer that accepted streaming.
+    :param file_name: The name of the file being transferred.
+    :param file_size: The size of the file's content in bytes.
+    :param offset: Position in the file the sent chunks start at, more than 0 when resuming a transfer.
+    :return: Formatted stream-details command string.
+    """
+    return build_command(20, [file_name, file_size, offset])
+
+
+def build_sealed_details(file_name, file_size, offset, file_key):
+    """
+        Builds a command containing the metadata of a stored file that is sent as it is encrypted at rest,
+        streamed in chunks encrypted with its own file key, sent instead of the file details to a client
+        that accepted sealed media.
+    :param file_name: The name of the file being transferred.
+    :param file_size: The size of the file's content in bytes.
+    :param offset: Position in the file the sent chunks start at, more than 0 when resuming a transfer.
+    :param file_key: The key the file's chunks are encrypted with, as hex.
+    :return: Formatted sealed-details command string.
+    """
+    return build_command(21, [file_name, file_size, offset, file_key])
+
+
 def is_file(msg):
     """
-        Checks whether a message corresponds to a file transfer command.
+        Checks whether a message corresponds to a file transfer command, sent whole, streamed or sealed.
     :param msg: The message string to check.
     :return: True if the message is a file transfer command, False otherwise.
     """
-    return msg[:2] == build_file_details("", "")[:2]
+    return msg[:2] in (build_file_details("", "")[:2], build_stream_details("", "")[:2],
+                       build_sealed_details("", "", "", "")[:2])
+
+
+def is_stream(msg):
+    """
+        Checks whether a file transfer command is of a file sent in chunks, streamed or sealed.
+    :param msg: The message string to check.
+    :return: True if the message is a stream-details or sealed-details command, False otherwise.
+    """
+    return msg[:2] in (build_stream_details("", "")[:2], build_sealed_details("", "", "", "")[:2])
 
 
 def unpack(data):
-    """Unpack a command string into opcode and parameters.
+    """Unpack a command into opcode and parameters.
 
-    Extracts the opcode and splits parameters by '@#' delimiter if present.
+    A command string's parameters are split by '@#' delimiter if present, a command encoded with
+    protocolCodec is decoded to its typed parameters.
 
-    :param data: Command string to unpack.
+    :param data: Command string, or encoded command bytes.
     :return: Tuple of (opcode, parameters list).
     """
-    opcode = data[:2]
-    params = []
-    if len(data) > 2:
-        params = data[2:].split("@#")
-
-    for i, v in enumerate(params):
-        if "#@" in v:
-            params[i] = v.split("#@")
+    if isinstance(data, bytes):
+        try:
+            return protocolCodec.decode(data, protocolCodec.CLIENT_SCHEMAS)
+        except ValueError as e:
+            print("Error at unpacking command -", e)
+            return "", []
 
-    return opcode, params
+    return protocolCodec.unpack_text(data)
@@ -5,11 +5,17 @@ import re
 import secrets
 import smtplib
 import string
+import threading
 import time
 from email.message import EmailMessage
 
 import database
+import dispatcher
+import hotCache
+import mediaInventory
+import sealedMedia
 import serverComm
+import serverCommAsync
 import serverCommVideos
 import serverProtocol
 import settings
@@ -68,8 +74,15 @@ class ServerLogic:
     def __init__(self):
         """Initialize the server object and starts handle msgs"""
 
+        if settings.SEALED_MEDIA:  # media stored before sealing was added is sealed once, before it is served
+            sealed_amount = sealedMedia.seal_media(["media\\pfps", "media\\videos"])
+            print("media files sealed at startup:", sealed_amount)
+
         self.recvQ = queue.Queue()
-        self.comm = serverComm.ServerComm(settings.PORT, self.recvQ)
+        if settings.ASYNC_COMM:
+            self.comm = serverCommAsync.ServerCommAsync(settings.PORT, settings.VIDEO_PORT, self.recvQ)
+        else:
+            self.comm = serverComm.ServerComm(settings.PORT, self.recvQ)
         self.commands = {
             '00': self.handle_registration,
             '01': self.handle_email_verification,
@@ -91,6 +104,10 @@ class ServerLogic:
             '17': self.handle_follow_user,
             '18': self.handle_like_video,
             '19': self.send_user_his_pfp,
+            '22': self.handle_video_range_req,
+            '23': self.handle_videos_batch_req,
+            '24': self.handle_media_held,
+            '25': self.handle_media_discarded,
 
             '97': self.handle_client_disconnected,
             '98': self.handle_comment_or_video_status,
@@ -99,13 +116,22 @@ class ServerLogic:
 
         self.db = database.DataBase()
         self.current_video_port = settings.VIDEO_PORT
+        self.video_port_lock = threading.Lock()
         self.clients = {}  # [client_ip] = (username, video_comm, [topics_filter])
+        self.sign_in_lock = threading.Lock()  # held from checking a user is not logged in until the user is added
 
         self.clients_awaiting_email_verification = {}  # [client_ip] = [username, password, email, email_verification_code, time]
 
-        self.pfps_sent = {}  # [client_ip] = [users_names]
-        self.videos_sent = {}  # [client_ip] = [videos_ids]
-        self.thumbnails_sent = {}  # [client_ip] = [videos_ids]
+        self.media_sent = {}  # [client_ip] = MediaInventory of the pfps, videos and thumbnails the client holds
+
+        # read through caches, invalidated by the handlers that write what they keep
+        self.videos_cache = hotCache.HotCache("videos")  # [video_id] = the video's details from get_specific_video
+        self.users_cache = hotCache.HotCache("users")  # [username] = (followers_amount, followings_amount, videos_ids)
+        self.comments_cache = hotCache.HotCache("comments")  # [(video_id, username)] = first comments page, by video
+
+        self.dispatcher = None
+        if settings.HANDLER_WORKERS > 1:
+            self.dispatcher = dispatcher.Dispatcher(self.handle_msg, settings.HANDLER_WORKERS)
 
         self.handle_msgs()
 
@@ -118,22 +144,54 @@ class ServerLogic:
         self.clients.pop(client_ip, None)
         self.clients_awaiting_email_verification.pop(client_ip, None)
 
-        self.pfps_sent.pop(client_ip, None)
-        self.videos_sent.pop(client_ip, None)
-        self.thumbnails_sent.pop(client_ip, None)
+        self.media_sent.pop(client_ip, None)
 
     def handle_msgs(self):
-        """Process incoming messages from clients"""
+        """Process incoming messages from clients
+
+        Messages are handled on this thread, or passed to the dispatcher's workers when
+        settings.HANDLER_WORKERS is more than 1.
+        """
         while True:
             ip, msg = self.recvQ.get()
 
-            if isinstance(msg, tuple):
-                self.handle_video_upload(ip, msg)
+            if self.dispatcher:
+                self.dispatcher.dispatch(ip, msg)
             else:
-                opcode, data = serverProtocol.unpack(msg)
+                self.handle_msg(ip, msg)
+
+    def handle_msg(self, ip, msg):
+        """
+            Handles a single message by its opcode.
+        :param ip: ip of the client that sent the message
+        :param msg: the message, or a tuple of an uploaded video's content and details
+        """
+        if isinstance(msg, tuple):
+            self.handle_video_upload(ip, msg)
+        else:
+            opcode, data = serverProtocol.unpack(msg)
+
+            if opcode in self.commands.keys():
+                self.commands[opcode](ip, data)
+
+    def open_video_comm(self, client_ip):
+        """
+            Opens a video communication for a client on the next free video port,
+            or a video channel on the shared video port when using the asyncio comm,
+            or a video channel over the client's connection when the client supports multiplexing.
+        :param client_ip: ip of the client to open the video communication for
+        :return: tuple of (video_comm, port)
+        """
+        if settings.ASYNC_COMM:
+            return self.comm.open_video_channel(client_ip), settings.VIDEO_PORT
+
+        if self.comm.is_multiplexed(client_ip):
+            return self.comm.open_video_channel(client_ip), settings.SHARED_CONNECTION_PORT
 
-                if opcode in self.commands.keys():
-                    self.commands[opcode](ip, data)
+        with self.video_port_lock:  # sign ins of different clients can be handled at the same time
+            port = self.current_video_port
+            self.current_video_port += 1
+        return serverCommVideos.ServerCommVideos(port, self.recvQ, client_ip), port
 
     def handle_registration(self, client_ip, data):  # command 0
         """
@@ -193,16 +251,12 @@ class ServerLogic:
 
                 if not any(status):  # credentials are valid:
                     self.db.add_user(username, email, self.hash_password(password))
-                    self.clients[client_ip] = [username,
-                                               serverCommVideos.ServerCommVideos(self.current_video_port, self.recvQ, client_ip),
-                                               []]
-                    self.pfps_sent[client_ip] = []
-                    self.videos_sent[client_ip] = []
-                    self.thumbnails_sent[client_ip] = []
-
-                    port = self.current_video_port
+                    self.users_cache.invalidate(username)
+                    video_comm, port = self.open_video_comm(client_ip)
+                    self.clients[client_ip] = [username, video_comm, []]
+                    self.media_sent[client_ip] = mediaInventory.MediaInventory()
+
                     status = settings.EMAIL_VERIFICATION_SUCCESSFUL
-                    self.current_video_port += 1
                     del self.clients_awaiting_email_verification[client_ip]
 
                 else:  # credentials are taken
@@ -250,7 +304,7 @@ class ServerLogic:
             status[0] = settings.USERNAME_TOO_SHORT  # username too short
         elif len(username) > settings.MAX_NAME_LENGTH:
             status[0] = settings.USERNAME_TOO_LONG  # username too long
-        elif self.db.user_exists(username) or self.db.email_exists(username):
+        elif self.db.username_taken(username) or self.db.email_exists(username):
             status[0] = settings.USERNAME_ALREADY_EXISTS  # username already used as username or email
         elif not all(char in string.ascii_letters + string.digits + "_-." for char in username):
             status[0] = settings.USERNAME_INVALID_CHARACTERS  # invalid username characters
@@ -268,7 +322,7 @@ class ServerLogic:
         if not self.is_email_valid(email):
             status[2] = settings.EMAIL_NOT_VALID  # not a valid email
 
-        elif self.db.email_exists(email) or self.db.user_exists(email):
+        elif self.db.email_exists(email) or self.db.username_taken(email):
             status[2] = settings.EMAIL_ALREADY_EXISTS  # email already used as email or username
         return status
 
@@ -296,27 +350,25 @@ class ServerLogic:
         print(f"trying to sign in user: {username} ")
 
         if self.db.is_correct_username_and_password_hash(username, self.hash_password(password)):
-            if username in [i[0] for i in self.clients.values()]: # if user already logged in
-                status = settings.USER_ALREADY_LOGGED_IN
-                msg = serverProtocol.build_sign_in_status(status)
-            else:
-                status = settings.LOG_IN_SUCCESSFUL
-
-                followers_amount = self.db.get_followers_amount(username)
-                followings_amount = self.db.get_following_amount(username)
-                videos_ids = self.db.get_videos_by_creator(username)
-
-                topics = self.db.get_user_topics(username)
-                email = self.db.get_user_email(username)
-                followings_names = self.db.get_followings(username)
-                msg = serverProtocol.build_sign_in_status(status, self.current_video_port, username, followers_amount,
-                                                          followings_amount, videos_ids, email, topics, followings_names)
-                self.clients[client_ip] = [username, serverCommVideos.ServerCommVideos(self.current_video_port, self.recvQ,
-                                                                                       client_ip), []]
-                self.pfps_sent[client_ip] = []
-                self.videos_sent[client_ip] = []
-                self.thumbnails_sent[client_ip] = []
-                self.current_video_port += 1
+            with self.sign_in_lock:  # two clients signing in to the same user at once are not both logged in
+                if username in [i[0] for i in list(self.clients.values())]: # if user already logged in
+                    status = settings.USER_ALREADY_LOGGED_IN
+                    msg = serverProtocol.build_sign_in_status(status)
+                else:
+                    status = settings.LOG_IN_SUCCESSFUL
+
+                    followers_amount = self.db.get_followers_amount(username)
+                    followings_amount = self.db.get_following_amount(username)
+                    videos_ids = self.db.get_videos_by_creator(username)
+
+                    topics = self.db.get_user_topics(username)
+                    email = self.db.get_user_email(username)
+                    followings_names = self.db.get_followings(username)
+                    video_comm, port = self.open_video_comm(client_ip)
+                    msg = serverProtocol.build_sign_in_status(status, port, username, followers_amount,
+                                                              followings_amount, videos_ids, email, topics, followings_names)
+                    self.clients[client_ip] = [username, video_comm, []]
+                    self.media_sent[client_ip] = mediaInventory.MediaInventory()
 
         self.comm.send_msg(client_ip, msg)
         if status == settings.LOG_IN_SUCCESSFUL:
@@ -350,11 +402,7 @@ class ServerLogic:
                 self.send_pfp(client_ip, commenter)  # sends the commenter's pfp if the client doesnt already have it
             else:  # type == settings.VIDEO_DIGIT_REPR
                 content, content_publisher = self.db.get_specific_video(id, False)[:2]
-                thumbnail_path = (f"media\\videos\\{id}.png")
-                if os.path.isfile(thumbnail_path) and thumbnail_path not in self.thumbnails_sent[client_ip]:
-                    self.clients[client_ip][1].send_file(
-                        thumbnail_path)  # sends the video's thumbnail if the client doesnt already have it'
-                    self.thumbnails_sent[client_ip].append(thumbnail_path)
+                self.send_thumbnail(client_ip, id)  # sends the video's thumbnail if the client doesnt already have it
 
             msg = serverProtocol.build_report_status(status, id, type, content, content_publisher, created_at)
             self.clients[client_ip][1].send_msg(client_ip, msg)
@@ -390,25 +438,16 @@ class ServerLogic:
         Handles the search for creators based on the provided username
 
         :param client_ip: The ip of the client making the request.
-        :param data: A tuple containing the search username and a flag indicating if the
-                     next batch of usernames should be sent.
+        :param data: A tuple containing the search username and the cursor of the last user sent,
+                     empty for the first batch of usernames.
         """
-        username, last_username = data[0]
-
-        usernames = self.db.get_similar_usernames(username)
+        username, cursor = data
 
-        start_index = 0
-
-        if last_username:
-            start_index = usernames.index(last_username) + 1
-
-        usernames = usernames[start_index:]
-
-        deleted_usernames = self.db.get_deleted_usernames()
-
-        usernames = [i for i in usernames if i not in deleted_usernames]
-
-        usernames = usernames[:settings.AMOUNT_OF_USERS_TO_SEND]
+        try:
+            usernames = self.db.get_similar_usernames_page(username, cursor)  # deleted users are not found
+        except ValueError as e:
+            print("creators search -", e)
+            usernames = []
 
         # send username details and pfps
         if usernames:
@@ -422,15 +461,14 @@ class ServerLogic:
         Send the user details of the users in usernames to the client.
 
         :param client_ip: The ip of the client to which the data will be sent.
-        :param usernames: A list of usernames of the users to send their details.
+        :param usernames: A list of (username, cursor) of the users to send their details.
         """
-        for username in usernames:
-            if self.db.user_exists(username):
-                followers_amount = self.db.get_followers_amount(username)
-                followings_amount = self.db.get_following_amount(username)
-                videos_ids = self.db.get_videos_by_creator(username)
+        for username, cursor in usernames:
+            user_summary = self.get_user_summary(username)
+            if user_summary:
+                followers_amount, followings_amount, videos_ids = user_summary
                 msg = serverProtocol.build_user_details_in_search(username, followers_amount, followings_amount,
-                                                                  videos_ids)
+                                                                  videos_ids, cursor)
                 self.comm.send_msg(client_ip, msg)
 
                 # sends the user's pfp if the client doesnt already have it
@@ -443,12 +481,23 @@ class ServerLogic:
         :param client_ip: The ip of the client requesting the profile picture.
         :param username: The username associated with the profile picture to be sent.
         """
-        if username not in self.pfps_sent[client_ip]:
-            user_pfp_image_path = f"media\\pfps\\{username}.png"
-            if os.path.isfile(user_pfp_image_path):
-                self.pfps_sent[client_ip].append(username)
-                self.clients[client_ip][1].send_file(user_pfp_image_path)
-                print("sending pfp of user:", username)
+        user_pfp_image_path = f"media\\pfps\\{username}.png"
+        version = mediaInventory.media_version(user_pfp_image_path)  # a pfp the user changed is sent again
+        if version is not None and self.media_sent[client_ip].claim(mediaInventory.PFP, username, version):
+            self.clients[client_ip][1].send_file(user_pfp_image_path)
+            print("sending pfp of user:", username)
+
+    def send_thumbnail(self, client_ip, video_id):
+        """
+            sends the thumbnail of a video to a client if it hasn't already been sent to him.
+
+        :param client_ip: The ip of the client.
+        :param video_id: The id of the video whose thumbnail to send.
+        """
+        thumbnail_path = f"media\\videos\\{video_id}.png"
+        version = mediaInventory.media_version(thumbnail_path)
+        if version is not None and self.media_sent[client_ip].claim(mediaInventory.THUMBNAIL, video_id, version):
+            self.clients[client_ip][1].send_file(thumbnail_path)
 
     def handle_videos_search(self, client_ip, data):  # command 6
         """
@@ -459,27 +508,18 @@ class ServerLogic:
         :param data: A tuple containing the search parameters:
                      - video_name_or_desc: The name or description of the video to search for.
                      - topics: A list of topics to filter the search.
-                     - last_id: id of last video sent.
+                     - cursor: cursor of the last video sent, empty for the first videos.
         """
-        video_name_or_desc, topics, last_id = data
+        video_name_or_desc, topics, cursor = data
 
         print("topics in videos_search: ", topics)
 
-        last_id = int(last_id)
-
-        videos_ids = self.db.search_videos(video_name_or_desc, topics)
-
-        start_index = 0
-        if last_id:
-            start_index = videos_ids.index(last_id) + 1
-
-        videos_ids = videos_ids[start_index:]
-        deleted_videos_ids = self.db.get_deleted_videos_ids()
-
-        videos_ids = [i for i in videos_ids if i not in deleted_videos_ids]
-
-        videos_to_send = videos_ids[:settings.AMOUNT_OF_VIDEOS_TO_SEND]
-        print("videos_to_send in videos_search after last_id", videos_to_send)
+        try:
+            videos_to_send = self.db.search_videos_page(video_name_or_desc, topics, cursor)
+        except ValueError as e:
+            print("videos search -", e)
+            videos_to_send = []
+        print("videos_to_send in videos_search after cursor", videos_to_send)
 
         if videos_to_send:
             # send username details and pfps
@@ -493,21 +533,19 @@ class ServerLogic:
         sends video details and thumbnail to the client.
 
         :param client_ip: The ip of the client.
-        :param video_ids: A list of video ids of videos to send details and thumbnails.
+        :param video_ids: A list of (video id, cursor) of videos to send details and thumbnails.
         """
-        for video_id in video_ids:
+        for video_id, cursor in video_ids:
             if self.db.video_exists(video_id):
                 video_id, creator, video_name, video_desc, created_at, likes_amount, comments_amount, liked, test_link = self.get_video_details(
                     client_ip, video_id)
 
-                if video_id not in self.thumbnails_sent[client_ip]:
-                    self.thumbnails_sent[client_ip].append(video_id)
-                    thumbnail_path = f"media\\videos\\{video_id}.png"
-                    self.clients[client_ip][1].send_file(thumbnail_path)
+                self.send_thumbnail(client_ip, video_id)
 
                 msg = serverProtocol.build_video_details_in_profile(video_id, creator, video_name, video_desc,
                                                                     created_at,
-                                                                    likes_amount, comments_amount, liked, test_link)
+                                                                    likes_amount, comments_amount, liked, test_link,
+                                                                    cursor)
 
                 self.clients[client_ip][1].send_msg(client_ip, msg)
 
@@ -526,6 +564,7 @@ class ServerLogic:
 
         if self.db.video_exists(video_id):
             comment_id, created_at = self.db.add_comment(video_id, commenter_name, comment)
+            self.invalidate_video_comments(video_id)
             print("id, created:", comment_id, created_at)
             msg = serverProtocol.build_comment_status(comment_id, video_id, commenter_name, comment, created_at)
             self.comm.send_msg(client_ip, msg)
@@ -558,13 +597,31 @@ class ServerLogic:
         followings_amount = 0
         videos_ids = 0
 
-        if self.db.user_exists(username):
-            followers_amount = self.db.get_followers_amount(username)
-            followings_amount = self.db.get_following_amount(username)
-            videos_ids = self.db.get_videos_by_creator(username)
+        user_summary = self.get_user_summary(username)
+        if user_summary:
+            followers_amount, followings_amount, videos_ids = user_summary
 
         return username, followers_amount, followings_amount, videos_ids
 
+    def get_user_summary(self, username):
+        """
+            Retrieves the follower count, following count and video IDs of a user, through the users cache.
+        :param username: The username of the user.
+        :return: A tuple of (followers_amount, followings_amount, videos_ids), None if the user doesn't exist.
+        """
+        return self.users_cache.get(username, lambda: self.load_user_summary(username))
+
+    def load_user_summary(self, username):
+        """
+            Reads the follower count, following count and video IDs of a user from the database.
+        :param username: The username of the user.
+        :return: A tuple of (followers_amount, followings_amount, videos_ids), None if the user doesn't exist.
+        """
+        if not self.db.user_exists(username):
+            return None
+        return (self.db.get_followers_amount(username), self.db.get_following_amount(username),
+                self.db.get_videos_by_creator(username))
+
     def handle_report(self, client_ip, data):  # command 9
         """
             Handles a report submitted by a client against a video or comment.
@@ -609,33 +666,27 @@ class ServerLogic:
 
     def handle_comments_req(self, client_ip, data):  # command 10
         """
-            :param data: video_id, last_comment_id
-            last_comment_id -> used to determine which comments should be next to be sent to the client.
-            last_comment_id is the last comment's id the client has received.
-            if last_comment_id = 0. it means that its the first time the client has requested comments.
+            :param data: video_id, cursor
+            cursor -> used to determine which comments should be next to be sent to the client.
+            cursor is the cursor of the last comment the client has received.
+            if cursor is empty, it means that its the first time the client has requested comments.
         """
-        video_id, last_id = data
+        video_id, cursor = data
+        username = self.clients[client_ip][0]
         print("comments req arrived at handle", video_id)
 
-        last_id = int(last_id)
-
-        comments = self.db.get_comments(video_id, self.clients[client_ip][0])
-        comments_ids = [i[0] for i in comments]
-
-        start_index = 0
-        if last_id:
-            start_index = comments_ids.index(last_id) + 1
-
-        comments = comments[start_index:]  # make the comments start from the start_index
-
-        deleted_comments_ids = self.db.get_deleted_command_ids(video_id)
-        print("deleted comments ids:", deleted_comments_ids)
-
-        # recreate comments without any deleted comments
-        comments = [i for i in comments if i[0] not in deleted_comments_ids]
-
-        print("comments:", repr(comments), "commentslen", len(comments))
-        comments_to_send = comments[:settings.AMOUNT_OF_COMMENTS_TO_SEND]
+        try:  # deleted comments are not retrieved
+            if cursor:
+                comments = self.db.get_comments_page(video_id, username, cursor)
+            else:  # the first page is the one most requested, for every video shown
+                comments = self.comments_cache.get((int(video_id), username),
+                                                   lambda: self.db.get_comments_page(video_id, username),
+                                                   group=int(video_id))
+        except ValueError as e:
+            print("comments req -", e)
+            comments = []
+
+        comments_to_send = [list(comment) + [comment_cursor] for comment, comment_cursor in comments]
         print(f"comments_to_send for video {video_id}:", comments_to_send)
 
         commenters = {i[2] for i in comments_to_send}
@@ -660,6 +711,7 @@ class ServerLogic:
         msg = serverProtocol.build_del_video_confirmation(0)
         if client_ip in self.clients and self.db.is_the_video_creator(video_id, self.clients[client_ip][0]):
             self.db.delete_video(video_id)
+            self.invalidate_video(video_id, self.clients[client_ip][0])
             self.delete_video_files(video_id)
             msg = serverProtocol.build_del_video_confirmation(video_id)
 
@@ -677,6 +729,7 @@ class ServerLogic:
         if comment:
             self.db.delete_comment(comment_id)
             video_id = comment[1]
+            self.invalidate_video_comments(video_id)
             msg = serverProtocol.build_del_comment_confirmation(video_id, comment_id)
             print("deleting comment")
         self.comm.send_msg(client_ip, msg)
@@ -685,22 +738,15 @@ class ServerLogic:
         """
             Handles a request for a paginated list of videos uploaded by a specific creator.
         :param client_ip: The IP address of the client making the request.
-        :param data: A list containing the creator's username and the last received video ID for pagination.
+        :param data: A list containing the creator's username and the last received video's cursor for pagination.
         """
-        username, last_id = data
-        last_id = int(last_id)
-
-        videos_ids = self.db.get_videos_by_creator(username, False)
-        start_index = 0
-        if last_id:
-            start_index = videos_ids.index(last_id) + 1
-
-        videos_ids = videos_ids[start_index:]
-        deleted_videos_ids = self.db.get_deleted_videos_ids()
+        username, cursor = data
 
-        videos_ids = [i for i in videos_ids if i not in deleted_videos_ids]
-
-        videos_to_send = videos_ids[:settings.AMOUNT_OF_VIDEOS_TO_SEND]
+        try:
+            videos_to_send = self.db.get_videos_by_creator_page(username, cursor)
+        except ValueError as e:
+            print("creator videos req -", e)
+            videos_to_send = []
 
         print(f"videos_to_send in creator video req: {videos_to_send}")
 
@@ -716,26 +762,15 @@ class ServerLogic:
             back user details in paginated batches.
         :param client_ip: The IP address of the client making the request.
         :param data: A list containing the username, follow type (0 for followings, 1 for followers),
-                     and the last received username for pagination.
+                     and the last received user's cursor for pagination.
         """
-        username, follow_type, last_follow_name = data
-
-        if follow_type:  # follow_type: 0 - followings, 1 - followers
-            users_to_send = self.db.get_followers(username)
-        else:
-            users_to_send = self.db.get_followings(username)
-
-        start_index = 0
-
-        if last_follow_name:
-            start_index = users_to_send.index(last_follow_name) + 1
+        username, follow_type, cursor = data
 
-        users_to_send = users_to_send[start_index:]
-
-        deleted_usernames = self.db.get_deleted_usernames()
-        users_to_send = [i for i in users_to_send if i not in deleted_usernames]
-
-        users_to_send = users_to_send[:settings.AMOUNT_OF_USERS_TO_SEND]
+        try:  # follow_type: 0 - followings, 1 - followers
+            users_to_send = self.db.get_follow_list_page(username, bool(int(follow_type)), cursor)
+        except ValueError as e:
+            print("follow list req -", e)
+            users_to_send = []
         print("users to send in follow list req", users_to_send)
 
         if users_to_send:
@@ -767,13 +802,44 @@ class ServerLogic:
                 msg_to_send = serverProtocol.build_video_details(settings.DELETED_ID, "", "", "", "", 0, 0, 0, "")
                 self.clients[client_ip][1].send_msg(client_ip, msg_to_send)
         else:
-            video_id = settings.END_OF_LIST_ID
-            if not self.db.are_there_videos():
-                video_id = settings.NO_VIDEOS_ID
+            self.send_end_of_videos(client_ip, username)
 
-            self.db.remove_watched_videos_for_user(username)
-            msg_to_send = serverProtocol.build_video_details(video_id, "", "", "", "", 0, 0, 0, "")
-            self.clients[client_ip][1].send_msg(client_ip, msg_to_send)
+    def handle_videos_batch_req(self, client_ip, data):  # command 23
+        """
+            Handles a request for the next recommended videos of the feed, answering it like that amount of
+            requests for a recommended video. The videos are found in a single pass, their views are recorded
+            together, and their files, details and comments are sent one after the other without waiting.
+        :param client_ip: The IP address of the client making the request.
+        :param data: A list containing the amount of videos to send.
+        """
+        amount = min(int(data[0]), settings.MAX_VIDEOS_TO_REQ)
+        username = self.clients[client_ip][0]
+        while amount > 0:
+            videos_ids = self.db.get_videos_for_user(username, self.clients[client_ip][2], amount)
+            self.db.add_watched_videos(username, videos_ids)
+            for video_id in videos_ids:
+                self.send_video_and_details(client_ip, video_id)
+                self.handle_comments_req(client_ip, [video_id, 0])
+            amount -= len(videos_ids)
+
+            if amount:  # the user watched every video, its history is reset and the rest of the videos follow
+                self.send_end_of_videos(client_ip, username)
+                amount -= 1
+
+    def send_end_of_videos(self, client_ip, username):  # helper function
+        """
+            Tells a client that requested a recommended video that it watched every video, and resets its
+            watched history so the videos are recommended again.
+        :param client_ip: The IP address of the client.
+        :param username: The client's username.
+        """
+        video_id = settings.END_OF_LIST_ID
+        if not self.db.are_there_videos():
+            video_id = settings.NO_VIDEOS_ID
+
+        self.db.remove_watched_videos_for_user(username)
+        msg_to_send = serverProtocol.build_video_details(video_id, "", "", "", "", 0, 0, 0, "")
+        self.clients[client_ip][1].send_msg(client_ip, msg_to_send)
 
     def send_video_and_details(self, client_ip, video_id):  # helper function
         """
@@ -787,34 +853,88 @@ class ServerLogic:
 
         self.send_pfp(client_ip, creator)  # sends creator's pfp if the clients doesnt already have it
 
-        if not video_id in self.videos_sent[client_ip]:
-            self.videos_sent[client_ip].append(video_id)
-            file_path = f"media\\videos\\{video_id}.{settings.VIDEO_EXTENSION}"
-            self.clients[client_ip][1].send_file(file_path)
-
         msg = serverProtocol.build_video_details(video_id, creator, video_name, video_desc, created_at, likes_amount,
                                                  comments_amount, liked, test_link)
-        self.clients[client_ip][1].send_msg(client_ip, msg)
+        file_path = f"media\\videos\\{video_id}.{settings.VIDEO_EXTENSION}"
+        if self.media_sent[client_ip].claim(mediaInventory.VIDEO, video_id, mediaInventory.media_version(file_path)):
+            # the details are sent once the start of the video was sent, so the client can start playing it
+            self.clients[client_ip][1].send_file(file_path, prefix_msg=msg)
+        else:
+            self.clients[client_ip][1].send_msg(client_ip, msg)
+
+    def handle_video_range_req(self, client_ip, data):  # command 22
+        """
+            Handles a client's request to resume the download of a video that was interrupted,
+            sending the video's file from the offset the client already has.
+        :param client_ip: The IP address of the client making the request.
+        :param data: A list containing the video ID and the offset in bytes to send the file from.
+        """
+        video_id, offset = int(data[0]), int(data[1])
+        if self.db.video_exists(video_id):
+            file_path = f"media\\videos\\{video_id}.{settings.VIDEO_EXTENSION}"
+            self.media_sent[client_ip].add(mediaInventory.VIDEO, video_id, mediaInventory.media_version(file_path))
+            self.clients[client_ip][1].send_file(file_path, offset)
+
+    def handle_media_held(self, client_ip, data):  # command 24
+        """
+            Handles a client telling the server which media files its cache holds, after logging in.
+            The files that are the server's current files are added to the client's inventory, so they are not sent.
+        :param client_ip: The IP address of the client.
+        :param data: A list of [file name, content hash] of the held files, least recently used first.
+        """
+        inventory = self.media_sent.get(client_ip)
+        if inventory is None:
+            return
+
+        held = 0
+        for file_name, file_hash in data:
+            item = mediaInventory.media_item(file_name)
+            if item is None:
+                continue
+            kind, key, file_path = item
+            version = mediaInventory.media_version(file_path)
+            if version is not None and mediaInventory.media_content_hash(file_path, version) == file_hash:
+                inventory.add(kind, key, version)
+                held += 1
+        print(f"client {client_ip} holds {held} of {len(data)} media files it advertised")
+
+    def handle_media_discarded(self, client_ip, data):  # command 25
+        """
+            Handles a client telling the server which media files its cache deleted, so they are sent again.
+        :param client_ip: The IP address of the client.
+        :param data: A list of the deleted files' names.
+        """
+        inventory = self.media_sent.get(client_ip)
+        if inventory is None:
+            return
+
+        for file_name in data:
+            item = mediaInventory.media_item(file_name)
+            if item is not None:
+                inventory.discard(*item[:2])
 
     def handle_video_upload(self, client_ip, data):  # command 16
         """
             Handles a video upload from a client, checking for duplicates by hash
             before saving the file and recording it in the database.
         :param client_ip: The IP address of the client uploading the video.
-        :param data: A tuple of (file_content, extension, video_details), where video_details
-                     contains the video name, description, test link, and topics.
+        :param data: A tuple of (received_path, extension, video_details), where received_path is the
+                     temporary file the video was received to and video_details contains the video
+                     name, description, test link, and topics.
         """
-        file_content, extension, video_details = data
+        received_path, extension, video_details = data
         video_name, video_desc, test_link, topics = video_details
         print("video_name", video_name, "video_desc", video_desc, "test_link", test_link, "topics", topics)
 
-        video_hash = self.hash_video(file_content)
+        video_hash = self.hash_video(received_path)
         if not self.db.hash_exists(video_hash):
             video_id = self.db.add_video(self.clients[client_ip][0], video_name, video_desc, test_link)
             self.db.add_video_topics(video_id, topics)
+            self.users_cache.invalidate(self.clients[client_ip][0])  # the creator's videos
 
-            with open(f"media\\videos\\{video_id}.{extension}", 'wb') as f:
-                f.write(file_content)
+            os.replace(received_path, f"media\\videos\\{video_id}.{extension}")
+            if settings.SEALED_MEDIA:  # encrypt the video at rest once, instead of for every view
+                sealedMedia.seal_file(f"media\\videos\\{video_id}.{extension}")
             self.db.add_video_hash(video_id, video_hash)
             # puts the id for the thumbnail filename
             self.clients[client_ip][1].idsQ.put(video_id)
@@ -822,6 +942,7 @@ class ServerLogic:
             msg = serverProtocol.build_video_upload_confirmation(video_id)
             self.comm.send_msg(client_ip, msg)
         else:
+            os.remove(received_path)
             # 0 indicates that the video already exists, so to not save the thumbnail
             self.clients[client_ip][1].idsQ.put(0)
             msg = serverProtocol.build_video_upload_confirmation(0)
@@ -835,12 +956,39 @@ class ServerLogic:
         :param video_id: The ID of the video to retrieve details for.
         :return: A tuple of (video_id, creator, video_name, video_desc, created_at, likes_amount, comments_amount, liked).
         """
-        creator, video_name, video_desc, created_at, likes_amount, comments_amount, test_link = self.db.get_specific_video(
-            video_id)
+        creator, video_name, video_desc, created_at, likes_amount, comments_amount, test_link = self.videos_cache.get(
+            int(video_id), lambda: self.load_video_details(video_id))
         liked = self.db.is_liked_by_user(video_id, self.clients[client_ip][0])
         liked = int(liked)
         return video_id, creator, video_name, video_desc, created_at, likes_amount, comments_amount, liked, test_link
 
+    def load_video_details(self, video_id):  # helper function
+        """
+            Reads a video's details from the database, with its buffered likes committed first, so the kept
+            likes amount is not older than the likes.
+        :param video_id: The ID of the video.
+        :return: A tuple of (creator, video_name, video_desc, created_at, likes_amount, comments_amount, test_link).
+        """
+        self.db.flush_video_likes(video_id)
+        return self.db.get_specific_video(video_id)
+
+    def invalidate_video(self, video_id, creator):  # helper function
+        """
+            Drops a deleted video from the caches, with its comments and its creator's summary.
+        :param video_id: The ID of the video.
+        :param creator: The username of the video's creator.
+        """
+        self.invalidate_video_comments(video_id)
+        self.users_cache.invalidate(creator)
+
+    def invalidate_video_comments(self, video_id):  # helper function
+        """
+            Drops a video whose comments changed from the caches, its details hold its comments amount.
+        :param video_id: The ID of the video.
+        """
+        self.videos_cache.invalidate(int(video_id))
+        self.comments_cache.invalidate_group(int(video_id))
+
     def handle_follow_user(self, client_ip, data):  # command 17
         """
             Handles a follow or unfollow request from a client.
@@ -856,6 +1004,7 @@ class ServerLogic:
             else:
                 self.db.add_following(follower, followed)
                 status = 1
+            self.users_cache.invalidate(follower, followed)
         else:
             followed = ""  # indicates user doesnt exist
         msg = serverProtocol.build_follow_user_status(status, followed)
@@ -876,18 +1025,18 @@ class ServerLogic:
         else:
             status = 1
             self.db.add_video_like(video_id, username)
+        # the like is committed with the next group commit, so the kept likes amount is changed instead of read again
+        change = 1 if status else -1
+        self.videos_cache.update(int(video_id), lambda details: details[:4] + (details[4] + change,) + details[5:])
         msg = serverProtocol.build_like_video_confirmation(status, video_id)
         self.comm.send_msg(client_ip, msg)
 
     def send_user_his_pfp(self, client_ip, data):  # command 19
         """
-            Sends the logged-in user their own profile picture, refreshing it if already sent.
+            Sends the logged-in user their own profile picture, again if it changed since it was sent.
         :param client_ip: The IP address of the client requesting their profile picture.
         :param data: Not used.
         """
-        if self.clients[client_ip][0] in self.pfps_sent[client_ip]:
-            self.pfps_sent[client_ip].remove(self.clients[client_ip][0])
-        print(self.pfps_sent)
         self.send_pfp(client_ip, self.clients[client_ip][0])
         msg = serverProtocol.build_update_pfp()
         self.clients[client_ip][1].send_msg(client_ip, msg)
@@ -915,6 +1064,7 @@ class ServerLogic:
                         comment_id, video_id, commenter, comment, created_at = self.db.get_specific_comment(id)
                         creator, video_name = self.db.get_specific_video(video_id)[:2]
                         self.db.delete_comment(id)
+                        self.invalidate_video_comments(video_id)
                         self.send_email(comment_id,
                                         self.EMAIL_COMMENT_REMOVE_MSG.format(comment, commenter, video_name, creator,
                                                                              created_at),
@@ -923,6 +1073,7 @@ class ServerLogic:
                     else:  # video
                         creator, video_name, desc, created_at = self.db.get_specific_video(id)[:4]
                         self.db.delete_video(id)
+                        self.invalidate_video(id, creator)
                         self.db.remove_video_hash(id)
                         self.delete_video_files(id)
                         self.send_email(creator,
@@ -933,7 +1084,7 @@ class ServerLogic:
 
                 usernames = set(self.db.get_reporters(id, type))
 
-                client_names = {i[0] for i in self.clients.values()}
+                client_names = {i[0] for i in list(self.clients.values())}
 
                 active_reporters = usernames & client_names
 
@@ -947,18 +1098,15 @@ class ServerLogic:
 
     def delete_video_files(self, video_id):
         """
-            Deletes a video's file from disk and removes its hash from the database.
+            Deletes a video's file and thumbnail from disk, with their sealed copies, and removes its hash from the database.
         :param video_id: The ID of the video whose file should be deleted.
         """
-        file_path = f"media\\videos\\{video_id}.{settings.VIDEO_EXTENSION}"
-        if os.path.isfile(file_path):
-            os.remove(file_path)
+        for file_path in [f"media\\videos\\{video_id}.{settings.VIDEO_EXTENSION}", f"media\\videos\\{video_id}.png"]:
+            for path in [file_path, file_path + sealedMedia.SEALED_SUFFIX]:
+                if os.path.isfile(path):
+                    os.remove(path)
         self.db.remove_video_hash(video_id)
 
-        file_path = f"media\\videos\\{video_id}.png"
-        if os.path.isfile(file_path):
-            os.remove(file_path)
-
 
     def handle_user_kick(self, client_ip, data):  # command 99
         """
@@ -969,7 +1117,11 @@ class ServerLogic:
         """
         username = data[0]
         if self.db.is_system_manager(self.clients[client_ip][0]):
+            # the follow rows are kept, but the amounts only count live_users, so the followers and followings
+            # of the deleted user have different amounts now
+            follow_usernames = self.db.get_followers(username) + self.db.get_followings(username)
             self.db.delete_user(username)
+            self.users_cache.invalidate(username, *follow_usernames)
             email_address = self.db.get_user_email(username)
             self.send_email(email_address, self.EMAIL_USER_KICK_MSG.format(username), self.EMAIL_USER_KICK_SUBJECT)
 
@@ -1002,11 +1154,17 @@ class ServerLogic:
     def hash_video(path_or_content, chunk_size: int = 1024 * 1024) -> str:
         """
             Computes a SHA-256 hash of a video's binary content.
-        :param path_or_content: The raw bytes of the video to hash.
+        :param path_or_content: The path of the video's file, or the raw bytes of the video to hash.
         :param chunk_size: The size of each chunk to process at a time in bytes.
         :return: The hexadecimal SHA-256 digest of the video content.
         """
         h = hashlib.sha256()
+        if isinstance(path_or_content, str):
+            with open(path_or_content, 'rb') as f:
+                for chunk in iter(lambda: f.read(chunk_size), b""):
+                    h.update(chunk)
+            return h.hexdigest()
+
         chunks_hashed = 0
         for chunk in iter(lambda: path_or_content[chunks_hashed * chunk_size:chunk_size * (chunks_hashed + 1)], b""):
             h.update(chunk)
@@ -0,0 +1,238 @@
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from heapq import nsmallest
+
+TRIGRAM_LENGTH = 3
+EXACT_MATCH = 0  # match ranks, a lower rank is sent first
+PREFIX_MATCH = 1
+SUBSTRING_MATCH = 2
+
+
+def trigrams(text):
+    """
+    The distinct 3 letter parts of a text.
+    :param text: The text, lower case
+    :return: set of the text's trigrams
+    """
+    return {text[i:i + TRIGRAM_LENGTH] for i in range(len(text) - TRIGRAM_LENGTH + 1)}
+
+
+class UsernameIndex:
+    """An in memory index of the active users' usernames, for the creators search.
+
+    Every username gets a slot, and every trigram of the lower case usernames has an array of the slots of the
+    usernames that contain it, so the usernames containing a search are found among the slots of the search's
+    rarest trigram instead of among all the usernames. The lower case usernames are also kept sorted, so the
+    usernames that start with a search are a range of that list, which is how searches shorter than a trigram
+    are answered. A deleted user's slot is emptied and skipped, it is not removed from the trigrams' arrays.
+    Matches are ranked like a user would expect: the exact username, then usernames starting with the search,
+    then usernames containing it, alphabetically within each rank.
+
+    :ivar slot_names: List of the usernames by slot, None for a deleted user.
+    :ivar slot_lower: List of the lower case usernames by slot.
+    :ivar slots: Dictionary mapping an active user's lower case username to its slot.
+    :ivar sorted_names: Sorted list of the active users' lower case usernames.
+    :ivar trigram_slots: Dictionary mapping a trigram to an array('I') of the slots of usernames containing it.
+    """
+
+    def __init__(self, usernames=()):
+        """Initialize the UsernameIndex object.
+
+        :param usernames: Iterable of the active users' usernames.
+        """
+        self.slot_names = []
+        self.slot_lower = []
+        self.slots = {}
+        self.sorted_names = []
+        self.trigram_slots = {}
+
+        for username in usernames:
+            self._add_slot(username)
+        self.sorted_names = sorted(self.slots)
+
+    def __len__(self):
+        """Amount of active usernames."""
+        return len(self.slots)
+
+    def _add_slot(self, username):
+        """
+        Gives a username a slot and adds the slot to its trigrams' arrays.
+        :param username: The username
+        :return: The lower case username, None if the username already has a slot
+        """
+        lower = username.lower()
+        if lower in self.slots:
+            return None
+
+        slot = len(self.slot_names)
+        self.slot_names.append(username)
+        self.slot_lower.append(lower)
+        self.slots[lower] = slot
+        for trigram in trigrams(lower):
+            slots = self.trigram_slots.get(trigram)
+            if slots is None:
+                slots = self.trigram_slots[trigram] = array('I')
+            slots.append(slot)
+        return lower
+
+    def add(self, username):
+        """
+        Adds a new user's username.
+        :param username: The username
+        """
+        lower = self._add_slot(username)
+        if lower is not None:
+            insort(self.sorted_names, lower)
+
+    def remove(self, username):
+        """
+        Removes a deleted user's username, so it is not found.
+        :param username: The username, in any case
+        """
+        lower = username.lower()
+        slot = self.slots.pop(lower, None)
+        if slot is None:
+            return
+        self.slot_names[slot] = None
+        del self.sorted_names[bisect_left(self.sorted_names, lower)]
+
+    def _prefix_matches(self, search, after=None):
+        """
+        The lower case usernames that start with a search, alphabetically.
+        :param search: The search, lower case
+        :param after: Lower case username the matches come after, None for all of them
+        :return: Generator of the lower case usernames
+        """
+        start = bisect_left(self.sorted_names, search) if after is None else bisect_right(self.sorted_names, after)
+        for i in range(start, len(self.sorted_names)):
+            lower = self.sorted_names[i]
+            if not lower.startswith(search):
+                break
+            yield lower
+
+    @staticmethod
+    def _rank(search, lower):
+        """
+        The rank of a username that contains a search.
+        :param search: The search, lower case
+        :param lower: The lower case username
+        :return: EXACT_MATCH, PREFIX_MATCH or SUBSTRING_MATCH
+        """
+        return EXACT_MATCH if lower == search else PREFIX_MATCH if lower.startswith(search) else SUBSTRING_MATCH
+
+    def search(self, search, limit=None):
+        """
+        Finds the active usernames containing a search, ignoring case, ranked.
+        :param search: The searched text
+        :param limit: Most usernames to return, None for all of them
+        :return: List of the matching usernames, best match first
+        """
+        return [username for rank, lower, username in self.search_ranked(search, limit)]
+
+    def search_ranked(self, search, limit=None, after=None):
+        """
+        Finds the active usernames containing a search, ignoring case, ranked, with the keys they are ranked by,
+        so a search can be continued from the last username found.
+        :param search: The searched text
+        :param limit: Most usernames to return, None for all of them
+        :param after: (rank, lower case username) key the usernames come after, None to start from the best match
+        :return: List of (rank, lower case username, username) of the matching usernames, best match first
+        """
+        search = search.lower()
+        if len(search) < TRIGRAM_LENGTH:
+            # the exact username and the usernames starting with the search come first, and are a sorted range
+            # that starts with the exact username
+            matches = []
+            if after is None or after[0] != SUBSTRING_MATCH:
+                for lower in self._prefix_matches(search, None if after is None else after[1]):
+                    matches.append(lower)
+                    if limit is not None and len(matches) == limit:
+                        break
+
+            if limit is None or len(matches) < limit:
+                after_lower = after[1] if after is not None and after[0] == SUBSTRING_MATCH else ""
+                substring_matches = (lower for lower in self.slots
+                                     if search in lower and not lower.startswith(search) and lower > after_lower)
+                if limit is None:
+                    matches += sorted(substring_matches)
+                else:
+                    matches += nsmallest(limit - len(matches), substring_matches)
+            return [(self._rank(search, lower), lower, self.slot_names[self.slots[lower]]) for lower in matches]
+
+        rarest = min((self.trigram_slots.get(trigram, ()) for trigram in trigrams(search)), key=len)
+        ranked = []
+        for slot in rarest:
+            lower = self.slot_lower[slot]
+            if search in lower and self.slot_names[slot] is not None:
+                key = (self._rank(search, lower), lower)
+                if after is None or key > after:
+                    ranked.append(key)
+
+        ranked = sorted(ranked) if limit is None else nsmallest(limit, ranked)
+        return [(rank, lower, self.slot_names[self.slots[lower]]) for rank, lower in ranked]
+
+
+if __name__ == '__main__':
+    # creators search benchmark - 1M usernames, 1000 of them deleted, are searched with the database's LIKE query
+    # and the handler's deleted usernames filtering like before, and with the index
+    import os
+    import random
+    import string
+    import tempfile
+    import time
+
+    import database
+
+    USERS = 1000000
+    DELETED_RATIO = 0.001
+    SEARCHES = 5
+
+    random.seed(0)
+    syllables = ["ba", "ko", "ri", "mu", "te", "sa", "lo", "ne", "vi", "da", "pe", "zu", "an", "el", "or"]
+    usernames = set()
+    while len(usernames) < USERS:
+        username = "".join(random.choices(syllables, k=random.randint(2, 5))).capitalize()
+        if random.random() < 0.5:
+            username += str(random.randrange(1000))
+        usernames.add(username)
+    usernames = list(usernames)
+    deleted_usernames = set(random.sample(usernames, int(USERS * DELETED_RATIO)))
+
+    db = database.DataBase(os.path.join(tempfile.mkdtemp(), "benchmark.db"), in_memory_recommender=False)
+    db.cur.executemany("INSERT INTO users (username, email, password_hash, deleted) VALUES (?,?,?,?)",
+                       ((username, f"{username}@gmail.com", "", username in deleted_usernames)
+                        for username in usernames))
+    db.conn.commit()
+
+    start = time.perf_counter()
+    index = UsernameIndex(username for username in usernames if username not in deleted_usernames)
+    print(f"indexed {len(index)} usernames in {time.perf_counter() - start:.2f} s")
+
+    def search_with_like(search):
+        db.cur.execute("SELECT username FROM users WHERE username LIKE ? COLLATE NOCASE AND deleted = 0",
+                       ("%" + search + "%",))
+        found = [i[0] for i in db.cur.fetchall()]
+        db.cur.execute("SELECT username FROM users WHERE deleted = 1 ")
+        deleted = [i[0] for i in db.cur.fetchall()]
+        return [i for i in found if i not in deleted][:20]
+
+    for length in [1, 2, 3, 5, 8]:
+        random.seed(length)
+        searches = []
+        for _ in range(SEARCHES):
+            username = random.choice(usernames).lower()
+            start = random.randrange(max(1, len(username) - length + 1))
+            searches.append(username[start:start + length] or random.choice(string.ascii_lowercase))
+
+        search_times = []
+        for search_usernames in [search_with_like, lambda search: index.search(search, 20)]:
+            start = time.perf_counter()
+            for search in searches:
+                search_usernames(search)
+            search_times.append((time.perf_counter() - start) / SEARCHES * 1000)
+        full_start = time.perf_counter()
+        matches = sum(len(index.search(search)) for search in searches) / SEARCHES
+        full_time = (time.perf_counter() - full_start) / SEARCHES * 1000
+        print(f"{length} letter searches - LIKE and deleted filtering {search_times[0]:9.2f} ms, "
+              f"index first page {search_times[1]:7.2f} ms, index all {matches:8.0f} matches {full_time:7.2f} ms")
+    db.close()